@@ -0,0 +1,64 @@
+#! /usr/bin/env python3
+# coding: utf-8
+
+import hashlib
+import json
+import sqlite3
+
+__all__ = ['warrior_hash', 'ResultCache']
+
+def warrior_hash(warrior, size=8000):
+    """Return a hash of the assembled code of a warrior, as loaded in a core
+       of the given size: warriors with the same instructions and start get
+       the same hash, whatever their names or sources.
+    """
+    fields = ['%d' % warrior.start]
+    for instruction in warrior:
+        fields.append('%d.%d %d %d, %d %d' % (instruction.opcode, instruction.modifier,
+                                              instruction.a_mode, instruction.a_number % size,
+                                              instruction.b_mode, instruction.b_number % size))
+    return hashlib.sha1('\n'.join(fields).encode('ascii')).hexdigest()
+
+class ResultCache(object):
+    """A persistent cache of the results of battles, in an SQLite database.
+       Results are keyed by the hashes of the warriors (see warrior_hash), in
+       order, and by the settings of the battle, given as keyword arguments.
+       The database may be shared by concurrent processes.
+    """
+
+    def __init__(self, filename):
+        self.connection = sqlite3.connect(filename, timeout=60)
+        with self.connection:
+            self.connection.execute('CREATE TABLE IF NOT EXISTS results ('
+                                    'warriors TEXT, settings TEXT, counts TEXT, '
+                                    'PRIMARY KEY (warriors, settings))')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def key(self, warriors, settings):
+        return (','.join(warrior_hash(warrior, settings.get('size', 8000))
+                         for warrior in warriors),
+                json.dumps(settings, sort_keys=True))
+
+    def get(self, warriors, **settings):
+        """Return the wins, ties and losses of each warrior in a battle with
+           the given settings, or None if it's not cached.
+        """
+        row = self.connection.execute('SELECT counts FROM results '
+                                      'WHERE warriors = ? AND settings = ?',
+                                      self.key(warriors, settings)).fetchone()
+        return [tuple(counts) for counts in json.loads(row[0])] if row else None
+
+    def put(self, warriors, counts, **settings):
+        "Store the wins, ties and losses of each warrior in a battle."
+        with self.connection:
+            self.connection.execute('INSERT OR REPLACE INTO results VALUES (?, ?, ?)',
+                                    self.key(warriors, settings) +
+                                    (json.dumps([list(warrior_counts) for warrior_counts in counts]),))
+
+    def close(self):
+        self.connection.close()
@@ -0,0 +1,285 @@
+#! /usr/bin/env python3
+# coding: utf-8
+
+from queue import Queue, Empty
+from socketserver import StreamRequestHandler, ThreadingTCPServer
+from threading import Event, Lock, Thread
+import json
+import socket
+
+from .hill import battle
+from .redcode import Warrior, Instruction
+
+__all__ = ['DEFAULT_PORT', 'Coordinator', 'work', 'encode_warrior',
+           'decode_warrior']
+
+DEFAULT_PORT = 8081
+
+# Rounds of a battle handed out to a worker at once
+BATCH_ROUNDS = 50
+
+# Seconds between checks for work, or for the end, of idle connections
+POLL_INTERVAL = 0.1
+
+def encode_warrior(warrior):
+    "Return an assembled warrior as a JSON-serializable dictionary."
+    return {'name': warrior.name,
+            'author': warrior.author,
+            'start': warrior.start,
+            'instructions': [[instruction.opcode, instruction.modifier,
+                              instruction.a_mode, instruction.a_number,
+                              instruction.b_mode, instruction.b_number]
+                             for instruction in warrior]}
+
+def decode_warrior(data):
+    "Return the warrior encoded by encode_warrior."
+    warrior = Warrior(name=data['name'], author=data['author'],
+                      start=int(data['start']))
+    warrior.instructions = [Instruction(int(opcode), int(modifier), int(a_mode),
+                                        int(a_number), int(b_mode), int(b_number))
+                            for opcode, modifier, a_mode, a_number, b_mode, b_number
+                            in data['instructions']]
+    warrior.freeze()
+    return warrior
+
+class WorkerHandler(StreamRequestHandler):
+    """Hands out jobs to a connected worker, one at a time, until every
+       battle is over. A job the worker fails to return is queued again.
+    """
+
+    def handle(self):
+        coordinator = self.server.coordinator
+        self.request.settimeout(coordinator.timeout)
+
+        while not coordinator.finished.is_set():
+            try:
+                job = coordinator.jobs.get(timeout=POLL_INTERVAL)
+            except Empty:
+                continue
+
+            try:
+                self.wfile.write((json.dumps(job) + '\n').encode('utf-8'))
+                self.wfile.flush()
+                reply = json.loads(self.rfile.readline())
+                if not isinstance(reply, dict):
+                    raise ValueError("Reply is not an object")
+                if reply.get('job') != job['job']:
+                    raise ValueError("Reply to another job")
+                coordinator.done(job, [[int(count) for count in counts]
+                                       for counts in reply['results']])
+            except (socket.error, ValueError, KeyError, TypeError):
+                # a lost connection (or a timeout, or a garbled reply)
+                coordinator.jobs.put(job)
+                return
+
+        try:
+            self.wfile.write(b'{"done": true}\n')
+        except socket.error:
+            pass
+
+class CoordinatorServer(ThreadingTCPServer):
+    "The server of a Coordinator, with a thread for each worker."
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+class Coordinator(object):
+    """Coordinates a tournament played by workers over TCP (see work). The
+       battles submitted are split into jobs of batch_rounds rounds each,
+       handed out to the workers as they connect and ask for more. Warriors
+       are sent assembled, so workers don't need the sources.
+
+       Jobs of workers which disconnect, or don't reply within timeout
+       seconds (if given), are queued again for other workers. Jobs of a
+       seeded battle get seeds after it, one for each job, so the results
+       don't depend on which workers play them.
+    """
+
+    def __init__(self, address=('', DEFAULT_PORT), batch_rounds=BATCH_ROUNDS,
+                 timeout=None):
+        self.batch_rounds = batch_rounds
+        self.timeout = timeout
+        self.jobs = Queue()
+        self.results = []
+        self.pending = set()
+        self.lock = Lock()
+        self.finished = Event()
+
+        self.server = CoordinatorServer(address, WorkerHandler)
+        self.server.coordinator = self
+
+    @property
+    def address(self):
+        "The address the coordinator listens to, as (host, port)."
+        return self.server.server_address
+
+    def submit(self, warrior_a, warrior_b, rounds=100, cycles=80000, size=8000,
+               max_processes=8000, minimum_separation=100, seed=None, budget=None):
+        """Submit a battle between two warriors, with the settings of
+           hill.battle. Return its index in the results.
+
+           A budget (in seconds) limits each job of the battle, so a slow
+           pairing can't hold up a worker: the rounds a job leaves unfinished
+           are left out of the results.
+        """
+        index = len(self.results)
+        self.results.append([[0, 0, 0], [0, 0, 0]])
+        warriors = [encode_warrior(warrior_a), encode_warrior(warrior_b)]
+
+        for n, first in enumerate(range(0, rounds, self.batch_rounds)):
+            job = {'job': '%d.%d' % (index, n),
+                   'battle': index,
+                   'warriors': warriors,
+                   'settings': {'rounds': min(self.batch_rounds, rounds - first),
+                                'cycles': cycles,
+                                'size': size,
+                                'max_processes': max_processes,
+                                'minimum_separation': minimum_separation,
+                                'seed': None if seed is None else seed + n,
+                                'budget': budget}}
+            with self.lock:
+                self.pending.add(job['job'])
+            self.jobs.put(job)
+
+        return index
+
+    def done(self, job, results):
+        "Add the results of a job, unless they were added already."
+        with self.lock:
+            if job['job'] in self.pending:
+                self.pending.remove(job['job'])
+                for score, counts in zip(self.results[job['battle']], results):
+                    for n, count in enumerate(counts):
+                        score[n] += count
+                if not self.pending:
+                    self.finished.set()
+
+    def run(self):
+        """Serve the workers until every battle submitted is over. Return the
+           wins, ties and losses of each warrior of each battle, in the order
+           they were submitted.
+        """
+        if self.pending:
+            server = Thread(target=self.server.serve_forever,
+                            kwargs={'poll_interval': POLL_INTERVAL})
+            server.start()
+            try:
+                # waiting with a timeout, so the main thread may be interrupted
+                while not self.finished.wait(POLL_INTERVAL):
+                    pass
+            finally:
+                self.server.shutdown()
+                server.join()
+        return [tuple(tuple(score) for score in scores) for scores in self.results]
+
+    def close(self):
+        self.server.server_close()
+
+def work(address):
+    """Play the jobs handed out by a coordinator at address, until it has no
+       more. Return the number of jobs played.
+    """
+    connection = socket.create_connection(address)
+    reader = connection.makefile('r', encoding='utf-8')
+    writer = connection.makefile('w', encoding='utf-8')
+    played = 0
+    try:
+        for line in reader:
+            job = json.loads(line)
+            if job.get('done'):
+                break
+            warrior_a, warrior_b = [decode_warrior(data) for data in job['warriors']]
+            results = battle(warrior_a, warrior_b, **job['settings'])
+            writer.write(json.dumps({'job': job['job'], 'results': results}) + '\n')
+            writer.flush()
+            played += 1
+    finally:
+        reader.close()
+        writer.close()
+        connection.close()
+    return played
+
+if __name__ == "__main__":
+    import argparse
+    import itertools
+    from . import redcode
+    from .hill import WIN_POINTS, TIE_POINTS
+
+    parser = argparse.ArgumentParser(description='Tournaments played by workers over TCP')
+    subparsers = parser.add_subparsers(dest='command')
+
+    coordinate = subparsers.add_parser('coordinate', help='Hand out a round robin tournament')
+    coordinate.add_argument('--host', metavar='HOST', nargs='?', default='',
+                            help='Address to listen to (default all)')
+    coordinate.add_argument('--port', metavar='PORT', type=int, nargs='?',
+                            default=DEFAULT_PORT, help='Port to listen to')
+    coordinate.add_argument('--batch', '-b', metavar='ROUNDS', type=int, nargs='?',
+                            default=BATCH_ROUNDS, help='Rounds handed out at once')
+    coordinate.add_argument('--timeout', '-t', metavar='SECONDS', type=float, nargs='?',
+                            default=None, help='Time a worker has to return a batch')
+    coordinate.add_argument('--rounds', '-r', metavar='ROUNDS', type=int, nargs='?',
+                            default=100, help='Rounds of each battle')
+    coordinate.add_argument('--size', '-s', metavar='CORESIZE', type=int, nargs='?',
+                            default=8000, help='The core size')
+    coordinate.add_argument('--cycles', '-c', metavar='CYCLES', type=int, nargs='?',
+                            default=80000, help='Cycles until tie')
+    coordinate.add_argument('--processes', '-p', metavar='MAXPROCESSES', type=int, nargs='?',
+                            default=8000, help='Max processes')
+    coordinate.add_argument('--length', '-l', metavar='MAXLENGTH', type=int, nargs='?',
+                            default=100, help='Max warrior length')
+    coordinate.add_argument('--distance', '-d', metavar='MINDISTANCE', type=int, nargs='?',
+                            default=100, help='Minimum warrior distance')
+    coordinate.add_argument('--budget', metavar='SECONDS', type=float, nargs='?',
+                            default=None, help='Maximum wall-clock time of each batch')
+    coordinate.add_argument('--seed', metavar='SEED', type=int, nargs='?',
+                            default=None, help='Random seed for warriors placement')
+    coordinate.add_argument('warriors', metavar='WARRIOR', nargs='+',
+                            type=argparse.FileType('r', encoding=redcode.WARRIOR_ENCODING),
+                            help='Warrior redcode filename')
+
+    worker = subparsers.add_parser('work', help='Play the batches of a coordinator')
+    worker.add_argument('host', metavar='HOST', help='Address of the coordinator')
+    worker.add_argument('--port', metavar='PORT', type=int, nargs='?',
+                        default=DEFAULT_PORT, help='Port of the coordinator')
+
+    args = parser.parse_args()
+
+    if args.command == 'work':
+        played = work((args.host, args.port))
+        print("Played %d batches" % played)
+    else:
+        # build environment
+        environment = {'CORESIZE': args.size,
+                       'CYCLES': args.cycles,
+                       'ROUNDS': args.rounds,
+                       'MAXPROCESSES': args.processes,
+                       'MAXLENGTH': args.length,
+                       'MINDISTANCE': args.distance}
+
+        # assemble warriors
+        warriors = [redcode.parse(file, environment) for file in args.warriors]
+
+        coordinator = Coordinator((args.host, args.port), args.batch, args.timeout)
+        pairs = list(itertools.combinations(range(len(warriors)), 2))
+        for a, b in pairs:
+            coordinator.submit(warriors[a], warriors[b], args.rounds, args.cycles,
+                               args.size, args.processes, args.distance, args.seed,
+                               args.budget)
+
+        print("Waiting for workers at %s:%d" % coordinator.address)
+        try:
+            results = coordinator.run()
+        finally:
+            coordinator.close()
+
+        # score of each warrior, as in a King of the Hill
+        points = [0] * len(warriors)
+        for pair, scores in zip(pairs, results):
+            for n, (wins, ties, losses) in zip(pair, scores):
+                points[n] += wins * WIN_POINTS + ties * TIE_POINTS
+
+        print("Results: (%d rounds each battle)" % args.rounds)
+        print("%s %s" % ("Warrior (Author)".ljust(40), "points".rjust(7)))
+        for n in sorted(range(len(warriors)), key=lambda n: -points[n]):
+            print("%s %s" % (("%s (%s)" % (warriors[n].name, warriors[n].author)).ljust(40),
+                             str(points[n]).rjust(7)))
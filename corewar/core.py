@@ -1,15 +1,28 @@
 # coding: utf-8
 
 from copy import copy
-from redcode import Instruction
+from .redcode import Instruction, SharedInstruction
 
-__all__ = ['DEFAULT_INITIAL_INSTRUCTION', 'Core']
+__all__ = ['DEFAULT_INITIAL_INSTRUCTION', 'Core', 'HashedCore', 'SparseCore']
 
 DEFAULT_INITIAL_INSTRUCTION = Instruction('DAT', 'F', '$', 0, '$', 0)
 
+def _dump_text(instruction):
+    "Return the text of an instruction in a core dump."
+    if instruction == DEFAULT_INITIAL_INSTRUCTION:
+        return 'DAT'
+    return str(instruction)
+
 class Core(object):
     """The Core itself. An array-like object with a bunch of instructions and
        warriors, and tasks.
+
+       Cells that were not written since the core was cleared all hold the
+       same shared instruction, which is replaced by a copy on the first
+       write. Therefore, every write (whole instructions or single fields)
+       should go through the Core, which also keeps track of the dirty cells
+       to restore only those when cleared again with the same instruction,
+       and discards the compiled handlers of the cells written.
     """
 
     def __init__(self, initial_instruction=DEFAULT_INITIAL_INSTRUCTION,
@@ -17,12 +30,25 @@ class Core(object):
         self.size = size
         self.write_limit = write_limit if write_limit else self.size
         self.read_limit = read_limit if read_limit else self.size
-        self.clear()
+        self.clear_instruction = None
+        self.clear(initial_instruction)
 
     def clear(self, instruction=DEFAULT_INITIAL_INSTRUCTION):
-        """Writes the same instruction thorough the entire core.
+        """Writes the same instruction thorough the entire core. If the core
+           was already cleared with an equal instruction, only the cells
+           written since then are restored.
         """
-        self.instructions = [instruction.core_binded(self) for i in xrange(self.size)]
+        if self.clear_instruction is not None and self.clear_instruction == instruction:
+            for address in self.dirty:
+                self.instructions[address] = self.clear_instruction
+                self.handlers.pop(address, None)
+        else:
+            self.clear_instruction = SharedInstruction(instruction, self)
+            self.instructions = [self.clear_instruction] * self.size
+            # compiled handlers of the instructions, by address (see
+            # MARS.compiled_step)
+            self.handlers = {}
+        self.dirty = set()
 
     def trim_write(self, address):
         "Return the trimmed address to write, considering the write limit."
@@ -43,21 +69,106 @@ class Core(object):
     def _trim(self, address, limit):
         "Trims an address in the core, given a limit."
         result = address % limit
-        if result > limit/2:
+        if result > limit // 2:
             result += self.size - limit
         return result
 
     def __getitem__(self, address):
-        return self.instructions[address % self.size]
+        try:
+            return self.instructions[address % self.size]
+        except TypeError:
+            # not an address, but a slice
+            return self.slice(address.start, address.stop)
 
-    def __getslice__(self, start, stop):
+    def slice(self, start=None, stop=None):
+        """Return the list of instructions in an address range, counting
+           negative addresses from the end of the core. The range wraps around
+           the core if start is greater than stop.
+        """
+        start, stop = self._slice_bounds(start, stop)
         if start > stop:
             return self.instructions[start:] + self.instructions[:stop]
         else:
             return self.instructions[start:stop]
 
+    def _slice_bounds(self, start, stop):
+        "Return the bounds of a slice, as non-negative addresses."
+        start = 0 if start is None else start
+        stop = self.size if stop is None else stop
+        return (start + self.size if start < 0 else start,
+                stop + self.size if stop < 0 else stop)
+
     def __setitem__(self, address, instruction):
-        self.instructions[address % self.size] = instruction
+        address %= self.size
+        self.instructions[address] = instruction
+        self.dirty.add(address)
+        self.handlers.pop(address, None)
+
+    def set_a_number(self, address, number):
+        "Write the A-number of the instruction at address."
+        self._writable(address).a_number = number
+
+    def set_b_number(self, address, number):
+        "Write the B-number of the instruction at address."
+        self._writable(address).b_number = number
+
+    def increment_a_number(self, address, value=1):
+        "Increment (or decrement) the A-number of the instruction at address."
+        self._writable(address).a_number += value
+
+    def increment_b_number(self, address, value=1):
+        "Increment (or decrement) the B-number of the instruction at address."
+        self._writable(address).b_number += value
+
+    def _writable(self, address):
+        """Return the instruction at address to be written in place, replacing
+           the shared instruction by a copy if needed, and mark it dirty.
+        """
+        address %= self.size
+        instruction = self.instructions[address]
+        if instruction is self.clear_instruction:
+            instruction = self.instructions[address] = copy(instruction)
+        self.dirty.add(address)
+        self.handlers.pop(address, None)
+        return instruction
+
+    def disassemble(self, start=0, stop=None):
+        """Yield the address and the disassembled fields (see
+           Instruction.disassemble) of each instruction in an address range,
+           by default the entire core. The range wraps around the core if start
+           is greater than stop.
+        """
+        if stop is None:
+            stop = start + self.size
+        elif stop < start:
+            stop += self.size
+
+        instructions = self.instructions
+        size = self.size
+        for address in range(start, stop):
+            address %= size
+            yield (address,) + instructions[address].disassemble()
+
+    def dump(self, start=0, stop=None):
+        """Yield the text lines of a core dump of an address range, in the
+           same format as the recorded core logs. Empty DAT.F $0, $0
+           instructions are abbreviated as DAT.
+        """
+        if stop is None:
+            stop = start + self.size
+        elif stop < start:
+            stop += self.size
+
+        instructions = self.instructions
+        size = self.size
+        clear_instruction = self.clear_instruction
+        clear_text = _dump_text(clear_instruction)
+        for address in range(start, stop):
+            address %= size
+            instruction = instructions[address]
+            yield "l%05d   %s" % (address,
+                                 clear_text if instruction is clear_instruction
+                                            else _dump_text(instruction))
 
     def __iter__(self):
         return iter(self.instructions)
@@ -68,3 +179,110 @@ class Core(object):
     def __repr__(self):
         return "<Core size=%d>" % self.size
 
+
+class HashedCore(Core):
+    """A Core keeping an incremental (Zobrist-style) hash of its contents: the
+       xor of the hashes of every cell, updated on every write.
+    """
+
+    def clear(self, instruction=DEFAULT_INITIAL_INSTRUCTION):
+        if self.clear_instruction is not None and self.clear_instruction == instruction:
+            dirty = self.dirty
+            for address in dirty:
+                self.hash ^= self.cell_hash(address)
+            Core.clear(self, instruction)
+            for address in dirty:
+                self.hash ^= self.cell_hash(address)
+        else:
+            Core.clear(self, instruction)
+            self.hash = 0
+            for address in range(self.size):
+                self.hash ^= self.cell_hash(address)
+
+    def cell_hash(self, address):
+        "Return the hash of the instruction at an address."
+        instruction = self.instructions[address]
+        # instructions not binded to the core do not trim their numbers
+        return hash((address, instruction.opcode, instruction.modifier,
+                     instruction.a_mode, instruction.a_number,
+                     instruction.b_mode, instruction.b_number,
+                     instruction.core is None))
+
+    def __setitem__(self, address, instruction):
+        address %= self.size
+        self.hash ^= self.cell_hash(address)
+        Core.__setitem__(self, address, instruction)
+        self.hash ^= self.cell_hash(address)
+
+    def set_a_number(self, address, number):
+        address %= self.size
+        self.hash ^= self.cell_hash(address)
+        Core.set_a_number(self, address, number)
+        self.hash ^= self.cell_hash(address)
+
+    def set_b_number(self, address, number):
+        address %= self.size
+        self.hash ^= self.cell_hash(address)
+        Core.set_b_number(self, address, number)
+        self.hash ^= self.cell_hash(address)
+
+    def increment_a_number(self, address, value=1):
+        address %= self.size
+        self.hash ^= self.cell_hash(address)
+        Core.increment_a_number(self, address, value)
+        self.hash ^= self.cell_hash(address)
+
+    def increment_b_number(self, address, value=1):
+        address %= self.size
+        self.hash ^= self.cell_hash(address)
+        Core.increment_b_number(self, address, value)
+        self.hash ^= self.cell_hash(address)
+
+    def __repr__(self):
+        return "<HashedCore size=%d>" % self.size
+
+
+class SparseCells(dict):
+    """The cells of a SparseCore, by address. Addresses not stored hold the
+       clear instruction.
+    """
+
+    __slots__ = ('clear_instruction',)
+
+    def __init__(self, clear_instruction):
+        dict.__init__(self)
+        self.clear_instruction = clear_instruction
+
+    def __missing__(self, address):
+        return self.clear_instruction
+
+class SparseCore(Core):
+    """A Core storing only the cells written since it was cleared, for very
+       large core sizes: memory and clearing time are proportional to the
+       cells written, not to the size.
+    """
+
+    def clear(self, instruction=DEFAULT_INITIAL_INSTRUCTION):
+        if self.clear_instruction is not None and self.clear_instruction == instruction:
+            for address in self.dirty:
+                self.handlers.pop(address, None)
+        else:
+            self.clear_instruction = SharedInstruction(instruction, self)
+            self.handlers = {}
+        self.instructions = SparseCells(self.clear_instruction)
+        self.dirty = set()
+
+    def slice(self, start=None, stop=None):
+        start, stop = self._slice_bounds(start, stop)
+        if start > stop:
+            stop += self.size
+        instructions = self.instructions
+        size = self.size
+        return [instructions[address % size] for address in range(start, stop)]
+
+    def __iter__(self):
+        instructions = self.instructions
+        return (instructions[address] for address in range(self.size))
+
+    def __repr__(self):
+        return "<SparseCore size=%d>" % self.size
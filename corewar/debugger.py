@@ -0,0 +1,175 @@
+#! /usr/bin/env python3
+# coding: utf-8
+
+from .mars import *
+from .mars import CHANGE_EVENTS
+from .redcode import OPCODE_NAMES
+
+__all__ = ['Breakpoint', 'Breakpoints']
+
+# Names of the event types, for describing breakpoints
+EVENT_NAMES = {EVENT_EXECUTED: 'execution', EVENT_I_WRITE: 'write',
+               EVENT_I_READ: 'read', EVENT_A_DEC: 'A-decrement',
+               EVENT_A_INC: 'A-increment', EVENT_B_DEC: 'B-decrement',
+               EVENT_B_INC: 'B-increment', EVENT_A_READ: 'A-read',
+               EVENT_A_WRITE: 'A-write', EVENT_B_READ: 'B-read',
+               EVENT_B_WRITE: 'B-write', EVENT_A_ARITH: 'A-arithmetic',
+               EVENT_B_ARITH: 'B-arithmetic'}
+
+class Breakpoint(object):
+    """A condition on which a simulation should stop: core events of some
+       types (at an address, or anywhere), optionally only of instructions
+       with an opcode, or a number of processes reached. Either may be
+       restricted to a warrior, by index.
+    """
+
+    def __init__(self, event_types=(), address=None, opcode=None,
+                 processes=None, warrior=None):
+        self.event_types = frozenset(event_types)
+        self.address = address
+        self.opcode = opcode
+        self.processes = processes
+        self.warrior = warrior
+
+    def __str__(self):
+        if self.processes is not None:
+            what = "death" if self.processes == 0 else "%d processes" % self.processes
+        else:
+            events = ('change' if self.event_types == CHANGE_EVENTS else
+                      '/'.join(EVENT_NAMES[event_type] for event_type in sorted(self.event_types)))
+            what = events
+            if self.opcode is not None:
+                what += " of %s" % OPCODE_NAMES[self.opcode]
+            if self.address is not None:
+                what += " at %05d" % self.address
+        if self.warrior is not None:
+            what += " of warrior %d" % self.warrior
+        return what
+
+    def __repr__(self):
+        return "<Breakpoint %s>" % self
+
+class Breakpoints(object):
+    """The breakpoints of a simulation. Event breakpoints are kept in a table
+       indexed by address (None for anywhere) and event type, looked up on
+       each core event, and process breakpoints are checked after each step
+       (see check). The breakpoints only listen to the core events of the
+       simulation while there's some event breakpoint, so there's no cost
+       otherwise.
+
+       Breakpoints hit are appended to hits, as tuples of the breakpoint,
+       the index of the warrior and the address (None for processes).
+    """
+
+    def __init__(self, simulation):
+        self.simulation = simulation
+        self.table = {}
+        self.process_breakpoints = []
+        self.counts = None
+        self.hits = []
+        self.listening = False
+
+    def __len__(self):
+        return (sum(len(breakpoints) for breakpoints in self.table.values()) +
+                len(self.process_breakpoints))
+
+    def add(self, breakpoint):
+        "Add a breakpoint, and return it."
+        if breakpoint.processes is not None:
+            self.process_breakpoints.append(breakpoint)
+        else:
+            address = breakpoint.address
+            if address is not None:
+                address %= len(self.simulation.core)
+            for event_type in breakpoint.event_types:
+                self.table.setdefault((address, event_type), []).append(breakpoint)
+            self.intercept()
+        return breakpoint
+
+    def remove(self, breakpoint):
+        "Remove a breakpoint."
+        if breakpoint.processes is not None:
+            self.process_breakpoints.remove(breakpoint)
+        else:
+            for key, breakpoints in list(self.table.items()):
+                if breakpoint in breakpoints:
+                    breakpoints.remove(breakpoint)
+                    if not breakpoints:
+                        del self.table[key]
+            self.intercept()
+
+    def clear(self):
+        "Remove every breakpoint."
+        self.table = {}
+        self.process_breakpoints = []
+        self.intercept()
+
+    def at(self, address, warrior=None):
+        "Break on the execution of an address."
+        return self.add(Breakpoint([EVENT_EXECUTED], address, warrior=warrior))
+
+    def watch(self, address, warrior=None):
+        """Break on changes to an address: writes of whole instructions or
+           fields, and increments and decrements of its fields.
+        """
+        return self.add(Breakpoint(CHANGE_EVENTS, address, warrior=warrior))
+
+    def on_opcode(self, opcode, warrior=None):
+        "Break on the execution of an opcode anywhere (e.g. DAT)."
+        return self.add(Breakpoint([EVENT_EXECUTED], opcode=opcode, warrior=warrior))
+
+    def on_processes(self, processes, warrior=None):
+        "Break when a warrior (any, if None) gets to a number of processes."
+        return self.add(Breakpoint(processes=processes, warrior=warrior))
+
+    def on_death(self, warrior=None):
+        "Break when a warrior (any, if None) has no processes left."
+        return self.on_processes(0, warrior)
+
+    def reset(self):
+        """Forget the processes counted and the hits of the last round, once
+           the simulation is reset for another.
+        """
+        self.counts = None
+        self.hits = []
+
+    def intercept(self):
+        "Listen to the core events of the simulation only if needed."
+        if self.table and not self.listening:
+            self.simulation.add_event_listener(self.core_event)
+            self.listening = True
+        elif not self.table and self.listening:
+            self.simulation.remove_event_listener(self.core_event)
+            self.listening = False
+
+    def core_event(self, warrior, address, event_type):
+        "Look a core event up in the table."
+        address %= len(self.simulation.core)
+        for key in ((address, event_type), (None, event_type)):
+            breakpoints = self.table.get(key)
+            if breakpoints:
+                for breakpoint in breakpoints:
+                    if ((breakpoint.warrior is None or breakpoint.warrior == warrior) and
+                        (breakpoint.opcode is None or
+                         breakpoint.opcode == self.simulation.core[address].opcode)):
+                        self.hits.append((breakpoint, warrior, address))
+
+    def check(self):
+        """Check the process breakpoints, which are hit when the number of
+           processes changes to theirs, and return the breakpoints hit since
+           the last check, clearing them.
+        """
+        if self.process_breakpoints:
+            simulation = self.simulation
+            counts = [len(task_queue) for task_queue in simulation.task_queues]
+            if self.counts is not None and len(self.counts) == len(counts):
+                for breakpoint in self.process_breakpoints:
+                    for index, (previous, count) in enumerate(zip(self.counts, counts)):
+                        if (count == breakpoint.processes and previous != count and
+                            (breakpoint.warrior is None or breakpoint.warrior == index)):
+                            self.hits.append((breakpoint, index, None))
+            self.counts = counts
+
+        hits = self.hits
+        self.hits = []
+        return hits
@@ -0,0 +1,172 @@
+#! /usr/bin/env python3
+# coding: utf-8
+
+from .core import Core
+from .mars import MARS
+
+__all__ = ['ENGINES', 'Divergence', 'compare']
+
+# Settings of each engine implementation, by name
+ENGINES = {'interpreted': {},
+           'compiled': {'compiled': True}}
+
+class Divergence(object):
+    """The first difference found between two engines: the round and cycle
+       (zero right after loading), and either the address of a core cell or
+       the index of a warrior whose task queue differs, with the values of
+       both engines.
+    """
+
+    def __init__(self, round, cycle, address=None, warrior=None,
+                 expected=None, found=None):
+        self.round = round
+        self.cycle = cycle
+        self.address = address
+        self.warrior = warrior
+        self.expected = expected
+        self.found = found
+
+    def __repr__(self):
+        if self.address is not None:
+            where = "cell %05d" % self.address
+        else:
+            where = "task queue of warrior %d" % self.warrior
+        return "<Divergence round %d cycle %d at %s: expected %s, found %s>" % (
+            self.round, self.cycle, where, self.expected, self.found)
+
+def difference(reference, candidate):
+    """Return the first difference between the states of two simulations, as
+       a tuple (address, warrior, expected, found), or None if they're equal.
+    """
+    if len(reference.core) != len(candidate.core):
+        raise ValueError("Engines with different core sizes")
+
+    # when both track the cells written since cleared, the others are equal
+    if hasattr(reference.core, 'dirty') and hasattr(candidate.core, 'dirty'):
+        addresses = sorted(reference.core.dirty | candidate.core.dirty)
+    else:
+        addresses = range(len(reference.core))
+
+    for address in addresses:
+        if reference.core[address] != candidate.core[address]:
+            return address, None, reference.core[address], candidate.core[address]
+
+    for n, (expected, found) in enumerate(zip(reference.task_queues, candidate.task_queues)):
+        if expected != found:
+            return None, n, expected, found
+
+def compare(reference, candidate, rounds=1, cycles=80000, every=1):
+    """Run two simulations of the same warriors side by side, comparing their
+       core cells and task queues every given number of cycles. Return the
+       first Divergence, or None if the engines agree on every round.
+
+       The placement of every round is drawn by the reference and given to
+       both. When a difference is found, the slice of cycles since the last
+       check is replayed cycle by cycle to find the first one diverging.
+    """
+    if len(reference.warriors) != len(candidate.warriors):
+        raise ValueError("Engines with different warriors")
+
+    # how many warriors should be playing to end a round
+    active_warrior_to_stop = 1 if len(reference.warriors) >= 2 else 0
+
+    for round in range(1, rounds + 1):
+        positions = reference.placement()
+        reference.reset(positions=positions)
+        candidate.reset(positions=positions)
+
+        found = difference(reference, candidate)
+        if found:
+            return Divergence(round, 0, *found)
+
+        cycle = 0
+        while cycle < cycles and reference.alive() > active_warrior_to_stop:
+            steps = min(every, cycles - cycle)
+            for i in range(steps):
+                reference.step()
+                candidate.step()
+
+            found = difference(reference, candidate)
+            if found:
+                if steps > 1:
+                    # replay the slice, checking every cycle
+                    reference.reset(positions=positions)
+                    candidate.reset(positions=positions)
+                    for replayed in range(1, cycle + steps + 1):
+                        reference.step()
+                        candidate.step()
+                        if replayed > cycle:
+                            found = difference(reference, candidate)
+                            if found:
+                                return Divergence(round, replayed, *found)
+                return Divergence(round, cycle + steps, *found)
+
+            cycle += steps
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+    from . import redcode
+
+    parser = argparse.ArgumentParser(description='Compare two MARS engines on the same warriors')
+    parser.add_argument('--reference', metavar='ENGINE', choices=sorted(ENGINES),
+                        default='interpreted', help='Engine taken as right')
+    parser.add_argument('--candidate', metavar='ENGINE', choices=sorted(ENGINES),
+                        default='compiled', help='Engine being checked')
+    parser.add_argument('--rounds', '-r', metavar='ROUNDS', type=int, nargs='?',
+                        default=1, help='Rounds to play')
+    parser.add_argument('--size', '-s', metavar='CORESIZE', type=int, nargs='?',
+                        default=8000, help='The core size')
+    parser.add_argument('--cycles', '-c', metavar='CYCLES', type=int, nargs='?',
+                        default=80000, help='Cycles until tie')
+    parser.add_argument('--processes', '-p', metavar='MAXPROCESSES', type=int, nargs='?',
+                        default=8000, help='Max processes')
+    parser.add_argument('--length', '-l', metavar='MAXLENGTH', type=int, nargs='?',
+                        default=100, help='Max warrior length')
+    parser.add_argument('--distance', '-d', metavar='MINDISTANCE', type=int, nargs='?',
+                        default=100, help='Minimum warrior distance')
+    parser.add_argument('--seed', metavar='SEED', type=int, nargs='?',
+                        default=None, help='Random seed for warriors placement')
+    parser.add_argument('--every', '-e', metavar='CYCLES', type=int, nargs='?',
+                        default=100, help='Cycles between comparisons')
+    parser.add_argument('warriors', metavar='WARRIOR', nargs='+',
+                        type=argparse.FileType('r', encoding=redcode.WARRIOR_ENCODING),
+                        help='Warrior redcode filename')
+
+    args = parser.parse_args()
+
+    # build environment
+    environment = {'CORESIZE': args.size,
+                   'CYCLES': args.cycles,
+                   'ROUNDS': args.rounds,
+                   'MAXPROCESSES': args.processes,
+                   'MAXLENGTH': args.length,
+                   'MINDISTANCE': args.distance}
+
+    # assemble warriors, shared by both engines
+    warriors = [redcode.parse(file, environment) for file in args.warriors]
+
+    simulations = [MARS(core=Core(size=args.size),
+                        warriors=warriors,
+                        minimum_separation=args.distance,
+                        max_processes=args.processes,
+                        seed=args.seed,
+                        **ENGINES[engine])
+                   for engine in (args.reference, args.candidate)]
+
+    divergence = compare(simulations[0], simulations[1], args.rounds, args.cycles,
+                         args.every)
+    if divergence:
+        print("%s diverges from %s in round %d, cycle %d" % (args.candidate,
+                                                             args.reference,
+                                                             divergence.round,
+                                                             divergence.cycle))
+        if divergence.address is not None:
+            print("at cell %05d:" % divergence.address)
+        else:
+            print("at the task queue of %s:" % simulations[0].warriors[divergence.warrior].name)
+        print("  expected %s" % divergence.expected)
+        print("  found    %s" % divergence.found)
+        sys.exit(1)
+
+    print("%s agrees with %s on %d rounds" % (args.candidate, args.reference, args.rounds))
@@ -0,0 +1,128 @@
+#! /usr/bin/env python3
+# coding: utf-8
+
+from bisect import bisect
+from random import Random
+
+from .redcode import *
+from .redcode import OPCODES, MODIFIERS, MODES
+
+__all__ = ['Generator', 'source']
+
+def _distribution(weights, names):
+    """Return the values and cumulative weights of a distribution given as
+       a dictionary of weights by value or Redcode name (all values equally
+       likely, if None).
+    """
+    if weights is None:
+        weights = dict((value, 1) for value in names.values())
+    # names and values may be mixed, so they're sorted as values
+    by_value = {}
+    for value, weight in weights.items():
+        value = names[value.upper()] if isinstance(value, str) else value
+        by_value[value] = by_value.get(value, 0) + weight
+    values, cumulative, total = [], [], 0
+    for value, weight in sorted(by_value.items()):
+        if weight > 0:
+            total += weight
+            values.append(value)
+            cumulative.append(total)
+    if not values:
+        raise ValueError("Empty distribution")
+    return values, cumulative
+
+class Generator(object):
+    """Generates random, but valid, warriors. The opcodes, modifiers and
+       modes are drawn from distributions given as dictionaries of weights,
+       by value or by Redcode name (e.g. {'MOV': 3, 'SPL': 1}), all equally
+       likely when not given.
+
+       The numbers are mostly offsets within the warrior itself, but with
+       probability far they may be anywhere in the core. The length of the
+       warriors goes from min_length up to MAXLENGTH of the environment.
+    """
+
+    def __init__(self, environment={}, seed=None, opcodes=None, modifiers=None,
+                 modes=None, min_length=1, far=0.25):
+        self.random = Random(seed)
+        self.core_size = environment.get('CORESIZE', 8000)
+        self.max_length = environment.get('MAXLENGTH', 100)
+        self.min_length = min(min_length, self.max_length)
+        self.far = far
+        self.opcodes = _distribution(opcodes, OPCODES)
+        self.modifiers = _distribution(modifiers, MODIFIERS)
+        self.modes = _distribution(modes, MODES)
+        self.count = 0
+
+    def choice(self, distribution):
+        values, cumulative = distribution
+        return values[bisect(cumulative, self.random.random() * cumulative[-1])]
+
+    def number(self, length):
+        "Return a random number for a warrior of the given length."
+        if self.random.random() < self.far:
+            return self.random.randint(-(self.core_size // 2), self.core_size // 2)
+        return self.random.randint(-length, length)
+
+    def instruction(self, length=None):
+        "Return a random instruction, for a warrior of the given length."
+        length = length or self.max_length
+        return Instruction(self.choice(self.opcodes), self.choice(self.modifiers),
+                           self.choice(self.modes), self.number(length),
+                           self.choice(self.modes), self.number(length))
+
+    def warrior(self, length=None):
+        "Return a random warrior, of random length if not given."
+        self.count += 1
+        length = length or self.random.randint(self.min_length, self.max_length)
+        warrior = Warrior(name='random %d' % self.count, author='generator',
+                          strategy='', start=self.random.randrange(length))
+        warrior.instructions = [self.instruction(length) for i in range(length)]
+        warrior.freeze()
+        return warrior
+
+    def warriors(self, count):
+        "Yield a number of random warriors."
+        for i in range(count):
+            yield self.warrior()
+
+def source(warrior):
+    "Return the Redcode source lines of a warrior, as accepted by parse."
+    lines = [';redcode-94',
+             ';name %s' % warrior.name,
+             ';author %s' % warrior.author]
+    if warrior.strategy:
+        lines += [';strategy %s' % line for line in warrior.strategy.splitlines()]
+    lines.append('ORG %d' % warrior.start)
+    lines += [str(instruction) for instruction in warrior.instructions]
+    lines.append('END')
+    return lines
+
+if __name__ == "__main__":
+    import argparse
+    import os
+
+    parser = argparse.ArgumentParser(description='Random Redcode warriors generator')
+    parser.add_argument('--count', '-n', metavar='COUNT', type=int, nargs='?',
+                        default=1, help='Warriors to generate')
+    parser.add_argument('--size', '-s', metavar='CORESIZE', type=int, nargs='?',
+                        default=8000, help='The core size')
+    parser.add_argument('--length', '-l', metavar='MAXLENGTH', type=int, nargs='?',
+                        default=100, help='Max warrior length')
+    parser.add_argument('--seed', metavar='SEED', type=int, nargs='?',
+                        default=None, help='Random seed')
+    parser.add_argument('--output', '-o', metavar='DIRECTORY', nargs='?',
+                        default=None, help='Write each warrior to a file in DIRECTORY')
+
+    args = parser.parse_args()
+
+    generator = Generator({'CORESIZE': args.size, 'MAXLENGTH': args.length},
+                          seed=args.seed)
+
+    for n, warrior in enumerate(generator.warriors(args.count)):
+        if args.output:
+            with open(os.path.join(args.output, 'random%d.red' % n), 'w') as output:
+                output.write('\n'.join(source(warrior)) + '\n')
+        else:
+            print('\n'.join(source(warrior)))
+            print()
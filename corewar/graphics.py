@@ -1,12 +1,12 @@
-#! /usr/bin/env python
+#! /usr/bin/env python3
 # coding: utf-8
 
 import pygame
 from pygame.locals import *
 
-from core import DEFAULT_INITIAL_INSTRUCTION
-from mars import *
-from redcode import *
+from .core import Core, DEFAULT_INITIAL_INSTRUCTION
+from .mars import *
+from .redcode import *
 
 INSTRUCTIONS_PER_LINE = 100
 INSTRUCTION_SIZE_X = 9
@@ -14,6 +14,14 @@ INSTRUCTION_SIZE_Y = 9
 
 ZOOM_VIEW_WIDTH = 200
 
+# Lines of instructions visible at once in the viewport
+VIEWPORT_LINES = 80
+
+MINIMAP_WIDTH = 100
+
+# Cycles between polls of the keyboard and mouse, when running at full speed
+FAST_POLL_CYCLES = 1000
+
 I_SIZE = (INSTRUCTION_SIZE_X, INSTRUCTION_SIZE_Y)
 I_AREA = ((0,0), I_SIZE)
 
@@ -87,85 +95,205 @@ def opcode_surface(opcode, foreground=None, background=None):
     return surface
 
 class PygameMARS(MARS):
-    "A MARS with a surface drawing of the core"
+    """A MARS with a surface drawing of the core. Only the lines of the core
+       inside a scrollable viewport are drawn, and a minimap shows the whole
+       core, where each pixel aggregates a block of instructions (see own).
+    """
 
     def __init__(self, *args, **kargs):
         super(PygameMARS, self).__init__(*args, **kargs)
+        self.reset_colors()
+
+        # the viewport of the core
+        self.lines = -(-len(self) // INSTRUCTIONS_PER_LINE)
+        self.viewport_lines = min(VIEWPORT_LINES, self.lines)
+        self.first_line = 0
         self.size = (INSTRUCTION_SIZE_X * INSTRUCTIONS_PER_LINE,
-                     INSTRUCTION_SIZE_Y * (len(self) / INSTRUCTIONS_PER_LINE))
+                     INSTRUCTION_SIZE_Y * self.viewport_lines)
         self.core_surface = pygame.Surface(self.size)
         self.recent_events = pygame.Surface(self.size)
         self.recent_events.set_colorkey(DEFAULT_BG_COLOR)
 
-    def reset(self, clear_instruction=DEFAULT_INITIAL_INSTRUCTION):
+        # the minimap of the entire core
+        self.minimap_size = (MINIMAP_WIDTH, self.size[1])
+        self.block_size = max(1, -(-len(self) // (self.minimap_size[0] *
+                                                  self.minimap_size[1])))
+        self.minimap = pygame.Surface(self.minimap_size)
+        self.minimap_events = pygame.Surface(self.minimap_size)
+        self.minimap_events.set_colorkey(DEFAULT_BG_COLOR)
+
+    def reset(self, clear_instruction=DEFAULT_INITIAL_INSTRUCTION,
+              positions=None):
         self.core.clear(clear_instruction)
-        for n, instruction in enumerate(self):
-            self.core_surface.blit(opcode_surface(instruction.opcode,
-                                                  DEFAULT_FG_COLOR,
-                                                  DEFAULT_BG_COLOR),
-                                   ((n % INSTRUCTIONS_PER_LINE) * INSTRUCTION_SIZE_X,
-                                    (n / INSTRUCTIONS_PER_LINE) * INSTRUCTION_SIZE_Y))
-        self.load_warriors()
-
-    def load_warriors(self):
-        super(PygameMARS, self).load_warriors()
-        for instruction in self:
-            instruction.fg_color = DEFAULT_FG_COLOR
-            instruction.bg_color = DEFAULT_BG_COLOR
+        self.reset_colors()
+        self.minimap.fill(DEFAULT_BG_COLOR)
+        self.load_warriors(positions=positions)
+        self.draw_viewport()
+
+    def load_warriors(self, *args, **kargs):
+        # the colors of each warrior, in the order they are given
+        self.colors = [WARRIOR_COLORS[n % len(WARRIOR_COLORS)]
+                       for n in range(len(self.warriors))]
+        # the cells of each block of the minimap owned by each warrior
+        blocks = -(-len(self) // self.block_size)
+        self.block_owned = [[0] * len(self.warriors) for block in range(blocks)]
+        super(PygameMARS, self).load_warriors(*args, **kargs)
+
+    def reset_colors(self):
+        "Reset the colors, and the owner, of each instruction"
+        self.fg_colors = [DEFAULT_FG_COLOR] * len(self)
+        self.bg_colors = [DEFAULT_BG_COLOR] * len(self)
+        self.owners = [None] * len(self)
 
     def step(self):
         self.recent_events.fill(DEFAULT_BG_COLOR)
+        self.minimap_events.fill(DEFAULT_BG_COLOR)
         super(PygameMARS, self).step()
 
+    def scroll(self, lines):
+        "Scroll the viewport by a number of lines (negative scrolls up)."
+        self.scroll_to((self.first_line + lines) * INSTRUCTIONS_PER_LINE)
+
+    def scroll_to(self, address):
+        """Scroll the viewport so its first line has the address, as far as
+           the viewport stays inside the core.
+        """
+        first_line = address // INSTRUCTIONS_PER_LINE
+        first_line = max(0, min(first_line, self.lines - self.viewport_lines))
+        if first_line != self.first_line:
+            self.first_line = first_line
+            self.recent_events.fill(DEFAULT_BG_COLOR)
+            self.draw_viewport()
+
+    def draw_viewport(self):
+        "Draw every instruction inside the viewport."
+        self.core_surface.fill(DEFAULT_BG_COLOR)
+        start = self.first_line * INSTRUCTIONS_PER_LINE
+        stop = min(len(self), start + self.viewport_lines * INSTRUCTIONS_PER_LINE)
+        for address in range(start, stop):
+            self.core_surface.blit(opcode_surface(self.core[address].opcode,
+                                                  self.fg_colors[address],
+                                                  self.bg_colors[address]),
+                                   self.viewport_position(address))
+
+    def viewport_position(self, address):
+        """Return the position of an instruction in the viewport, or None if it
+           is not visible.
+        """
+        line = address // INSTRUCTIONS_PER_LINE - self.first_line
+        if 0 <= line < self.viewport_lines:
+            return ((address % INSTRUCTIONS_PER_LINE) * INSTRUCTION_SIZE_X,
+                    line * INSTRUCTION_SIZE_Y)
+
+    def viewport_address(self, position):
+        "Return the address of the instruction at a position of the viewport."
+        return (INSTRUCTIONS_PER_LINE * (self.first_line + position[1] // INSTRUCTION_SIZE_Y) +
+                position[0] // INSTRUCTION_SIZE_X)
+
+    def minimap_position(self, address):
+        "Return the position of the block of an instruction in the minimap."
+        block = address // self.block_size
+        return (block % self.minimap_size[0], block // self.minimap_size[0])
+
+    def minimap_address(self, position):
+        "Return the first address of the block at a position of the minimap."
+        return (position[1] * self.minimap_size[0] + position[0]) * self.block_size
+
+    def own(self, warrior, address):
+        """Make a warrior the owner of an instruction, the last to write or
+           execute it. The block of the instruction is drawn in the minimap
+           in the color of the warrior which owns most of its cells, brighter
+           the more of them it owns.
+        """
+        owner = self.owners[address]
+        if owner == warrior:
+            return
+        block = address // self.block_size
+        owned = self.block_owned[block]
+        if owner is not None:
+            owned[owner] -= 1
+        owned[warrior] += 1
+        self.owners[address] = warrior
+
+        dominant = max(range(len(owned)), key=owned.__getitem__)
+        dark, bright = self.colors[dominant]
+        share = owned[dominant] / self.block_size
+        self.minimap.set_at(self.minimap_position(address),
+                            [int(d + (b - d) * share) for d, b in zip(dark, bright)])
+
     def blit_into(self, surface, dest):
         surface.blit(self.core_surface, dest)
         surface.blit(self.recent_events, dest)
 
+    def blit_minimap_into(self, surface, dest):
+        "Blit the minimap, with the area of the viewport highlighted."
+        surface.blit(self.minimap, dest)
+        surface.blit(self.minimap_events, dest)
+
+        # the viewport spans whole minimap lines, unless blocks are smaller
+        # than core lines
+        first = self.minimap_position(self.first_line * INSTRUCTIONS_PER_LINE)
+        last = self.minimap_position(min(len(self), (self.first_line + self.viewport_lines) *
+                                                    INSTRUCTIONS_PER_LINE) - 1)
+        pygame.draw.rect(surface, WHITE,
+                         ((dest[0], dest[1] + first[1]),
+                          (self.minimap_size[0], last[1] - first[1] + 1)), 1)
+
     def core_event(self, warrior, address, event_type):
         address %= len(self)
-        position = ((address % INSTRUCTIONS_PER_LINE) * INSTRUCTION_SIZE_X,
-                    (address / INSTRUCTIONS_PER_LINE) * INSTRUCTION_SIZE_Y)
+        position = self.viewport_position(address)
+        minimap_position = self.minimap_position(address)
         instruction = self.core[address]
+        color = self.colors[warrior]
 
         if event_type in (EVENT_I_WRITE, EVENT_A_WRITE, EVENT_B_WRITE):
             # In case of a write event, we write the foreground with the
             # warrior's color
-            self.core_surface.blit(opcode_surface(instruction.opcode,
-                                                  warrior.color[1],
-                                                  None),
-                                   position, area=I_AREA)
-            self.recent_events.blit(opcode_surface(instruction.opcode,
-                                                   WHITE,
-                                                   DEFAULT_BG_COLOR),
-                                    position, area=I_AREA)
-            instruction.fg_color = warrior.color[1]
+            if position:
+                self.core_surface.blit(opcode_surface(instruction.opcode,
+                                                      color[1],
+                                                      None),
+                                       position, area=I_AREA)
+                self.recent_events.blit(opcode_surface(instruction.opcode,
+                                                       WHITE,
+                                                       DEFAULT_BG_COLOR),
+                                        position, area=I_AREA)
+            self.own(warrior, address)
+            self.minimap_events.set_at(minimap_position, WHITE)
+            self.fg_colors[address] = color[1]
         elif event_type == EVENT_EXECUTED:
             # In case of execution, we write the background with warrior's color
-            self.core_surface.blit(opcode_surface(instruction.opcode,
-                                                  WHITE,
-                                                  warrior.color[0]),
-                                   position, area=I_AREA)
-            self.recent_events.blit(opcode_surface(instruction.opcode,
-                                                   BLACK,
-                                                   warrior.color[1]),
-                                    position, area=I_AREA)
-            instruction.fg_color = WHITE
-            instruction.bg_color = warrior.color[0]
+            if position:
+                self.core_surface.blit(opcode_surface(instruction.opcode,
+                                                      WHITE,
+                                                      color[0]),
+                                       position, area=I_AREA)
+                self.recent_events.blit(opcode_surface(instruction.opcode,
+                                                       BLACK,
+                                                       color[1]),
+                                        position, area=I_AREA)
+            self.own(warrior, address)
+            self.minimap_events.set_at(minimap_position, color[1])
+            self.fg_colors[address] = WHITE
+            self.bg_colors[address] = color[0]
         elif event_type in (EVENT_A_ARITH, EVENT_B_ARITH, EVENT_A_DEC,
                             EVENT_B_DEC, EVENT_A_INC, EVENT_B_INC):
             # In case of arithmetic modification, or increment/decrement, we
             # write a rectangle around the instruction
-            pygame.draw.rect(self.core_surface, warrior.color[0],
-                             (position, (INSTRUCTION_SIZE_X, INSTRUCTION_SIZE_Y)),
-                              1)
-            pygame.draw.rect(self.recent_events, warrior.color[1],
-                             (position, (INSTRUCTION_SIZE_X, INSTRUCTION_SIZE_Y)),
-                              1)
+            if position:
+                pygame.draw.rect(self.core_surface, color[0],
+                                 (position, (INSTRUCTION_SIZE_X, INSTRUCTION_SIZE_Y)),
+                                  1)
+                pygame.draw.rect(self.recent_events, color[1],
+                                 (position, (INSTRUCTION_SIZE_X, INSTRUCTION_SIZE_Y)),
+                                  1)
+            self.minimap_events.set_at(minimap_position, color[1])
 
 
 if __name__ == "__main__":
     import argparse
     import sys
+    from . import redcode
 
     parser = argparse.ArgumentParser(description='MARS (Memory Array Redcode Simulator)')
     parser.add_argument('--rounds', '-r', metavar='ROUNDS', type=int, nargs='?',
@@ -182,13 +310,35 @@ if __name__ == "__main__":
                         default=100, help='Max warrior length')
     parser.add_argument('--distance', '-d', metavar='MINDISTANCE', type=int, nargs='?',
                         default=100, help='Minimum warrior distance')
-    parser.add_argument('warriors', metavar='WARRIOR', type=file, nargs='+',
+    parser.add_argument('--seed', metavar='SEED', type=int, nargs='?',
+                        default=None, help='Random seed for warriors placement')
+    parser.add_argument('--results', metavar='FILE', nargs='?', default=None,
+                        help='Append the results of each round to FILE (JSON lines, or CSV if named .csv)')
+    parser.add_argument('--resume', action='store_true', default=False,
+                        help='Skip the rounds already in the results FILE')
+    parser.add_argument('--fast', action='store_true', default=False,
+                        help='Run at full speed, without drawing, until a breakpoint (F toggles it)')
+    parser.add_argument('--break', dest='breaks', metavar='ADDRESS', type=int, action='append',
+                        default=None, help='Pause on the execution of ADDRESS (may be repeated)')
+    parser.add_argument('--watch', metavar='ADDRESS', type=int, action='append',
+                        default=None, help='Pause on changes to ADDRESS (may be repeated)')
+    parser.add_argument('--break-dat', action='store_true', default=False,
+                        help='Pause on the execution of a DAT')
+    parser.add_argument('--break-death', action='store_true', default=False,
+                        help='Pause when a warrior dies')
+    parser.add_argument('--break-processes', metavar='PROCESSES', type=int, nargs='?',
+                        default=None, help='Pause when a warrior gets to PROCESSES')
+    parser.add_argument('warriors', metavar='WARRIOR', nargs='+',
+                        type=argparse.FileType('r', encoding=redcode.WARRIOR_ENCODING),
                         help='Warrior redcode filename')
 
     args = parser.parse_args()
 
+    if args.resume and not args.results:
+        parser.error("resuming needs the results file")
+
     if len(args.warriors) > len(WARRIOR_COLORS):
-        print >> sys.stderr, "Please specify a maximum of %d warriors." % len(WARRIOR_COLORS)
+        print("Please specify a maximum of %d warriors." % len(WARRIOR_COLORS), file=sys.stderr)
         sys.exit(1)
 
     # build environment
@@ -202,16 +352,38 @@ if __name__ == "__main__":
     # assemble warriors
     warriors = [parse(file, environment) for file in args.warriors]
 
-    # initialize wins, losses, ties and color for each warrior
-    for warrior, color in zip(warriors, WARRIOR_COLORS):
-        warrior.wins = warrior.ties = warrior.losses = 0
-        warrior.color = color
+    # wins, ties and losses of each warrior
+    scores = [[0, 0, 0] for warrior in warriors]
 
     # create MARS
-    simulation = PygameMARS(minimum_separation = args.distance,
-                            max_processes = args.processes)
+    simulation = PygameMARS(core = Core(size=args.size),
+                            minimum_separation = args.distance,
+                            max_processes = args.processes,
+                            seed = args.seed)
     simulation.warriors = warriors
 
+    # breakpoints, with nothing to check if none given
+    from .debugger import Breakpoints
+    breakpoints = Breakpoints(simulation)
+    for address in args.breaks or []:
+        breakpoints.at(address)
+    for address in args.watch or []:
+        breakpoints.watch(address)
+    if args.break_dat:
+        breakpoints.on_opcode(DAT)
+    if args.break_death:
+        breakpoints.on_death()
+    if args.break_processes is not None:
+        breakpoints.on_processes(args.break_processes)
+
+    # rounds already played, when resuming, and where to record new ones
+    from .results import ResultsSink, read_results, rounds, add_outcome
+    try:
+        played = read_results(args.results, warriors) if args.resume else {}
+    except ValueError as e:
+        parser.error(str(e))
+    sink = ResultsSink(args.results) if args.results else None
+
     # initialize pygame engine
     pygame.init()
 
@@ -222,8 +394,10 @@ if __name__ == "__main__":
     OPCODE_SURFACES = load_opcode_surfaces()
 
     # create display
-    display_surface = pygame.display.set_mode((simulation.size[0] + ZOOM_VIEW_WIDTH,
+    display_surface = pygame.display.set_mode((simulation.size[0] + ZOOM_VIEW_WIDTH +
+                                               MINIMAP_WIDTH,
                                                simulation.size[1]))
+    minimap_x = simulation.size[0] + ZOOM_VIEW_WIDTH
 
     # initializations
     c_address = 0
@@ -231,18 +405,31 @@ if __name__ == "__main__":
     # control variables
     paused = False
     stop_rounds = False
+    next_round = False
+    fast = args.fast
 
     # create clock to control FPS
     clock = pygame.time.Clock()
 
     # for each round
-    for round in xrange(1, args.rounds + 1):
+    for round, positions, played_outcomes in rounds(simulation, args.rounds, played):
+
+        if played_outcomes is not None:
+            print()
+            print("Round %d already played" % round)
+            for score, outcome in zip(scores, played_outcomes):
+                add_outcome(score, outcome)
+            continue
 
         # reset simulation and load warriors
-        simulation.reset()
+        simulation.reset(positions=positions)
+        breakpoints.reset()
+
+        # outcome of each warrior, as the round goes
+        outcomes = {}
 
-        # start with all warriors active
-        active_warriors = list(warriors)
+        # start with all warriors active, by index
+        active_warriors = list(range(len(warriors)))
 
         # how many warriors should be playing to skip to next round
         active_warrior_to_stop = 1 if len(warriors) >= 2 else 0
@@ -254,62 +441,78 @@ if __name__ == "__main__":
         # control variable
         next_round = False
 
-        print
-        print "Starting round %d" % round
+        print()
+        print("Starting round %d" % round)
 
-        for cycle in xrange(args.cycles):
+        for cycle in range(args.cycles):
             # step one simulation in MARS
             simulation.step()
 
-            # get mouse position
-            mouse_pos = pygame.mouse.get_pos()
-            # calculate address based on mouse position if position is over core
-            if 0 <= mouse_pos[0] <= simulation.size[0] and 0 <= mouse_pos[1] <= simulation.size[1]:
-                c_address = (INSTRUCTIONS_PER_LINE * (mouse_pos[1]/INSTRUCTION_SIZE_Y) +
-                             (mouse_pos[0] / INSTRUCTION_SIZE_X))
-
-            # clear display part of instructions
-            display_surface.fill(BLACK, ((simulation.size[0], 0),
-                                         (ZOOM_VIEW_WIDTH, simulation.size[1])))
-            for n, address in enumerate(xrange(c_address-18, c_address+18)):
-                instruction = simulation[address]
-                i_surface = core_font.render("%04d %s" % (address,
-                                                          instruction),
-                                               True,
-                                               instruction.fg_color)
-                pygame.draw.rect(display_surface, instruction.bg_color,
-                                 ((simulation.size[0], n*20),
-                                  (simulation.size[0] + ZOOM_VIEW_WIDTH,
-                                   (n+1)*20)))
-                display_surface.blit(i_surface, (simulation.size[0], n*20))
-
-            # blit MARS visualization into display
-            simulation.blit_into(display_surface, (0,0))
-            pygame.display.update()
-            clock.tick(30)
+            # stop on breakpoints, drawing the core as it is
+            for breakpoint, n, address in breakpoints.check():
+                print("Breakpoint after %d cycles: %s by %s (%s)%s" % (
+                    cycle + 1, breakpoint, warriors[n].name, warriors[n].author,
+                    "" if address is None else " at %05d" % address))
+                paused = True
+                fast = False
+
+            if not fast:
+                # get mouse position
+                mouse_pos = pygame.mouse.get_pos()
+                # calculate address based on mouse position if position is over core
+                if 0 <= mouse_pos[0] < simulation.size[0] and 0 <= mouse_pos[1] < simulation.size[1]:
+                    c_address = simulation.viewport_address(mouse_pos)
+
+                # clear display part of instructions
+                display_surface.fill(BLACK, ((simulation.size[0], 0),
+                                             (ZOOM_VIEW_WIDTH, simulation.size[1])))
+                for n, address in enumerate(range(c_address-18, c_address+18)):
+                    instruction = simulation[address]
+                    i_surface = core_font.render("%04d %s" % (address,
+                                                              instruction),
+                                                   True,
+                                                   simulation.fg_colors[address % len(simulation)])
+                    pygame.draw.rect(display_surface, simulation.bg_colors[address % len(simulation)],
+                                     ((simulation.size[0], n*20),
+                                      (simulation.size[0] + ZOOM_VIEW_WIDTH,
+                                       (n+1)*20)))
+                    display_surface.blit(i_surface, (simulation.size[0], n*20))
+
+                # blit MARS visualization into display
+                simulation.blit_into(display_surface, (0,0))
+                simulation.blit_minimap_into(display_surface, (minimap_x, 0))
+                pygame.display.update()
+                clock.tick(30)
 
             to_remove = []
-            for warrior in active_warriors:
-                if not warrior.task_queue:
-                    print "%s (%s) losses after %d cycles." % (warrior.name,
-                                                               warrior.author,
-                                                               cycle)
-                    warrior.losses += 1
-                    to_remove.append(warrior)
-
-            for warrior in to_remove:
-                active_warriors.remove(warrior)
+            for n in active_warriors:
+                if not simulation.task_queues[n]:
+                    print("%s (%s) losses after %d cycles." % (warriors[n].name,
+                                                               warriors[n].author,
+                                                               cycle))
+                    scores[n][2] += 1
+                    outcomes[n] = LOSS
+                    to_remove.append(n)
+
+            for n in to_remove:
+                active_warriors.remove(n)
 
             # if there's only one left, or are all dead, then stop simulation
             if len(active_warriors) <= active_warrior_to_stop:
-                for warrior in active_warriors:
-                    print "%s (%s) wins after %d cycles." % (warrior.name,
-                                                             warrior.author,
-                                                             cycle)
-                    warrior.wins += 1
+                for n in active_warriors:
+                    print("%s (%s) wins after %d cycles." % (warriors[n].name,
+                                                             warriors[n].author,
+                                                             cycle))
+                    scores[n][0] += 1
+                    outcomes[n] = WIN
                 break
 
+            # at full speed, events are only polled once in a while
+            if fast and (cycle + 1) % FAST_POLL_CYCLES:
+                continue
+
             step = False
+            scrolled = False
             while True:
                 for event in pygame.event.get():
                     if event.type == QUIT:
@@ -325,43 +528,81 @@ if __name__ == "__main__":
                             # step simulation (and pause)
                             paused = True
                             step = True
+                        elif event.key == K_f:
+                            # toggle running at full speed
+                            fast = not fast
+                            paused = False
                         elif event.key == K_n:
                             # Tie all remaining bots and go to next round
                             next_round = True
+                        elif event.key in (K_PAGEUP, K_PAGEDOWN):
+                            # scroll the viewport a page
+                            simulation.scroll(simulation.viewport_lines *
+                                              (-1 if event.key == K_PAGEUP else 1))
+                            scrolled = True
+                    elif event.type == MOUSEBUTTONDOWN:
+                        if event.button in (4, 5):
+                            # mouse wheel scrolls the viewport
+                            simulation.scroll(-1 if event.button == 4 else 1)
+                            scrolled = True
+                        elif (event.button == 1 and event.pos[0] >= minimap_x and
+                              event.pos[1] < simulation.minimap_size[1]):
+                            # clicking the minimap centers the viewport there
+                            address = simulation.minimap_address((event.pos[0] - minimap_x,
+                                                                  event.pos[1]))
+                            simulation.scroll_to(address - INSTRUCTIONS_PER_LINE *
+                                                           (simulation.viewport_lines // 2))
+                            scrolled = True
+
+                if scrolled:
+                    # redraw while paused
+                    simulation.blit_into(display_surface, (0,0))
+                    simulation.blit_minimap_into(display_surface, (minimap_x, 0))
+                    pygame.display.update()
+                    scrolled = False
 
                 if not paused or step or next_round:
                     break
 
             if next_round:
-                for warrior in active_warriors:
-                    if warrior.task_queue:
-                        print "%s (%s) ties after %d cycles." % (warrior.name,
-                                                                 warrior.author,
-                                                                 cycle)
-                        warrior.ties += 1
+                for n in active_warriors:
+                    if simulation.task_queues[n]:
+                        print("%s (%s) ties after %d cycles." % (warriors[n].name,
+                                                                 warriors[n].author,
+                                                                 cycle))
+                        scores[n][1] += 1
+                        outcomes[n] = TIE
                 break
         else:
             # running until max cycles: tie
-            for warrior in active_warriors:
-                if warrior.task_queue:
-                    print "%s (%s) ties after %d cycles." % (warrior.name,
-                                                             warrior.author,
-                                                             cycle)
-                    warrior.ties += 1
+            for n in active_warriors:
+                if simulation.task_queues[n]:
+                    print("%s (%s) ties after %d cycles." % (warriors[n].name,
+                                                             warriors[n].author,
+                                                             cycle))
+                    scores[n][1] += 1
+                    outcomes[n] = TIE
 
         if stop_rounds:
             break
 
+        if sink:
+            sink.write(round, warriors, positions,
+                       [outcomes.get(n, LOSS) for n in range(len(warriors))])
+
+    if sink:
+        sink.close()
+
     # print final results
-    print
-    print "Final results: (%d rounds)" % round
-    print "%s %s %s %s" % ("Warrior (Author)".ljust(40), "wins".rjust(5),
-                           "ties".rjust(5), "losses".rjust(5))
-    for warrior in warriors:
-        print "%s %s %s %s" % (("%s (%s)" % (warrior.name, warrior.author)).ljust(40),
-                               str(warrior.wins).rjust(5),
-                               str(warrior.ties).rjust(5),
-                               str(warrior.losses).rjust(5))
+    print()
+    print("Final results: (%d rounds)" % round)
+    print("%s %s %s %s" % ("Warrior (Author)".ljust(40), "wins".rjust(5),
+                           "ties".rjust(5), "losses".rjust(5)))
+    for warrior, (wins, ties, losses) in zip(warriors, scores):
+        print("%s %s %s %s" % (("%s (%s)" % (warrior.name, warrior.author)).ljust(40),
+                               str(wins).rjust(5),
+                               str(ties).rjust(5),
+                               str(losses).rjust(5)))
 
     if not stop_rounds and not next_round:
         # keeps display open, until quit
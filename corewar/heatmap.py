@@ -0,0 +1,245 @@
+#! /usr/bin/env python3
+# coding: utf-8
+
+from multiprocessing import Pool, cpu_count
+
+import numpy
+
+from .core import Core
+from .mars import *
+
+__all__ = ['EVENT_TYPES', 'Heatmap', 'HeatmapMARS', 'accumulate']
+
+# Number of event types (see the EVENT_* constants of mars)
+EVENT_TYPES = 13
+
+# Steps between deliveries of the events to the heatmap
+EVENT_BATCH = 100
+
+# NumPy types of the items of the event arrays of MARS
+EVENT_DTYPES = {'H': numpy.uint16, 'l': numpy.int_, 'B': numpy.uint8}
+
+class Heatmap(object):
+    """Counts of the core events of each warrior, by event type and address,
+       accumulated across many rounds. Addresses are relative to where the
+       warrior was loaded in each round, so the counts of rounds with
+       different placements line up.
+
+       Heatmaps of the same warriors (played in other processes, for
+       instance) are merged by adding them.
+    """
+
+    def __init__(self, warriors, size=8000):
+        self.names = [warrior.name for warrior in warriors]
+        self.size = size
+        self.rounds = 0
+        self.counts = numpy.zeros((len(warriors), EVENT_TYPES, size), dtype=numpy.int64)
+
+    def __iadd__(self, other):
+        if other.names != self.names or other.size != self.size:
+            raise ValueError("Heatmaps of other warriors or core size")
+        self.counts += other.counts
+        self.rounds += other.rounds
+        return self
+
+    def __add__(self, other):
+        heatmap = Heatmap([], self.size)
+        heatmap.names = list(self.names)
+        heatmap.counts = self.counts.copy()
+        heatmap.rounds = self.rounds
+        heatmap += other
+        return heatmap
+
+    def add(self, warriors, addresses, event_types, count, origins):
+        """Count a batch of events, given as arrays like MARS.core_events,
+           with the origins (load positions) of the warriors.
+        """
+        warriors = numpy.frombuffer(warriors, EVENT_DTYPES[warriors.typecode], count)
+        addresses = numpy.frombuffer(addresses, EVENT_DTYPES[addresses.typecode], count)
+        event_types = numpy.frombuffer(event_types, EVENT_DTYPES[event_types.typecode], count)
+        relative = (addresses - numpy.asarray(origins)[warriors]) % self.size
+        numpy.add.at(self.counts, (warriors, event_types, relative), 1)
+
+    def total(self, warrior, event_types=None):
+        """Return the counts of a warrior (by index) for each address, summed
+           over the given event types (all of them, if None).
+        """
+        counts = self.counts[warrior]
+        if event_types is not None:
+            counts = counts[list(event_types)]
+        return counts.sum(axis=0)
+
+    def save(self, filename):
+        "Save the raw counts as a NumPy .npz file."
+        numpy.savez_compressed(filename, counts=self.counts, rounds=self.rounds,
+                               names=numpy.array(self.names))
+
+    @classmethod
+    def load(cls, filename):
+        "Load a heatmap saved as a NumPy .npz file."
+        data = numpy.load(filename)
+        heatmap = cls([], data['counts'].shape[2])
+        heatmap.names = list(data['names'])
+        heatmap.counts = data['counts']
+        heatmap.rounds = int(data['rounds'])
+        return heatmap
+
+    def save_png(self, filename, warrior, event_types=None, scale=4):
+        """Save the counts of a warrior (see total) as a PNG image, with the
+           same layout and colors of the graphical MARS. The brightness is
+           logarithmic on the counts.
+        """
+        import pygame
+        from .graphics import INSTRUCTIONS_PER_LINE, DEFAULT_BG_COLOR, WARRIOR_COLORS
+
+        counts = self.total(warrior, event_types)
+        lines = -(-self.size // INSTRUCTIONS_PER_LINE)
+        intensity = numpy.zeros(lines * INSTRUCTIONS_PER_LINE)
+        intensity[:self.size] = numpy.log1p(counts) / numpy.log1p(max(1, counts.max()))
+
+        background = numpy.array(DEFAULT_BG_COLOR, dtype=float)
+        color = numpy.array(WARRIOR_COLORS[warrior % len(WARRIOR_COLORS)][1], dtype=float)
+        pixels = background + intensity[:, numpy.newaxis] * (color - background)
+        pixels = pixels.astype(numpy.uint8).reshape(lines, INSTRUCTIONS_PER_LINE, 3)
+
+        # surfaces are indexed by x, then y
+        surface = pygame.surfarray.make_surface(pixels.transpose(1, 0, 2))
+        surface = pygame.transform.scale(surface, (INSTRUCTIONS_PER_LINE * scale,
+                                                   lines * scale))
+        pygame.image.save(surface, filename)
+
+class HeatmapMARS(MARS):
+    """A MARS accumulating the events of every round it plays in a heatmap.
+       The events are delivered in batches, counted without going through
+       Python for each one.
+    """
+
+    def __init__(self, heatmap=None, event_batch=EVENT_BATCH, **kargs):
+        self.heatmap = heatmap
+        self.origins = []
+        MARS.__init__(self, event_batch=event_batch, **kargs)
+
+    def load_warriors(self, randomize=True, positions=None):
+        if positions is None:
+            positions = self.placement(randomize)
+
+        # the events of the previous round are relative to its positions
+        self.flush_events()
+        self.origins = list(positions)
+
+        if self.heatmap is None:
+            self.heatmap = Heatmap(self.warriors, len(self.core))
+        self.heatmap.rounds += 1
+        MARS.load_warriors(self, randomize, positions)
+
+    def core_events(self, warriors, addresses, event_types, count):
+        self.heatmap.add(warriors, addresses, event_types, count, self.origins)
+
+    def run_slices(self, cycles=80000, slice_cycles=1000, budget=None):
+        for cycle, outcomes in MARS.run_slices(self, cycles, slice_cycles, budget):
+            if outcomes is not None:
+                # the round is over: count all of its events
+                self.flush_events()
+            yield cycle, outcomes
+
+def accumulate(warriors, rounds=100, cycles=80000, size=8000, max_processes=8000,
+               minimum_separation=100, seed=None, processes=1):
+    """Play a number of rounds between warriors, and return the heatmap of
+       their events. The rounds are spread through a pool of worker
+       processes (all the CPUs, if processes is None), each seeded after the
+       given seed, and their heatmaps are merged.
+    """
+    if processes == 1:
+        return _accumulate((warriors, rounds, cycles, size, max_processes,
+                            minimum_separation, seed))
+
+    processes = processes or cpu_count()
+    pool = Pool(processes)
+    try:
+        # the rounds are split as evenly as possible
+        heatmaps = pool.map(_accumulate, [(warriors,
+                                           rounds // processes + (1 if i < rounds % processes else 0),
+                                           cycles, size, max_processes, minimum_separation,
+                                           None if seed is None else seed + i)
+                                          for i in range(processes)])
+    finally:
+        pool.close()
+        pool.join()
+
+    heatmap = heatmaps[0]
+    for other in heatmaps[1:]:
+        heatmap += other
+    return heatmap
+
+def _accumulate(args):
+    """Play the share of rounds of one worker of accumulate, in a simulation
+       of its own, and return the heatmap of their events. The settings come
+       packed in a tuple, as Pool.map hands them out.
+    """
+    warriors, rounds, cycles, size, max_processes, minimum_separation, seed = args
+
+    simulation = HeatmapMARS(heatmap=Heatmap(warriors, size),
+                             core=Core(size=size),
+                             minimum_separation=minimum_separation,
+                             max_processes=max_processes,
+                             seed=seed)
+    simulation.warriors = warriors
+
+    for round in range(rounds):
+        simulation.reset()
+        simulation.run(cycles)
+
+    return simulation.heatmap
+
+if __name__ == "__main__":
+    import argparse
+    from . import redcode
+
+    parser = argparse.ArgumentParser(description='Core activity heatmaps of warriors')
+    parser.add_argument('--rounds', '-r', metavar='ROUNDS', type=int, nargs='?',
+                        default=100, help='Rounds to play')
+    parser.add_argument('--size', '-s', metavar='CORESIZE', type=int, nargs='?',
+                        default=8000, help='The core size')
+    parser.add_argument('--cycles', '-c', metavar='CYCLES', type=int, nargs='?',
+                        default=80000, help='Cycles until tie')
+    parser.add_argument('--processes', '-p', metavar='MAXPROCESSES', type=int, nargs='?',
+                        default=8000, help='Max processes')
+    parser.add_argument('--length', '-l', metavar='MAXLENGTH', type=int, nargs='?',
+                        default=100, help='Max warrior length')
+    parser.add_argument('--distance', '-d', metavar='MINDISTANCE', type=int, nargs='?',
+                        default=100, help='Minimum warrior distance')
+    parser.add_argument('--seed', metavar='SEED', type=int, nargs='?',
+                        default=None, help='Random seed for warriors placement')
+    parser.add_argument('--workers', '-w', metavar='WORKERS', type=int, nargs='?',
+                        default=1, help='Worker processes (0 for all the CPUs)')
+    parser.add_argument('--output', '-o', metavar='PREFIX', nargs='?',
+                        default='heatmap', help='Prefix of the output files')
+    parser.add_argument('--events', '-e', metavar='EVENT', type=int, nargs='*',
+                        default=None, help='Event types drawn in the images (default all)')
+    parser.add_argument('warriors', metavar='WARRIOR', nargs='+',
+                        type=argparse.FileType('r', encoding=redcode.WARRIOR_ENCODING),
+                        help='Warrior redcode filename')
+
+    args = parser.parse_args()
+
+    # build environment
+    environment = {'CORESIZE': args.size,
+                   'CYCLES': args.cycles,
+                   'ROUNDS': args.rounds,
+                   'MAXPROCESSES': args.processes,
+                   'MAXLENGTH': args.length,
+                   'MINDISTANCE': args.distance}
+
+    # assemble warriors
+    warriors = [redcode.parse(file, environment) for file in args.warriors]
+
+    heatmap = accumulate(warriors, args.rounds, args.cycles, args.size,
+                         args.processes, args.distance, args.seed,
+                         args.workers or None)
+
+    heatmap.save(args.output + '.npz')
+    print("Saved the counts of %d rounds to %s.npz" % (heatmap.rounds, args.output))
+    for n, warrior in enumerate(warriors):
+        filename = "%s-%d.png" % (args.output, n)
+        heatmap.save_png(filename, n, args.events)
+        print("Saved the heatmap of %s (%s) to %s" % (warrior.name, warrior.author, filename))
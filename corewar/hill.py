@@ -0,0 +1,249 @@
+#! /usr/bin/env python3
+# coding: utf-8
+
+from math import sqrt
+from multiprocessing import Pool, cpu_count
+
+from .core import Core
+from .mars import MARS, Budget, UNFINISHED
+from .results import add_outcome
+
+__all__ = ['battle', 'confidence_interval', 'Hill']
+
+# Points awarded by outcome, as in most King of the Hill servers
+WIN_POINTS = 3
+TIE_POINTS = 1
+
+# Normal quantile of the confidence of the score intervals (95%)
+CONFIDENCE_Z = 1.96
+
+def confidence_interval(wins, ties, losses, z=CONFIDENCE_Z):
+    """Return the (Wilson) confidence interval of the score of a warrior, as
+       a fraction of the rounds: a win scores 1 and a tie half. Ties are
+       counted as if they were one half a win and one half a loss, so the
+       interval is a bit wider than need be.
+    """
+    rounds = wins + ties + losses
+    if not rounds:
+        return 0.0, 1.0
+    score = (wins + ties / 2.0) / rounds
+    center = (score + z * z / (2 * rounds)) / (1 + z * z / rounds)
+    margin = (z / (1 + z * z / rounds) *
+              sqrt(score * (1 - score) / rounds + z * z / (4 * rounds * rounds)))
+    return max(0.0, center - margin), min(1.0, center + margin)
+
+def battle(warrior_a, warrior_b, rounds=100, cycles=80000, size=8000,
+           max_processes=8000, minimum_separation=100, seed=None,
+           exhaustive=False, processes=1, precision=None, cache=None,
+           budget=None):
+    """Play a number of rounds between two warriors. Return the wins, ties
+       and losses of each warrior. They don't mirror each other: when both
+       warriors die in the same cycle, both lose.
+
+       If a precision is given, rounds is only the maximum: the battle stops
+       as soon as the confidence interval of the score (see
+       confidence_interval) is narrower than the precision either side.
+
+       If exhaustive, the number of rounds is ignored and instead one round is
+       played at each legal offset of the second warrior (the first is always
+       at the start of the core). These rounds are spread through a pool of
+       worker processes (all the CPUs, if processes is None).
+
+       Results of seeded (or exhaustive) battles are looked up in a cache
+       (see cache.ResultCache), if given, and stored there once played.
+
+       A budget limits the wall-clock time of the battle: seconds, or a
+       mars.Budget (e.g. to cancel it). Once spent, the battle stops and
+       returns the results of the rounds finished so far, which then are
+       fewer than asked for (and not cached).
+    """
+    if budget is not None and not isinstance(budget, Budget):
+        budget = Budget(budget)
+
+    if cache is not None and (seed is not None or exhaustive):
+        # only settings which may change the results are part of the key
+        key = dict(rounds=None if exhaustive else rounds, cycles=cycles,
+                   size=size, max_processes=max_processes,
+                   minimum_separation=minimum_separation,
+                   seed=None if exhaustive else seed, exhaustive=exhaustive,
+                   precision=None if exhaustive else precision)
+        cached = cache.get([warrior_a, warrior_b], **key)
+        if cached:
+            return tuple(cached)
+        scores = battle(warrior_a, warrior_b, rounds, cycles, size, max_processes,
+                        minimum_separation, seed, exhaustive, processes, precision,
+                        budget=budget)
+        if budget is None or not budget.spent():
+            cache.put([warrior_a, warrior_b], scores, **key)
+        return scores
+
+    settings = (cycles, size, max_processes, minimum_separation, seed, budget)
+
+    if not exhaustive:
+        return _play((warrior_a, warrior_b, [None] * rounds) + settings + (precision,))
+
+    offsets = range(len(warrior_a) + minimum_separation,
+                    size - len(warrior_b) - minimum_separation + 1)
+    if processes == 1:
+        return _play((warrior_a, warrior_b, [[0, offset] for offset in offsets]) +
+                     settings + (None,))
+
+    processes = processes or cpu_count()
+    pool = Pool(processes)
+    try:
+        # interleave the offsets so every chunk gets a similar workload
+        chunks = processes * 4
+        results = pool.map(_play, [(warrior_a, warrior_b,
+                                    [[0, offset] for offset in offsets[i::chunks]]) +
+                                   settings + (None,)
+                                   for i in range(chunks)])
+    finally:
+        pool.close()
+        pool.join()
+
+    return tuple(tuple(sum(counts) for counts in zip(*scores))
+                 for scores in zip(*results))
+
+def _play(args):
+    """Play one round for each item of positions (None for random placement),
+       or until the score is as precise as required, and return the wins,
+       ties and losses of each warrior. Stops at the first round left
+       unfinished by the budget, if any. Receives a single tuple of
+       arguments, to be mapped through a pool.
+    """
+    (warrior_a, warrior_b, positions, cycles, size, max_processes,
+     minimum_separation, seed, budget, precision) = args
+
+    simulation = MARS(core=Core(size=size),
+                      minimum_separation=minimum_separation,
+                      max_processes=max_processes,
+                      seed=seed)
+    simulation.warriors = [warrior_a, warrior_b]
+
+    scores = [[0, 0, 0], [0, 0, 0]]
+    for round_positions in positions:
+        if budget is not None and budget.spent():
+            break
+        simulation.reset(positions=round_positions)
+        outcomes = simulation.run(cycles, budget)
+        if UNFINISHED in outcomes:
+            break
+        for score, outcome in zip(scores, outcomes):
+            add_outcome(score, outcome)
+
+        if precision is not None:
+            low, high = confidence_interval(*scores[0])
+            if high - low <= 2 * precision:
+                break
+
+    return tuple(tuple(score) for score in scores)
+
+class Hill(object):
+    """A King of the Hill: a fixed number of resident warriors, ranked by the
+       scores of the battles against each other.
+
+       The results of every pairing are kept, so a challenger only plays
+       against each resident once, and removing a warrior only discards its
+       own results. The settings are given to every battle: with a precision,
+       lopsided pairings are decided in fewer rounds, and with a budget (in
+       seconds) no pairing takes longer than that. The results of a pairing
+       cut short by its budget are kept, but the pairing is also added to
+       incomplete (in both orders) until retry plays it whole.
+    """
+
+    def __init__(self, size=10, rounds=100, **settings):
+        self.size = size
+        self.rounds = rounds
+        self.settings = settings
+        self.warriors = []
+        # (warrior, opponent) -> (wins, ties, losses) of warrior
+        self.results = {}
+        # (warrior, opponent) of the pairings with partial results
+        self.incomplete = set()
+
+    def __iter__(self):
+        return iter(self.ranking())
+
+    def __len__(self):
+        return len(self.warriors)
+
+    def __contains__(self, warrior):
+        return warrior in self.warriors
+
+    def __repr__(self):
+        return "<Hill size=%d %d warriors>" % (self.size, len(self.warriors))
+
+    def score(self, warrior):
+        "Return the points of a warrior against all the other residents."
+        score = 0
+        for opponent in self.warriors:
+            if opponent is not warrior:
+                wins, ties, losses = self.results[warrior, opponent]
+                score += wins * WIN_POINTS + ties * TIE_POINTS
+        return score
+
+    def interval(self, warrior, opponent):
+        """Return the confidence interval of the score of a warrior against
+           another resident (see confidence_interval).
+        """
+        return confidence_interval(*self.results[warrior, opponent])
+
+    def ranking(self):
+        """Return the warriors sorted by score, best first. In case of equal
+           scores, the older resident comes first.
+        """
+        scores = dict((warrior, self.score(warrior)) for warrior in self.warriors)
+        return sorted(self.warriors, key=lambda warrior: -scores[warrior])
+
+    def add(self, warrior):
+        "Add a warrior to the hill, playing it against every resident."
+        for opponent in self.warriors:
+            self.play(warrior, opponent)
+        self.warriors.append(warrior)
+
+    def play(self, warrior, opponent):
+        "Play the battle of a pairing, keeping its results."
+        settings = dict(self.settings)
+        budget = settings.get('budget')
+        if budget is not None and not isinstance(budget, Budget):
+            # a budget of its own, to tell whether it ran out
+            budget = settings['budget'] = Budget(budget)
+        (self.results[warrior, opponent],
+         self.results[opponent, warrior]) = battle(warrior, opponent, self.rounds,
+                                                   **settings)
+        if budget is not None and budget.spent():
+            self.incomplete.update([(warrior, opponent), (opponent, warrior)])
+        else:
+            self.incomplete.difference_update([(warrior, opponent), (opponent, warrior)])
+
+    def retry(self):
+        "Play again the incomplete pairings, with the budget of each battle."
+        for warrior, opponent in list(self.incomplete):
+            if (warrior, opponent) in self.incomplete:
+                self.play(warrior, opponent)
+
+    def remove(self, warrior):
+        "Remove a warrior from the hill, discarding its results."
+        self.warriors.remove(warrior)
+        for opponent in self.warriors:
+            del self.results[warrior, opponent]
+            del self.results[opponent, warrior]
+            self.incomplete.difference_update([(warrior, opponent), (opponent, warrior)])
+
+    def replace(self, resident, warrior):
+        """Replace a resident by another warrior. Only the pairings of the new
+           warrior are played.
+        """
+        self.remove(resident)
+        self.add(warrior)
+
+    def challenge(self, warrior):
+        """Submit a challenger to the hill. If the hill is over its size, the
+           bottom warrior (possibly the challenger itself) is evicted and
+           returned.
+        """
+        self.add(warrior)
+        if len(self.warriors) > self.size:
+            evicted = self.ranking()[-1]
+            self.remove(evicted)
+            return evicted
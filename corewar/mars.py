@@ -1,17 +1,20 @@
-#! /usr/bin/env python
+#! /usr/bin/env python3
 # coding: utf-8
 
+from array import array
 from copy import copy
 import operator
-from random import randint
+from random import Random
+import time
 
-from core import Core, DEFAULT_INITIAL_INSTRUCTION
-from redcode import *
+from .core import Core, HashedCore, SparseCore, DEFAULT_INITIAL_INSTRUCTION
+from .redcode import *
 
-__all__ = ['MARS', 'EVENT_EXECUTED', 'EVENT_I_WRITE', 'EVENT_I_READ',
+__all__ = ['MARS', 'Budget', 'EVENT_EXECUTED', 'EVENT_I_WRITE', 'EVENT_I_READ',
            'EVENT_A_DEC', 'EVENT_A_INC', 'EVENT_B_DEC', 'EVENT_B_INC',
            'EVENT_A_READ', 'EVENT_A_WRITE', 'EVENT_B_READ', 'EVENT_B_WRITE',
-           'EVENT_A_ARITH', 'EVENT_B_ARITH']
+           'EVENT_A_ARITH', 'EVENT_B_ARITH', 'LOSS', 'WIN', 'TIE',
+           'UNFINISHED']
 
 # Event types
 EVENT_EXECUTED = 0
@@ -28,36 +31,244 @@ EVENT_B_WRITE  = 10
 EVENT_A_ARITH  = 11
 EVENT_B_ARITH  = 12
 
+# Events which make the warrior the owner of the cell
+WRITE_EVENTS = frozenset([EVENT_I_WRITE, EVENT_A_WRITE, EVENT_B_WRITE])
+
+# Events which change a cell: writes, and arithmetic on its fields
+CHANGE_EVENTS = WRITE_EVENTS | frozenset([EVENT_A_DEC, EVENT_A_INC, EVENT_B_DEC,
+                                          EVENT_B_INC, EVENT_A_ARITH, EVENT_B_ARITH])
+
+# Maximum number of events of a single instruction execution
+MAX_EVENTS_PER_EXECUTION = 16
+
+# Round outcomes
+LOSS = 0
+WIN  = 1
+TIE  = 2
+# of a warrior still alive in a round stopped by its budget
+UNFINISHED = 3
+
+# Cycles between checks of the budget of a run
+CHECK_CYCLES = 1000
+
+class Budget(object):
+    """A limit on the wall-clock time of runs, which may also be cancelled at
+       any moment (e.g. from another thread). Runs check it every
+       check_cycles cycles, and stop cleanly once it's spent. A budget may be
+       shared by several rounds, to limit them all together.
+
+       Budgets may be sent to other processes, but then cancelling the
+       original doesn't cancel the copies: only the deadline is shared.
+    """
+
+    def __init__(self, seconds=None, check_cycles=CHECK_CYCLES):
+        self.deadline = None if seconds is None else time.time() + seconds
+        self.check_cycles = check_cycles
+        self.cancelled = False
+
+    def cancel(self):
+        "Cancel the runs of the budget, at their next check."
+        self.cancelled = True
+
+    def spent(self):
+        "Return whether the runs of the budget must stop."
+        return self.cancelled or (self.deadline is not None and
+                                  time.time() >= self.deadline)
+
+class QueueHash(object):
+    """An incremental polynomial hash of a task queue: the sum of each
+       address times a power of BASE given by its position, updated as
+       addresses are appended to the end and popped from the start.
+    """
+
+    MODULUS = 2**61 - 1
+    BASE = 1000003
+    INVERSE = pow(BASE, MODULUS - 2, MODULUS)
+
+    def __init__(self, queue=()):
+        self.value = 0
+        self.head_power = self.tail_power = self.head_inverse = 1
+        for address in queue:
+            self.append(address)
+
+    def append(self, address):
+        self.value = (self.value + (address + 1) * self.tail_power) % self.MODULUS
+        self.tail_power = self.tail_power * self.BASE % self.MODULUS
+
+    def popleft(self, address):
+        self.value = (self.value - (address + 1) * self.head_power) % self.MODULUS
+        self.head_power = self.head_power * self.BASE % self.MODULUS
+        self.head_inverse = self.head_inverse * self.INVERSE % self.MODULUS
+
+    def digest(self):
+        "Return the hash, as if the first address was at position zero."
+        return self.value * self.head_inverse % self.MODULUS
+
 class MARS(object):
     """The MARS. Encapsulates a simulation.
+
+       All the state of a simulation is kept here, the task queues of the
+       warriors included, so the same warriors may take part in many
+       simulations at once, or fill many slots of the same one. The state
+       of each warrior is indexed by its slot in the warriors list.
     """
 
     def __init__(self, core=None, warriors=None, minimum_separation=100,
-                 randomize=True, max_processes=None):
-        self.core = core if core else Core()
+                 randomize=True, max_processes=None, seed=None, compiled=False,
+                 detect_repetition=False, event_batch=None, sampler=None):
+        if detect_repetition and core and not isinstance(core, HashedCore):
+            raise ValueError("Detecting repeated states requires a HashedCore")
+        self.core = core if core else (HashedCore() if detect_repetition else Core())
+        self.detect_repetition = detect_repetition
+        self.task_queues = []
+        self.queue_hashes = []
+        self.random = Random(seed)
+        self.compiled = compiled
         self.minimum_separation = minimum_separation
         self.max_processes = max_processes if max_processes else len(self.core)
         self.warriors = warriors if warriors else []
+        self.event_batch = event_batch
+        self.event_listeners = []
+        self.sampler = None
+        if event_batch:
+            # record events instead of handling them one by one
+            self.core_event = self.record_event
+            self.batched_steps = 0
+            self.event_count = 0
+            self.event_warriors = self.event_addresses = self.event_types = None
+        if sampler is not None:
+            self.attach_sampler(sampler)
         if self.warriors:
             self.load_warriors(randomize)
 
     def core_event(self, warrior, address, event_type):
         """Supposed to be implemented by subclasses to handle core
-           events.
+           events. The warrior is given by its index in the warriors list.
+        """
+        pass
+
+    def core_events(self, warriors, addresses, event_types, count):
+        """Supposed to be implemented by subclasses to handle batches of core
+           events, when delivering events in batches. The first count items
+           of the arrays are the events: the index of the warrior in the
+           warriors list, the (trimmed) address and the event type.
         """
         pass
 
-    def reset(self, clear_instruction=DEFAULT_INITIAL_INSTRUCTION):
+    def record_event(self, warrior, address, event_type):
+        "Record a core event, to be delivered in a batch."
+        if self.event_count == len(self.event_types):
+            self.flush_events()
+        n = self.event_count
+        self.event_warriors[n] = warrior
+        self.event_addresses[n] = address % self.core.size
+        self.event_types[n] = event_type
+        self.event_count = n + 1
+
+    def flush_events(self):
+        "Deliver the recorded core events in a batch."
+        if self.event_count:
+            self.core_events(self.event_warriors, self.event_addresses,
+                             self.event_types, self.event_count)
+        self.event_count = 0
+        self.batched_steps = 0
+
+    def add_event_listener(self, listener):
+        """Call a listener with every core event too, after core_event, until
+           removed. There is no cost for listening while there are no
+           listeners.
+        """
+        if not self.event_listeners:
+            self.handle_event = self.core_event
+            self.core_event = self.dispatch_event
+        self.event_listeners.append(listener)
+
+    def remove_event_listener(self, listener):
+        "Stop calling a listener with the core events."
+        self.event_listeners.remove(listener)
+        if not self.event_listeners:
+            if self.event_batch:
+                self.core_event = self.record_event
+            else:
+                del self.core_event
+
+    def dispatch_event(self, warrior, address, event_type):
+        "Handle a core event, then give it to the listeners."
+        self.handle_event(warrior, address, event_type)
+        for listener in self.event_listeners:
+            listener(warrior, address, event_type)
+
+    def attach_sampler(self, sampler):
+        """Attach a sampler (see sampler.Sampler), which is then given every
+           step and every write to the core. There is no cost for sampling
+           while no sampler is attached.
+        """
+        self.detach_sampler()
+        self.sampler = sampler
+        self.add_event_listener(self.sample_event)
+        sampler.reset(self)
+
+    def detach_sampler(self):
+        "Detach the sampler, if any."
+        if self.sampler is not None:
+            self.remove_event_listener(self.sample_event)
+            self.sampler = None
+
+    def sample_event(self, warrior, address, event_type):
+        "Give the writes to the sampler."
+        if event_type in WRITE_EVENTS:
+            self.sampler.write(warrior, address)
+
+    def reset(self, clear_instruction=DEFAULT_INITIAL_INSTRUCTION,
+              positions=None):
         "Clears core and re-loads warriors."
         self.core.clear(clear_instruction)
-        self.load_warriors()
+        self.load_warriors(positions=positions)
+
+    def load_warriors(self, randomize=True, positions=None):
+        """Loads its warriors to the memory with starting task queues. The
+           positions of the warriors may be given explicitly, otherwise they
+           are spread through the core.
+        """
+
+        if self.event_batch:
+            self.flush_events()
+            capacity = self.event_batch * len(self.warriors) * MAX_EVENTS_PER_EXECUTION
+            if self.event_types is None or len(self.event_types) < capacity:
+                self.event_warriors = array('H', [0]) * capacity
+                self.event_addresses = array('l', [0]) * capacity
+                self.event_types = array('B', [0]) * capacity
 
-    def load_warriors(self, randomize=True):
-        "Loads its warriors to the memory with starting task queues"
+        if self.sampler is not None:
+            self.sampler.reset(self)
 
+        if positions is None:
+            positions = self.placement(randomize)
+
+        self.task_queues = []
+        self.queue_hashes = []
+        for n, (warrior, warrior_position) in enumerate(zip(self.warriors, positions)):
+            # add first and unique warrior task
+            self.task_queues.append([self.core.trim(warrior_position + warrior.start)])
+            if self.detect_repetition:
+                self.queue_hashes.append(QueueHash(self.task_queues[n]))
+
+            # copy warrior's instructions to the core
+            for i, instruction in enumerate(warrior.instructions):
+                self.core[warrior_position + i] = copy(instruction)
+                self.core_event(n, warrior_position + i, EVENT_I_WRITE)
+
+        if self.event_batch:
+            self.flush_events()
+
+    def placement(self, randomize=True):
+        """Return the positions where to load the warriors: equally spaced in
+           the core, each one randomly shifted unless told otherwise.
+        """
         # the space between warriors - equally spaced in the core
-        space = len(self.core) / len(self.warriors)
+        space = len(self.core) // len(self.warriors)
 
+        positions = []
         for n, warrior in enumerate(self.warriors):
             # position is in the nth equally separated space plus a random
             # shift up to where the last instruction is minimum separated from
@@ -65,24 +276,22 @@ class MARS(object):
             warrior_position = (n * space)
 
             if randomize:
-                warrior_position += randint(0, max(0, space -
-                                                      len(warrior) -
-                                                      self.minimum_separation))
+                warrior_position += self.random.randint(0, max(0, space -
+                                                                  len(warrior) -
+                                                                  self.minimum_separation))
+            positions.append(warrior_position)
 
-            # add first and unique warrior task
-            warrior.task_queue = [self.core.trim(warrior_position + warrior.start)]
-
-            # copy warrior's instructions to the core
-            for i, instruction in enumerate(warrior.instructions):
-                self.core[warrior_position + i] = copy(instruction)
-                self.core_event(warrior, warrior_position + i, EVENT_I_WRITE)
+        return positions
 
     def enqueue(self, warrior, address):
-        """Enqueue another process into the warrior's task queue. Only if it's
-           not already full.
+        """Enqueue another process into the task queue of the warrior (by
+           index). Only if it's not already full.
         """
-        if len(warrior.task_queue) < self.max_processes:
-            warrior.task_queue.append(self.core.trim(address))
+        task_queue = self.task_queues[warrior]
+        if len(task_queue) < self.max_processes:
+            task_queue.append(self.core.trim(address))
+            if self.detect_repetition:
+                self.queue_hashes[warrior].append(task_queue[-1])
 
     def __iter__(self):
         return iter(self.core)
@@ -93,14 +302,119 @@ class MARS(object):
     def __getitem__(self, address):
         return self.core[address]
 
+    def dump(self, start=0, stop=None):
+        """Yield the text lines of a core dump of an address range (see
+           Core.dump), followed by the next task of each warrior, in the same
+           format as the recorded step logs.
+        """
+        for line in self.core.dump(start, stop):
+            yield line
+        for task_queue in self.task_queues:
+            if task_queue:
+                pc = task_queue[0]
+                yield ";ACTIVE: %05d  %s" % (pc, self.core[pc])
+
+    def state_hash(self):
+        """Return a hash of the state of the simulation: the core and the
+           task queues. Only available if detecting repeated states.
+        """
+        return (self.core.hash,) + tuple((len(task_queue), queue_hash.digest())
+                                         for task_queue, queue_hash
+                                         in zip(self.task_queues, self.queue_hashes))
+
+    def run(self, cycles=80000, budget=None):
+        """Run the simulation until there's only one warrior left alive (or
+           none, if playing alone), or until the cycles limit is reached.
+           Return the outcome of the round (WIN, TIE or LOSS) for each warrior,
+           in the same order of the warriors list.
+
+           If detecting repeated states, the round also ends as a tie as soon
+           as the simulation reaches a state it was before, because it would
+           then repeat forever.
+
+           If a budget is given (see Budget), the round is stopped as soon as
+           it's spent: then the warriors still alive get UNFINISHED instead.
+        """
+        for cycle, outcomes in self.run_slices(cycles, cycles, budget):
+            pass
+        return outcomes
+
+    def run_slices(self, cycles=80000, slice_cycles=1000, budget=None):
+        """Run the simulation just as run, but in slices of at most
+           slice_cycles cycles. Yield the cycles run so far and the outcomes
+           after each slice, so the caller can do other work in between. The
+           outcomes are None until the round is over, or stopped by the
+           budget (then the cycle is the one reached).
+        """
+        active_warrior_to_stop = 1 if len(self.warriors) >= 2 else 0
+        states = set([self.state_hash()]) if self.detect_repetition else None
+
+        cycle = 0
+        while cycle < cycles:
+            for c in range(min(slice_cycles, cycles - cycle)):
+                self.step()
+                cycle += 1
+
+                # if there's only one left, or are all dead, then stop simulation
+                if self.alive() <= active_warrior_to_stop:
+                    yield cycle, [WIN if task_queue else LOSS
+                                  for task_queue in self.task_queues]
+                    return
+
+                if states is not None:
+                    state = self.state_hash()
+                    if state in states:
+                        cycles = cycle
+                        break
+                    states.add(state)
+
+                if (budget is not None and cycle % budget.check_cycles == 0 and
+                        budget.spent()):
+                    yield cycle, [UNFINISHED if task_queue else LOSS
+                                  for task_queue in self.task_queues]
+                    return
+
+            if cycle < cycles:
+                yield cycle, None
+
+        # running until max cycles: tie
+        yield cycle, [TIE if task_queue else LOSS for task_queue in self.task_queues]
+
+    def alive(self):
+        "Return the number of warriors with processes left."
+        return sum(1 if task_queue else 0 for task_queue in self.task_queues)
+
     def step(self):
         """Run one simulation step: execute one task of every active warrior.
         """
-        for warrior in self.warriors:
-            if warrior.task_queue:
+        if self.detect_repetition:
+            # the first task of every active warrior is going to be popped
+            for task_queue, queue_hash in zip(self.task_queues, self.queue_hashes):
+                if task_queue:
+                    queue_hash.popleft(task_queue[0])
+
+        if self.compiled:
+            self.compiled_step()
+        else:
+            self.interpreted_step()
+
+        if self.event_batch:
+            self.batched_steps += 1
+            if self.batched_steps >= self.event_batch:
+                self.flush_events()
+
+        if self.sampler is not None:
+            self.sampler.step(self)
+
+    def interpreted_step(self):
+        """Run one simulation step, decoding and executing the instructions
+           of the warriors.
+        """
+        for warrior, task_queue in enumerate(self.task_queues):
+            if task_queue:
                 # The process counter is the next instruction-address in the
                 # warrior's task queue
-                pc = warrior.task_queue.pop(0)
+                pc = task_queue.pop(0)
 
                 # copy the current instruction to the instruction register
                 ir = copy(self.core[pc])
@@ -124,10 +438,10 @@ class MARS(object):
 
                         # pre-decrement, if needed
                         if ir.a_mode == PREDEC_A:
-                            self.core[pc + wpa].a_number -= 1
+                            self.core.increment_a_number(pc + wpa, -1)
                             self.core_event(warrior, pc + wpa, EVENT_A_DEC)
                         elif ir.a_mode == PREDEC_B:
-                            self.core[pc + wpa].b_number -= 1
+                            self.core.increment_b_number(pc + wpa, -1)
                             self.core_event(warrior, pc + wpa, EVENT_B_DEC)
 
                         # calculate the indirect address, from A or B number
@@ -143,10 +457,10 @@ class MARS(object):
 
                 # post-increment, if needed
                 if ir.a_mode == POSTINC_A:
-                    self.core[pip].a_number += 1
+                    self.core.increment_a_number(pip, 1)
                     self.core_event(warrior, pip, EVENT_A_INC)
                 elif ir.a_mode == POSTINC_B:
-                    self.core[pip].b_number += 1
+                    self.core.increment_b_number(pip, 1)
                     self.core_event(warrior, pip, EVENT_B_INC)
 
                 # evaluate the B-operand - pretty much the same as A
@@ -160,10 +474,10 @@ class MARS(object):
                         pip = pc + wpb
 
                         if ir.b_mode == PREDEC_A:
-                            self.core[pc + wpb].a_number -= 1
+                            self.core.increment_a_number(pc + wpb, -1)
                             self.core_event(warrior, pc + wpb, EVENT_A_DEC)
                         elif ir.b_mode == PREDEC_B:
-                            self.core[pc + wpb].b_number -= 1
+                            self.core.increment_b_number(pc + wpb, -1)
                             self.core_event(warrior, pc + wpb, EVENT_B_DEC)
 
                         if ir.b_mode in (PREDEC_A, INDIRECT_A, POSTINC_A):
@@ -176,38 +490,38 @@ class MARS(object):
                 irb = copy(self.core[pc + rpb])
 
                 if ir.b_mode == POSTINC_A:
-                    self.core[pip].a_number += 1
+                    self.core.increment_a_number(pip, 1)
                     self.core_event(warrior, pip, EVENT_A_INC)
                 elif ir.b_mode == POSTINC_B:
-                    self.core[pip].b_number += 1
+                    self.core.increment_b_number(pip, 1)
                     self.core_event(warrior, pip, EVENT_B_INC)
 
                 # arithmetic common code
                 def do_arithmetic(op):
                     try:
                         if ir.modifier == M_A:
-                            self.core[pc + wpb].a_number = op(irb.a_number, ira.a_number)
+                            self.core.set_a_number(pc + wpb, op(irb.a_number, ira.a_number))
                             self.core_event(warrior, pc + wpb, EVENT_A_WRITE)
                             self.core_event(warrior, pc + rpa, EVENT_A_READ)
                             self.core_event(warrior, pc + rpb, EVENT_A_READ)
                         elif ir.modifier == M_B:
-                            self.core[pc + wpb].b_number = op(irb.b_number, ira.b_number)
+                            self.core.set_b_number(pc + wpb, op(irb.b_number, ira.b_number))
                             self.core_event(warrior, pc + wpb, EVENT_B_WRITE)
                             self.core_event(warrior, pc + rpa, EVENT_B_READ)
                             self.core_event(warrior, pc + rpb, EVENT_B_READ)
                         elif ir.modifier == M_AB:
-                            self.core[pc + wpb].b_number = op(irb.b_number, ira.a_number)
+                            self.core.set_b_number(pc + wpb, op(irb.b_number, ira.a_number))
                             self.core_event(warrior, pc + wpb, EVENT_B_WRITE)
                             self.core_event(warrior, pc + rpa, EVENT_A_READ)
                             self.core_event(warrior, pc + rpb, EVENT_B_READ)
                         elif ir.modifier == M_BA:
-                            self.core[pc + wpb].a_number = op(irb.b_number, ira.a_number)
+                            self.core.set_a_number(pc + wpb, op(irb.b_number, ira.a_number))
                             self.core_event(warrior, pc + wpb, EVENT_A_WRITE)
                             self.core_event(warrior, pc + rpa, EVENT_A_READ)
                             self.core_event(warrior, pc + rpb, EVENT_B_READ)
                         elif ir.modifier == M_F or ir.modifier == M_I:
-                            self.core[pc + wpb].a_number = op(irb.a_number, ira.a_number)
-                            self.core[pc + wpb].b_number = op(irb.b_number, ira.b_number)
+                            self.core.set_a_number(pc + wpb, op(irb.a_number, ira.a_number))
+                            self.core.set_b_number(pc + wpb, op(irb.b_number, ira.b_number))
                             self.core_event(warrior, pc + wpb, EVENT_A_WRITE)
                             self.core_event(warrior, pc + wpb, EVENT_B_WRITE)
                             self.core_event(warrior, pc + rpa, EVENT_A_READ)
@@ -215,8 +529,8 @@ class MARS(object):
                             self.core_event(warrior, pc + rpa, EVENT_B_READ)
                             self.core_event(warrior, pc + rpb, EVENT_B_READ)
                         elif ir.modifier == M_X:
-                            self.core[pc + wpb].b_number = op(irb.b_number, ira.a_number)
-                            self.core[pc + wpb].a_number = op(irb.a_number, ira.b_number)
+                            self.core.set_b_number(pc + wpb, op(irb.b_number, ira.a_number))
+                            self.core.set_a_number(pc + wpb, op(irb.a_number, ira.b_number))
                             self.core_event(warrior, pc + wpb, EVENT_A_WRITE)
                             self.core_event(warrior, pc + wpb, EVENT_B_WRITE)
                             self.core_event(warrior, pc + rpa, EVENT_A_READ)
@@ -285,31 +599,31 @@ class MARS(object):
                     pass
                 elif ir.opcode == MOV:
                     if ir.modifier == M_A:
-                        self.core[pc + wpb].a_number = ira.a_number
+                        self.core.set_a_number(pc + wpb, ira.a_number)
                         self.core_event(warrior, pc + rpa, EVENT_A_READ)
                         self.core_event(warrior, pc + wpb, EVENT_A_WRITE)
                     elif ir.modifier == M_B:
-                        self.core[pc + wpb].b_number = ira.b_number
+                        self.core.set_b_number(pc + wpb, ira.b_number)
                         self.core_event(warrior, pc + rpa, EVENT_B_READ)
                         self.core_event(warrior, pc + wpb, EVENT_B_WRITE)
                     elif ir.modifier == M_AB:
-                        self.core[pc + wpb].b_number = ira.a_number
+                        self.core.set_b_number(pc + wpb, ira.a_number)
                         self.core_event(warrior, pc + rpa, EVENT_A_READ)
                         self.core_event(warrior, pc + wpb, EVENT_B_WRITE)
                     elif ir.modifier == M_BA:
-                        self.core[pc + wpb].a_number = ira.b_number
+                        self.core.set_a_number(pc + wpb, ira.b_number)
                         self.core_event(warrior, pc + rpa, EVENT_B_READ)
                         self.core_event(warrior, pc + wpb, EVENT_A_WRITE)
                     elif ir.modifier == M_F:
-                        self.core[pc + wpb].a_number = ira.a_number
-                        self.core[pc + wpb].b_number = ira.b_number
+                        self.core.set_a_number(pc + wpb, ira.a_number)
+                        self.core.set_b_number(pc + wpb, ira.b_number)
                         self.core_event(warrior, pc + rpa, EVENT_A_READ)
                         self.core_event(warrior, pc + rpa, EVENT_B_READ)
                         self.core_event(warrior, pc + wpb, EVENT_A_WRITE)
                         self.core_event(warrior, pc + wpb, EVENT_B_WRITE)
                     elif ir.modifier == M_X:
-                        self.core[pc + wpb].b_number = ira.a_number
-                        self.core[pc + wpb].a_number = ira.b_number
+                        self.core.set_b_number(pc + wpb, ira.a_number)
+                        self.core.set_a_number(pc + wpb, ira.b_number)
                         self.core_event(warrior, pc + rpa, EVENT_A_READ)
                         self.core_event(warrior, pc + rpa, EVENT_B_READ)
                         self.core_event(warrior, pc + wpb, EVENT_A_WRITE)
@@ -330,7 +644,7 @@ class MARS(object):
                 elif ir.opcode == MUL:
                     do_arithmetic(operator.mul)
                 elif ir.opcode == DIV:
-                    do_arithmetic(operator.div)
+                    do_arithmetic(operator.floordiv)
                 elif ir.opcode == MOD:
                     do_arithmetic(operator.mod)
                 elif ir.opcode == JMP:
@@ -366,29 +680,29 @@ class MARS(object):
                         raise ValueError("Invalid modifier: %d" % ir.modifier)
                 elif ir.opcode == DJN:
                     if ir.modifier == M_A or ir.modifier == M_BA:
-                        self.core[pc + wpb].a_number -= 1
+                        self.core.increment_a_number(pc + wpb, -1)
                         irb.a_number -= 1
                         self.enqueue(warrior, pc + (rpa if irb.a_number != 0 else 1))
                         self.core_event(warrior, pc + rpa, EVENT_A_READ)
-                        self.core_event(warrior, pc + rpa, EVENT_A_DEC)
+                        self.core_event(warrior, pc + wpb, EVENT_A_DEC)
                     elif ir.modifier == M_B or ir.modifier == M_AB:
-                        self.core[pc + wpb].b_number -= 1
+                        self.core.increment_b_number(pc + wpb, -1)
                         irb.b_number -= 1
                         self.enqueue(warrior, pc + (rpa if irb.b_number != 0 else 1))
                         self.core_event(warrior, pc + rpa, EVENT_B_READ)
-                        self.core_event(warrior, pc + rpa, EVENT_B_DEC)
+                        self.core_event(warrior, pc + wpb, EVENT_B_DEC)
                     elif ir.modifier in (M_F, M_X, M_I):
-                        self.core[pc + wpb].a_number -= 1
+                        self.core.increment_a_number(pc + wpb, -1)
                         irb.a_number -= 1
-                        self.core[pc + wpb].b_number -= 1
+                        self.core.increment_b_number(pc + wpb, -1)
                         irb.b_number -= 1
                         self.enqueue(warrior,
                                      pc + (rpa if irb.a_number != 0 or
                                                   irb.b_number != 0 else 1))
                         self.core_event(warrior, pc + rpa, EVENT_A_READ)
                         self.core_event(warrior, pc + rpa, EVENT_B_READ)
-                        self.core_event(warrior, pc + rpa, EVENT_A_DEC)
-                        self.core_event(warrior, pc + rpa, EVENT_B_DEC)
+                        self.core_event(warrior, pc + wpb, EVENT_A_DEC)
+                        self.core_event(warrior, pc + wpb, EVENT_B_DEC)
                     else:
                         raise ValueError("Invalid modifier: %d" % ir.modifier)
                 elif ir.opcode == SPL:
@@ -405,9 +719,223 @@ class MARS(object):
                 else:
                     raise ValueError("Invalid opcode: %d" % ir.opcode)
 
+    def compiled_step(self):
+        """Run one simulation step, just as step, but executing each
+           instruction by a handler compiled for its core cell on the first
+           execution, and cached by the core until the cell is written.
+        """
+        core = self.core
+        handlers = core.handlers
+        for warrior, task_queue in enumerate(self.task_queues):
+            if task_queue:
+                pc = task_queue.pop(0)
+                handler = handlers.get(pc)
+                if handler is None:
+                    handler = handlers[pc] = compile_instruction(core, core[pc])
+                handler(self, core, warrior, pc)
+
+# Compiled execution: each combination of opcode, modifier and modes gets the
+# source code of a step specialized for it (mirroring MARS.step), compiled only
+# once. Each core cell then gets a handler binding that code to its numbers.
+
+# arithmetic expressions by opcode
+ARITHMETIC_EXPRESSIONS = {ADD: '%s + %s', SUB: '%s - %s', MUL: '%s * %s',
+                          DIV: 'div(%s, %s)', MOD: '%s %% %s'}
+
+# comparison expressions by opcode
+COMPARISON_EXPRESSIONS = {SLT: '%s < %s', CMP: '%s == %s', SEQ: '%s == %s',
+                          SNE: '%s != %s'}
+
+# field reads and writes done by each modifier, in the same order of events as
+# in MARS.step: (field written, A-instruction field, B-instruction field)
+MODIFIER_FIELDS = {M_A:  [('a', 'a', 'a')],
+                   M_B:  [('b', 'b', 'b')],
+                   M_AB: [('b', 'a', 'b')],
+                   M_BA: [('a', 'b', 'a')],
+                   M_F:  [('a', 'a', 'a'), ('b', 'b', 'b')],
+                   M_X:  [('b', 'a', 'b'), ('a', 'b', 'a')],
+                   M_I:  [('a', 'a', 'a'), ('b', 'b', 'b')]}
+
+EVENT_NAMES = {'a': {'READ': 'EVENT_A_READ', 'WRITE': 'EVENT_A_WRITE', 'DEC': 'EVENT_A_DEC'},
+               'b': {'READ': 'EVENT_B_READ', 'WRITE': 'EVENT_B_WRITE', 'DEC': 'EVENT_B_DEC'}}
+
+# compiled factories of handlers, by (opcode, modifier, a_mode, b_mode)
+_handler_factories = {}
+
+def _operand_source(mode, r, w, ir):
+    "Return the source lines evaluating an operand (see MARS.step)."
+    if mode == IMMEDIATE:
+        lines = ['%s = %s = 0' % (r, w)]
+    else:
+        lines = ['%s = %s0' % (r, r.upper()), '%s = %s0' % (w, w.upper())]
+        if mode != DIRECT:
+            lines.append('pip = pc + %s' % w)
+            if mode == PREDEC_A:
+                lines += ['core.increment_a_number(pc + %s, -1)' % w,
+                          'event(warrior, pc + %s, EVENT_A_DEC)' % w]
+            elif mode == PREDEC_B:
+                lines += ['core.increment_b_number(pc + %s, -1)' % w,
+                          'event(warrior, pc + %s, EVENT_B_DEC)' % w]
+            field = 'a' if mode in (PREDEC_A, INDIRECT_A, POSTINC_A) else 'b'
+            lines += ['%s = core.trim_read(%s + core[pc + %s].%s_number)' % (r, r, r, field),
+                      '%s = core.trim_write(%s + core[pc + %s].%s_number)' % (w, w, w, field)]
+    lines.append('%s = core[pc + %s].__copy__()' % (ir, r))
+    if mode == POSTINC_A:
+        lines += ['core.increment_a_number(pip, 1)',
+                  'event(warrior, pip, EVENT_A_INC)']
+    elif mode == POSTINC_B:
+        lines += ['core.increment_b_number(pip, 1)',
+                  'event(warrior, pip, EVENT_B_INC)']
+    return lines
+
+def _execution_source(opcode, modifier):
+    "Return the source lines executing an instruction (see MARS.step)."
+    invalid_modifier = ['raise ValueError("Invalid modifier: %d" % ' + str(modifier) + ')']
+
+    if opcode == DAT:
+        return ['pass']
+
+    elif opcode == MOV:
+        if modifier not in MODIFIER_FIELDS:
+            return invalid_modifier
+        if modifier == M_I:
+            lines = ['core[pc + wpb] = ira',
+                     'event(warrior, pc + rpa, EVENT_I_READ)',
+                     'event(warrior, pc + wpb, EVENT_I_WRITE)']
+        else:
+            fields = MODIFIER_FIELDS[modifier]
+            lines = ['core.set_%s_number(pc + wpb, ira.%s_number)' % (written, a)
+                     for written, a, b in fields]
+            lines += ['event(warrior, pc + rpa, %s)' % EVENT_NAMES[a]['READ']
+                      for written, a, b in sorted(fields, key=lambda f: f[1])]
+            lines += ['event(warrior, pc + wpb, %s)' % EVENT_NAMES[written]['WRITE']
+                      for written, a, b in sorted(fields)]
+        return lines + ['enqueue(warrior, pc + 1)']
+
+    elif opcode in ARITHMETIC_EXPRESSIONS:
+        if modifier not in MODIFIER_FIELDS:
+            return invalid_modifier
+        expression = ARITHMETIC_EXPRESSIONS[opcode]
+        fields = MODIFIER_FIELDS[modifier]
+        # the reference reads A-fields of B-instruction as written for BA
+        operands = {M_BA: [('a', 'irb.b_number', 'ira.a_number')]}.get(
+            modifier, [(written, 'irb.%s_number' % written, 'ira.%s_number' % a)
+                       for written, a, b in fields])
+        lines = ['core.set_%s_number(pc + wpb, %s)' % (written, expression % (b, a))
+                 for written, b, a in operands]
+        if len(fields) == 1:
+            written, a, b = fields[0]
+            if modifier == M_BA:
+                a, b = 'a', 'b'
+            lines += ['event(warrior, pc + wpb, %s)' % EVENT_NAMES[written]['WRITE'],
+                      'event(warrior, pc + rpa, %s)' % EVENT_NAMES[a]['READ'],
+                      'event(warrior, pc + rpb, %s)' % EVENT_NAMES[b]['READ']]
+        else:
+            lines += ['event(warrior, pc + wpb, EVENT_A_WRITE)',
+                      'event(warrior, pc + wpb, EVENT_B_WRITE)',
+                      'event(warrior, pc + rpa, EVENT_A_READ)',
+                      'event(warrior, pc + rpb, EVENT_A_READ)',
+                      'event(warrior, pc + rpa, EVENT_B_READ)',
+                      'event(warrior, pc + rpb, EVENT_B_READ)']
+        lines.append('enqueue(warrior, pc + 1)')
+        return (['try:'] + ['    ' + line for line in lines] +
+                ['except ZeroDivisionError:', '    pass'])
+
+    elif opcode == JMP:
+        return ['enqueue(warrior, pc + rpa)']
+
+    elif opcode in (JMZ, JMN, DJN):
+        if modifier in (M_A, M_BA):
+            fields = ['a']
+        elif modifier in (M_B, M_AB):
+            fields = ['b']
+        elif modifier in (M_F, M_X, M_I):
+            fields = ['a', 'b']
+        else:
+            return invalid_modifier
+
+        lines = []
+        if opcode == DJN:
+            for field in fields:
+                lines += ['core.increment_%s_number(pc + wpb, -1)' % field,
+                          'irb.%s_number -= 1' % field]
+        if opcode == JMZ:
+            condition = ' == '.join(['irb.%s_number' % field for field in fields]) + ' == 0'
+        else:
+            condition = ' or '.join(['irb.%s_number != 0' % field for field in fields])
+        lines.append('enqueue(warrior, pc + (rpa if %s else 1))' % condition)
+        lines += ['event(warrior, pc + rpa, %s)' % EVENT_NAMES[field]['READ']
+                  for field in fields]
+        if opcode == DJN:
+            lines += ['event(warrior, pc + wpb, %s)' % EVENT_NAMES[field]['DEC']
+                      for field in fields]
+        return lines
+
+    elif opcode == SPL:
+        return ['enqueue(warrior, pc + 1)',
+                'enqueue(warrior, pc + rpa)']
+
+    elif opcode in COMPARISON_EXPRESSIONS:
+        expression = COMPARISON_EXPRESSIONS[opcode]
+        if modifier == M_I:
+            return ['enqueue(warrior, pc + (2 if ira == irb else 1))',
+                    'event(warrior, pc + rpa, EVENT_I_READ)',
+                    'event(warrior, pc + rpb, EVENT_I_READ)']
+        elif modifier in (M_F, M_X):
+            pairs = [('a', 'a'), ('b', 'b')] if modifier == M_F else [('a', 'b'), ('b', 'a')]
+            condition = ' and '.join('(%s)' % (expression % ('ira.%s_number' % a, 'irb.%s_number' % b))
+                                     for a, b in pairs)
+            return ['enqueue(warrior, pc + (2 if %s else 1))' % condition,
+                    'event(warrior, pc + rpa, EVENT_A_READ)',
+                    'event(warrior, pc + rpb, EVENT_A_READ)',
+                    'event(warrior, pc + rpa, EVENT_B_READ)',
+                    'event(warrior, pc + rpb, EVENT_B_READ)']
+        elif modifier in (M_A, M_B, M_AB, M_BA):
+            written, a, b = MODIFIER_FIELDS[modifier][0]
+            if modifier == M_BA:
+                a, b = 'b', 'a'
+            return ['enqueue(warrior, pc + (2 if %s else 1))' %
+                        (expression % ('ira.%s_number' % a, 'irb.%s_number' % b)),
+                    'event(warrior, pc + rpa, %s)' % EVENT_NAMES[a]['READ'],
+                    'event(warrior, pc + rpb, %s)' % EVENT_NAMES[b]['READ']]
+        return invalid_modifier
+
+    elif opcode == NOP:
+        return ['enqueue(warrior, pc + 1)']
+
+    return ['raise ValueError("Invalid opcode: %d" % ' + str(opcode) + ')']
+
+def handler_source(opcode, modifier, a_mode, b_mode):
+    """Return the source code of a factory of handlers: functions executing an
+       instruction with the given opcode, modifier and modes, as MARS.step
+       does, for a warrior whose task was at pc.
+    """
+    body = (['event = mars.core_event', 'enqueue = mars.enqueue'] +
+            _operand_source(a_mode, 'rpa', 'wpa', 'ira') +
+            _operand_source(b_mode, 'rpb', 'wpb', 'irb') +
+            ['event(warrior, pc, EVENT_EXECUTED)'] +
+            _execution_source(opcode, modifier))
+    return '\n'.join(['def factory(RPA0, WPA0, RPB0, WPB0):',
+                      '    def handler(mars, core, warrior, pc):'] +
+                     ['        ' + line for line in body] +
+                     ['    return handler'])
+
+def compile_instruction(core, instruction):
+    "Return a handler executing an instruction of the core (see handler_source)."
+    key = (instruction.opcode, instruction.modifier, instruction.a_mode, instruction.b_mode)
+    factory = _handler_factories.get(key)
+    if factory is None:
+        namespace = dict(globals(), div=operator.floordiv)
+        exec(compile(handler_source(*key), '<%s.%s %s %s>' % key, 'exec'), namespace)
+        factory = _handler_factories[key] = namespace['factory']
+    return factory(core.trim_read(instruction.a_number),
+                   core.trim_write(instruction.a_number),
+                   core.trim_read(instruction.b_number),
+                   core.trim_write(instruction.b_number))
+
 if __name__ == "__main__":
     import argparse
-    import redcode
+    from . import redcode
 
     parser = argparse.ArgumentParser(description='MARS (Memory Array Redcode Simulator)')
     parser.add_argument('--rounds', '-r', metavar='ROUNDS', type=int, nargs='?',
@@ -422,11 +950,43 @@ if __name__ == "__main__":
                         default=100, help='Max warrior length')
     parser.add_argument('--distance', '-d', metavar='MINDISTANCE', type=int, nargs='?',
                         default=100, help='Minimum warrior distance')
-    parser.add_argument('warriors', metavar='WARRIOR', type=file, nargs='+',
+    parser.add_argument('--seed', metavar='SEED', type=int, nargs='?',
+                        default=None, help='Random seed for warriors placement')
+    parser.add_argument('--exhaustive', '-F', action='store_true', default=False,
+                        help='Play two warriors once at every possible offset')
+    parser.add_argument('--workers', '-w', metavar='WORKERS', type=int, nargs='?',
+                        default=None, help='Worker processes for exhaustive mode')
+    parser.add_argument('--compiled', action='store_true', default=False,
+                        help='Execute instructions by compiled handlers')
+    parser.add_argument('--detect-repetition', action='store_true', default=False,
+                        help='Tie as soon as the simulation state repeats')
+    parser.add_argument('--sparse', action='store_true', default=False,
+                        help='Store only the cells written, for very large cores')
+    parser.add_argument('--results', metavar='FILE', nargs='?', default=None,
+                        help='Append the results of each round to FILE (JSON lines, or CSV if named .csv)')
+    parser.add_argument('--resume', action='store_true', default=False,
+                        help='Skip the rounds already in the results FILE')
+    parser.add_argument('--precision', metavar='PRECISION', type=float, nargs='?',
+                        default=None, help='Stop once every score is known within PRECISION (ROUNDS is the maximum)')
+    parser.add_argument('--cache', metavar='FILE', nargs='?', default=None,
+                        help='Reuse the results of seeded battles stored in the SQLite FILE')
+    parser.add_argument('--budget', metavar='SECONDS', type=float, nargs='?',
+                        default=None, help='Stop after SECONDS of wall-clock time, counting only the rounds finished')
+    parser.add_argument('--broadcast', metavar='NAME', nargs='?', default=None,
+                        help='Publish the core to spectators of NAME (see spectator.py)')
+    parser.add_argument('warriors', metavar='WARRIOR', nargs='+',
+                        type=argparse.FileType('r', encoding=redcode.WARRIOR_ENCODING),
                         help='Warrior redcode filename')
 
     args = parser.parse_args()
 
+    if args.resume and not args.results:
+        parser.error("resuming needs the results file")
+    if args.exhaustive and args.results:
+        parser.error("exhaustive mode doesn't record results by round")
+    if args.sparse and args.detect_repetition:
+        parser.error("detecting repetition needs the whole core hashed")
+
     # build environment
     environment = {'CORESIZE': args.size,
                    'CYCLES': args.cycles,
@@ -438,47 +998,125 @@ if __name__ == "__main__":
     # assemble warriors
     warriors = [redcode.parse(file, environment) for file in args.warriors]
 
-    # initialize wins, losses and ties for each warrior
-    for warrior in warriors:
-        warrior.wins = warrior.ties = warrior.losses = 0
+    # wins, ties and losses of each warrior, by index
+    scores = [[0, 0, 0] for warrior in warriors]
 
-    # for each round
-    for i in xrange(args.rounds):
+    from .hill import battle, confidence_interval
 
-        # create new simulation
-        simulation = MARS(warriors=warriors,
-                          minimum_separation = args.distance,
-                          max_processes = args.processes)
+    # results of seeded battles already played, by warriors' code and settings
+    cache = None
+    cached = None
+    if args.cache:
+        from .cache import ResultCache
+        cache = ResultCache(args.cache)
+        key = dict(rounds=args.rounds, cycles=args.cycles, size=args.size,
+                   max_processes=args.processes, minimum_separation=args.distance,
+                   seed=args.seed, exhaustive=False, precision=args.precision)
+        if args.seed is not None and not args.exhaustive:
+            cached = cache.get(warriors, **key)
+        if cached:
+            scores = [list(counts) for counts in cached]
+            args.rounds = sum(cached[0])
 
-        active_warrior_to_stop = 1 if len(warriors) >= 2 else 0
+    if args.exhaustive:
+        if len(warriors) != 2:
+            parser.error("exhaustive mode plays exactly two warriors")
 
-        for c in xrange(args.cycles):
-            simulation.step()
+        results = battle(warriors[0], warriors[1],
+                         cycles=args.cycles,
+                         size=args.size,
+                         max_processes=args.processes,
+                         minimum_separation=args.distance,
+                         exhaustive=True,
+                         processes=args.workers,
+                         cache=cache,
+                         budget=args.budget)
+        scores = [list(counts) for counts in results]
+        args.rounds = sum(scores[0])
 
-            # if there's only one left, or are all dead, then stop simulation
-            if sum(1 if warrior.task_queue else 0 for warrior in warriors) <= active_warrior_to_stop:
-                for warrior in warriors:
-                    if warrior.task_queue:
-                        warrior.wins += 1
-                    else:
-                        warrior.losses += 1
+    # create simulation, reused by every round
+    if args.detect_repetition:
+        core = HashedCore(size=args.size)
+    elif args.sparse:
+        core = SparseCore(size=args.size)
+    else:
+        core = Core(size=args.size)
+    settings = dict(core=core,
+                    minimum_separation = args.distance,
+                    max_processes = args.processes,
+                    seed = args.seed,
+                    compiled = args.compiled,
+                    detect_repetition = args.detect_repetition)
+    if args.broadcast:
+        from .spectator import BroadcastMARS
+        simulation = BroadcastMARS(args.broadcast, **settings)
+    else:
+        simulation = MARS(**settings)
+    simulation.warriors = warriors
+
+    # rounds already played, when resuming, and where to record new ones
+    from .results import ResultsSink, read_results, rounds, add_outcome
+    try:
+        played = read_results(args.results, warriors) if args.resume else {}
+    except ValueError as e:
+        parser.error(str(e))
+    sink = ResultsSink(args.results) if args.results else None
+
+    budget = Budget(args.budget) if args.budget is not None else None
+    stopped = None
+
+    # for each round
+    for round, positions, outcomes in rounds(simulation,
+                                             0 if args.exhaustive or cached else args.rounds,
+                                             played):
+        if outcomes is None:
+            # clear the core and load warriors again
+            simulation.reset(positions=positions)
+            for cycle, outcomes in simulation.run_slices(args.cycles, args.cycles, budget):
+                pass
+            if UNFINISHED in outcomes:
+                # the round is left out, so the scores are of whole rounds
+                stopped = (cycle, round, outcomes.count(UNFINISHED))
+                args.rounds = round - 1
                 break
-        else:
-            # running until max cycles: tie
-            for warrior in warriors:
-                if warrior.task_queue:
-                    warrior.ties += 1
-                else:
-                    warrior.losses += 1
-
-    # print results
-    print "Results: (%d rounds)" % args.rounds
-    print "%s %s %s %s" % ("Warrior (Author)".ljust(40), "wins".rjust(5),
-                           "ties".rjust(5), "losses".rjust(5))
-    for warrior in warriors:
-        print "%s %s %s %s" % (("%s (%s)" % (warrior.name, warrior.author)).ljust(40),
-                               str(warrior.wins).rjust(5),
-                               str(warrior.ties).rjust(5),
-                               str(warrior.losses).rjust(5))
+            if sink:
+                sink.write(round, warriors, positions, outcomes)
+
+        for score, outcome in zip(scores, outcomes):
+            add_outcome(score, outcome)
+
+        # with enough precision on every score, there's no need to go on
+        if args.precision is not None and all(
+                high - low <= 2 * args.precision
+                for low, high in (confidence_interval(*score) for score in scores)):
+            args.rounds = round
+            break
+
+    if sink:
+        sink.close()
+
+    if args.broadcast:
+        simulation.close()
+
+    if cache:
+        if args.seed is not None and not args.exhaustive and not cached and not stopped:
+            cache.put(warriors, scores, **key)
+        cache.close()
+
+    if stopped:
+        print("Budget spent at cycle %d of round %d, with %d warriors alive" % stopped)
+
+    # print results, with the confidence interval of the scores if adaptive
+    print("Results: (%d rounds)" % args.rounds)
+    print("%s %s %s %s%s" % ("Warrior (Author)".ljust(40), "wins".rjust(5),
+                             "ties".rjust(5), "losses".rjust(5),
+                             "  score (95%)" if args.precision is not None else ""))
+    for warrior, (wins, ties, losses) in zip(warriors, scores):
+        print("%s %s %s %s%s" % (("%s (%s)" % (warrior.name, warrior.author)).ljust(40),
+                                 str(wins).rjust(5),
+                                 str(ties).rjust(5),
+                                 str(losses).rjust(5),
+                                 "  %.3f-%.3f" % confidence_interval(wins, ties, losses)
+                                 if args.precision is not None else ""))
 
 
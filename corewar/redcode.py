@@ -1,9 +1,11 @@
 # coding: utf-8
 
+import ast
 from copy import copy
+import operator
 import re
 
-__all__ = ['parse', 'DAT', 'MOV', 'ADD', 'SUB', 'MUL', 'DIV', 'MOD', 'JMP',
+__all__ = ['parse', 'read_warriors', 'evaluate', 'ParseError', 'DAT', 'MOV', 'ADD', 'SUB', 'MUL', 'DIV', 'MOD', 'JMP',
            'JMZ', 'JMN', 'DJN', 'SPL', 'SLT', 'CMP', 'SEQ', 'SNE', 'NOP',
            'M_A', 'M_B', 'M_AB', 'M_BA', 'M_F', 'M_X', 'M_I', 'IMMEDIATE',
            'DIRECT', 'INDIRECT_B', 'PREDEC_B', 'POSTINC_B', 'INDIRECT_A',
@@ -61,12 +63,33 @@ INDIRECT_A = 5  # indirect using A-field
 PREDEC_A = 6    # predecrement indirect using A-field
 POSTINC_A = 7   # postincrement indirect using A-field
 
+# Encoding of warrior files: many predate UTF-8, and Latin-1 reads any byte
+WARRIOR_ENCODING = 'latin-1'
+
+REDCODE_REGEX = re.compile(r'^;redcode\S*$', re.I)
+
 INSTRUCTION_REGEX = re.compile(r'([a-z]{3})'  # opcode
                                r'(?:\s*\.\s*([abfxi]{1,2}))?' # optional modifier
                                r'(?:\s*([#\$\*@\{<\}>])?\s*([^,$]+))?' # optional first value
                                r'(?:\s*,\s*([#\$\*@\{<\}>])?\s*(.+))?$', # optional second value
                                re.I)
 
+# Operators of the expressions of a warrior (see evaluate). Division is of
+# integers, and Redcode's logical operators are read as Python's: ! as ~, for
+# it to bind as tightly as the other unary operators
+BINARY_OPERATORS = {ast.Add: operator.add, ast.Sub: operator.sub,
+                    ast.Mult: operator.mul, ast.Div: operator.floordiv,
+                    ast.FloorDiv: operator.floordiv, ast.Mod: operator.mod}
+UNARY_OPERATORS = {ast.UAdd: operator.pos, ast.USub: operator.neg,
+                   ast.Not: operator.not_, ast.Invert: operator.not_}
+COMPARISONS = {ast.Eq: operator.eq, ast.NotEq: operator.ne, ast.Lt: operator.lt,
+               ast.LtE: operator.le, ast.Gt: operator.gt, ast.GtE: operator.ge}
+LOGICAL_OPERATORS = {'&&': ' and ', '||': ' or ', '!': '~'}
+LOGICAL_REGEX = re.compile(r'&&|\|\||!(?!=)')
+
+# Leading zeros of numbers, which are decimal in Redcode
+LEADING_ZEROS_REGEX = re.compile(r'\b0+(?=\d)')
+
 OPCODES = {'DAT': DAT, 'MOV': MOV, 'ADD': ADD, 'SUB': SUB, 'MUL': MUL,
            'DIV': DIV, 'MOD': MOD, 'JMP': JMP, 'JMZ': JMZ, 'JMN': JMN,
            'DJN': DJN, 'SPL': SPL, 'SLT': SLT, 'CMP': CMP, 'SEQ': SEQ,
@@ -78,6 +101,11 @@ MODIFIERS = {'A': M_A, 'B': M_B, 'AB': M_AB, 'BA': M_BA, 'F': M_F, 'X': M_X,
 MODES = { '#': IMMEDIATE, '$': DIRECT, '@': INDIRECT_B, '<': PREDEC_B,
           '>': POSTINC_B, '*': INDIRECT_A, '{': PREDEC_A, '}': POSTINC_A }
 
+# Reverse lookup of the tables above, to disassemble instructions
+OPCODE_NAMES = dict((value, key) for key, value in OPCODES.items())
+MODIFIER_NAMES = dict((value, key) for key, value in MODIFIERS.items())
+MODE_SYMBOLS = dict((value, key) for key, value in MODES.items())
+
 # ICWS'88 to ICWS'94 Conversion
 # The default modifier for ICWS'88 emulation is determined according to the
 # table below.
@@ -99,11 +127,15 @@ DEFAULT_MODIFIERS = {
 DEFAULT_MODIFIERS = dict((tuple(OPCODES[opcode] for opcode in opcodes),
                          dict(((tuple(MODES[a] for a in ab_modes[0]),
                                 tuple(MODES[b] for b in ab_modes[1])),
-                               MODIFIERS[modifier]) for ab_modes, modifier in ab_modes_modifiers.iteritems()))
-                         for opcodes, ab_modes_modifiers in DEFAULT_MODIFIERS.iteritems())
+                               MODIFIERS[modifier]) for ab_modes, modifier in ab_modes_modifiers.items()))
+                         for opcodes, ab_modes_modifiers in DEFAULT_MODIFIERS.items())
 
 class Warrior(object):
-    "An encapsulation of a Redcode Warrior, with instructions and meta-data"
+    """An encapsulation of a Redcode Warrior, with instructions and meta-data.
+       Once assembled, its instructions are immutable (see freeze), and the
+       state of each simulation is kept by the MARS, so a warrior may take
+       part in many simulations at once.
+    """
 
     def __init__(self, name='Unnamed', author='Anonymous', date=None,
                  version=None, strategy=None, start=0):
@@ -124,9 +156,17 @@ class Warrior(object):
     def __repr__(self):
         return "<Warrior name=%s %d instructions>" % (self.name, len(self.instructions))
 
+    def freeze(self):
+        "Make the instructions an immutable tuple of immutable instructions."
+        self.instructions = tuple(SharedInstruction(instruction)
+                                  for instruction in self.instructions)
+
 class Instruction(object):
     "An encapsulation of a Redcode instruction."
 
+    __slots__ = ('opcode', 'modifier', 'a_mode', 'b_mode', '_a_number',
+                 '_b_number', 'core')
+
     def __init__(self, opcode, modifier=None, a_mode=None, a_number=0,
                  b_mode=None, b_number=0):
         self.opcode = OPCODES[opcode.upper()] if isinstance(opcode, str) else opcode
@@ -156,10 +196,30 @@ class Instruction(object):
         instruction.core = core
         return instruction
 
+    def __copy__(self):
+        # copies are always plain (mutable) instructions, even from subclasses
+        instruction = Instruction.__new__(Instruction)
+        instruction.opcode = self.opcode
+        instruction.modifier = self.modifier
+        instruction.a_mode = self.a_mode
+        instruction.b_mode = self.b_mode
+        instruction._a_number = self._a_number
+        instruction._b_number = self._b_number
+        instruction.core = self.core
+        return instruction
+
+    def __getstate__(self):
+        return (self.opcode, self.modifier, self.a_mode, self.b_mode,
+                self._a_number, self._b_number, self.core)
+
+    def __setstate__(self, state):
+        (self.opcode, self.modifier, self.a_mode, self.b_mode,
+         self._a_number, self._b_number, self.core) = state
+
     def default_modifier(self):
-        for opcodes, modes_modifiers in DEFAULT_MODIFIERS.iteritems():
+        for opcodes, modes_modifiers in DEFAULT_MODIFIERS.items():
             if self.opcode in opcodes:
-                for ab_modes, modifier in modes_modifiers.iteritems():
+                for ab_modes, modifier in modes_modifiers.items():
                     a_modes, b_modes = ab_modes
                     if self.a_mode in a_modes and self.b_mode in b_modes:
                         return modifier
@@ -189,23 +249,85 @@ class Instruction(object):
     def __ne__(self, other):
         return not self == other
 
+    def disassemble(self):
+        """Return the instruction fields with the opcode, modifier and modes
+           as their Redcode names.
+        """
+        return (OPCODE_NAMES[self.opcode], MODIFIER_NAMES[self.modifier],
+                MODE_SYMBOLS[self.a_mode], self.a_number,
+                MODE_SYMBOLS[self.b_mode], self.b_number)
+
     def __str__(self):
-        # inverse lookup the instruction values
-        opcode   = next(key for key,value in OPCODES.iteritems() if value==self.opcode)
-        modifier = next(key for key,value in MODIFIERS.iteritems() if value==self.modifier)
-        a_mode   = next(key for key,value in MODES.iteritems() if value==self.a_mode)
-        b_mode   = next(key for key,value in MODES.iteritems() if value==self.b_mode)
-
-        return "%s.%s %s %s, %s %s" % (opcode,
-                                       modifier.ljust(2),
-                                       a_mode,
-                                       str(self.a_number).rjust(5),
-                                       b_mode,
-                                       str(self.b_number).rjust(5))
+        return "%s.%-2s %s %5s, %s %5s" % self.disassemble()
 
     def __repr__(self):
         return "<%s>" % self
 
+class SharedInstruction(Instruction):
+    """An immutable instruction, shared by the cells of a core that were not
+       written since it was cleared, or by the simulations a warrior takes
+       part in. Copies of it are plain instructions.
+    """
+
+    __slots__ = ()
+
+    def __init__(self, instruction, core=None):
+        for name in Instruction.__slots__:
+            object.__setattr__(self, name, getattr(instruction, name))
+        object.__setattr__(self, 'core', core)
+
+    def __setstate__(self, state):
+        for name, value in zip(Instruction.__slots__, state):
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Shared instructions are immutable")
+
+def evaluate(expression, *namespaces):
+    """Evaluate an expression of a warrior: integers and names, looked up in
+       the namespaces in order, with arithmetic, comparison and logical
+       operators. Anything else (calls, attributes...) raises a ValueError,
+       so a warrior can't run any code of its own.
+    """
+    expression = LOGICAL_REGEX.sub(lambda m: LOGICAL_OPERATORS[m.group()], expression)
+    expression = LEADING_ZEROS_REGEX.sub('', expression)
+    try:
+        tree = ast.parse(expression.strip(), mode='eval')
+    except SyntaxError:
+        raise ValueError("Invalid expression: %s" % expression.strip())
+    return _evaluate(tree.body, namespaces)
+
+def _evaluate(node, namespaces):
+    "Evaluate a node of the syntax tree of an expression (see evaluate)."
+    if isinstance(node, ast.Constant) and type(node.value) is int:
+        return node.value
+    elif isinstance(node, ast.Name):
+        for namespace in namespaces:
+            if node.id in namespace:
+                return namespace[node.id]
+        raise NameError("name '%s' is not defined" % node.id)
+    elif isinstance(node, ast.BinOp) and type(node.op) in BINARY_OPERATORS:
+        return BINARY_OPERATORS[type(node.op)](_evaluate(node.left, namespaces),
+                                               _evaluate(node.right, namespaces))
+    elif isinstance(node, ast.UnaryOp) and type(node.op) in UNARY_OPERATORS:
+        return UNARY_OPERATORS[type(node.op)](_evaluate(node.operand, namespaces))
+    elif isinstance(node, ast.Compare) and all(type(op) in COMPARISONS for op in node.ops):
+        left = _evaluate(node.left, namespaces)
+        for op, comparator in zip(node.ops, node.comparators):
+            right = _evaluate(comparator, namespaces)
+            if not COMPARISONS[type(op)](left, right):
+                return False
+            left = right
+        return True
+    elif isinstance(node, ast.BoolOp):
+        for value in node.values:
+            result = _evaluate(value, namespaces)
+            # short-circuit as Python does
+            if bool(result) == isinstance(node.op, ast.Or):
+                return result
+        return result
+    raise ValueError("Not allowed in an expression: %s" % type(node).__name__)
+
 def parse(input, definitions={}):
     """ Parse a Redcode code from a line iterator (input) returning a Warrior
         object."""
@@ -225,7 +347,7 @@ def parse(input, definitions={}):
         line = line.strip()
         if line:
             # process info comments
-            m = re.match(r'^;redcode\w*$', line, re.I)
+            m = REDCODE_REGEX.match(line)
             if m:
                 if found_recode_info_comment:
                     # stop reading, found second ;redcode
@@ -267,7 +389,7 @@ def parse(input, definitions={}):
             # Test if assert expression evaluates to true
             m = re.match(r'^;assert\s+(.+)$', line, re.I)
             if m:
-                if not eval(m.group(1), environment):
+                if not evaluate(m.group(1), environment):
                     raise AssertionError("Assertion failed: %s, line %d" % (line, n))
                 continue
 
@@ -298,7 +420,7 @@ def parse(input, definitions={}):
                 name, value = m.groups()
                 # evaluate EQU expression using previous EQU definitions,
                 # add result to a name variable in environment
-                environment[name] = eval(value, environment)
+                environment[name] = evaluate(value, environment)
                 continue
 
             # Keep matching the first word until it's no label anymore
@@ -346,20 +468,70 @@ def parse(input, definitions={}):
 
     # evaluate start expression
     if isinstance(warrior.start, str):
-        warrior.start = eval(warrior.start, environment, labels)
+        warrior.start = evaluate(warrior.start, labels, environment)
 
     # second pass
     for n, instruction in enumerate(warrior.instructions):
 
-        # create a dictionary of relative labels addresses to be used as a local
-        # eval environment
-        relative_labels = dict((name, address-n) for name, address in labels.iteritems())
+        # create a dictionary of relative labels addresses, looked up before
+        # the global environment
+        relative_labels = dict((name, address-n) for name, address in labels.items())
 
         # evaluate instruction fields using global environment and labels
         if isinstance(instruction.a_number, str):
-            instruction.a_number = eval(instruction.a_number, environment, relative_labels)
+            instruction.a_number = evaluate(instruction.a_number, relative_labels, environment)
         if isinstance(instruction.b_number, str):
-            instruction.b_number = eval(instruction.b_number, environment, relative_labels)
+            instruction.b_number = evaluate(instruction.b_number, relative_labels, environment)
 
+    warrior.freeze()
     return warrior
 
+class ParseError(ValueError):
+    """Error parsing one of the warriors read by read_warriors. Keeps the
+       number of the line (from 1) where the warrior starts, and the
+       original error.
+    """
+
+    def __init__(self, line, error):
+        ValueError.__init__(self, "Warrior at line %d: %s" % (line, error))
+        self.line = line
+        self.error = error
+
+def read_warriors(input, definitions={}, errors=None):
+    """Read any number of warriors from a line iterator (input), each one
+       starting with a ;redcode line, yielding Warrior objects as they are
+       parsed. Only the lines of one warrior are kept at a time.
+
+       A warrior which can't be parsed is skipped, and a ParseError is
+       appended to the errors list, if given.
+    """
+    lines = []
+    start = 1
+    # whether a ;redcode line was found: the lines before the first are
+    # dropped, those of an input without any make a single warrior
+    started = False
+
+    for n, line in enumerate(input, 1):
+        if REDCODE_REGEX.match(line.strip()):
+            if started:
+                warrior = _parse_one(lines, definitions, start, errors)
+                if warrior is not None:
+                    yield warrior
+            lines = []
+            started = True
+            start = n
+        lines.append(line)
+
+    if any(line.strip() for line in lines):
+        warrior = _parse_one(lines, definitions, start, errors)
+        if warrior is not None:
+            yield warrior
+
+def _parse_one(lines, definitions, start, errors):
+    "Parse the lines of a warrior, keeping the errors (see read_warriors)."
+    try:
+        return parse(lines, definitions)
+    except Exception as e:
+        # the assembler evaluates expressions, which may raise anything
+        if errors is not None:
+            errors.append(ParseError(start, e))
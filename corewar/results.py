@@ -0,0 +1,124 @@
+#! /usr/bin/env python3
+# coding: utf-8
+
+import csv
+import json
+import os
+
+from .mars import WIN, TIE, LOSS
+
+__all__ = ['ResultsSink', 'read_results', 'rounds', 'add_outcome']
+
+OUTCOME_NAMES = {WIN: 'win', TIE: 'tie', LOSS: 'loss'}
+OUTCOMES = dict((name, outcome) for outcome, name in OUTCOME_NAMES.items())
+
+# Columns of the CSV format, which has a row per warrior of each round
+CSV_FIELDS = ['round', 'warrior', 'name', 'position', 'outcome']
+
+def rounds(simulation, count, played=None):
+    """Yield the number of each round of a tournament, the positions of its
+       warriors and its outcomes if already played (see read_results), or
+       None. Positions are drawn even for the rounds already played, so a
+       seeded tournament plays the same rounds when resumed.
+    """
+    if played is None:
+        played = {}
+    for round in range(1, count + 1):
+        yield round, simulation.placement(), played.get(round)
+
+def add_outcome(score, outcome):
+    "Count an outcome into the wins, ties and losses of a warrior."
+    if outcome == WIN:
+        score[0] += 1
+    elif outcome == TIE:
+        score[1] += 1
+    else:
+        score[2] += 1
+
+def is_csv(filename):
+    return filename.lower().endswith('.csv')
+
+class ResultsSink(object):
+    """Appends the results of each round to a file as soon as the round is
+       over: a JSON line per round or, if the file name ends in .csv, a CSV
+       row per warrior. Every round is flushed to disk, so an interrupted
+       tournament keeps all the rounds it has finished.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.csv = is_csv(filename)
+
+        with open(filename, 'a+b') as existing:
+            existing.seek(0)
+            content = existing.read()
+            if content and not content.endswith(b'\n'):
+                # drop a line left incomplete by an interruption
+                existing.truncate(content.rfind(b'\n') + 1)
+
+        self.file = open(filename, 'a', newline='', encoding='utf-8')
+        if self.csv:
+            self.writer = csv.writer(self.file)
+            if self.file.tell() == 0:
+                self.writer.writerow(CSV_FIELDS)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def write(self, round, warriors, positions, outcomes):
+        "Append the results of a round, given its warriors' positions and outcomes."
+        if self.csv:
+            self.writer.writerows([round, n, warrior.name, position, OUTCOME_NAMES[outcome]]
+                                  for n, (warrior, position, outcome)
+                                  in enumerate(zip(warriors, positions, outcomes)))
+        else:
+            self.file.write(json.dumps({'round': round,
+                                        'warriors': [warrior.name for warrior in warriors],
+                                        'positions': positions,
+                                        'outcomes': [OUTCOME_NAMES[outcome]
+                                                     for outcome in outcomes]}) + '\n')
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        self.file.close()
+
+def read_results(filename, warriors):
+    """Read the rounds recorded by a ResultsSink of a tournament between the
+       given warriors. Return a dictionary of the outcomes of each complete
+       round, by round number (empty if the file doesn't exist). Raises
+       ValueError if the rounds were played by other warriors.
+    """
+    if not os.path.exists(filename):
+        return {}
+
+    names = [warrior.name for warrior in warriors]
+    rounds = {}
+
+    with open(filename, newline='', encoding='utf-8') as results:
+        if is_csv(filename):
+            for row in csv.DictReader(results):
+                if row['outcome'] not in OUTCOMES:
+                    continue # incomplete row
+                n = int(row['warrior'])
+                if n >= len(names) or row['name'] != names[n]:
+                    raise ValueError("Results of other warriors: %s" % filename)
+                rounds.setdefault(int(row['round']), {})[n] = OUTCOMES[row['outcome']]
+        else:
+            for line in results:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue # incomplete line
+                if record['warriors'] != names:
+                    raise ValueError("Results of other warriors: %s" % filename)
+                rounds[record['round']] = dict(enumerate(OUTCOMES[outcome]
+                                                         for outcome in record['outcomes']))
+
+    # rounds missing rows of some warrior are played again
+    return dict((round, [outcomes[n] for n in range(len(names))])
+                for round, outcomes in rounds.items()
+                if len(outcomes) == len(names))
@@ -0,0 +1,96 @@
+#! /usr/bin/env python3
+# coding: utf-8
+
+from array import array
+import csv
+
+__all__ = ['Sampler']
+
+class Sampler(object):
+    """Samples the number of processes and of owned cells (the ones it wrote
+       last) of each warrior every stride steps of a simulation, keeping the
+       last capacity samples in a ring buffer.
+
+       Attach it to a MARS with attach_sampler, before loading the warriors:
+       it starts over every time they are loaded.
+    """
+
+    def __init__(self, stride=100, capacity=1000):
+        self.stride = stride
+        self.capacity = capacity
+        self.warriors = []
+        self.count = 0
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def reset(self, simulation):
+        "Start sampling the simulation of its current warriors."
+        self.warriors = list(simulation.warriors)
+        self.size = len(simulation.core)
+        # index of the warrior which wrote each cell last, -1 for none
+        self.owners = array('h', [-1]) * self.size
+        self.cells = [0] * len(self.warriors)
+        self.steps = 0
+        self.count = 0
+        self.cycles = array('l', [0]) * self.capacity
+        self.processes = array('l', [0]) * (self.capacity * len(self.warriors))
+        self.owned = array('l', [0]) * (self.capacity * len(self.warriors))
+
+    def write(self, n, address):
+        "Track a write of a warrior (by index) to the core."
+        address %= self.size
+        previous = self.owners[address]
+        if previous != n:
+            if previous >= 0:
+                self.cells[previous] -= 1
+            self.cells[n] += 1
+            self.owners[address] = n
+
+    def step(self, simulation):
+        "Count a step of the simulation, sampling every stride steps."
+        self.steps += 1
+        if self.steps % self.stride == 0:
+            i = self.count % self.capacity
+            self.cycles[i] = self.steps
+            offset = i * len(self.warriors)
+            for n, task_queue in enumerate(simulation.task_queues):
+                self.processes[offset + n] = len(task_queue)
+                self.owned[offset + n] = self.cells[n]
+            self.count += 1
+
+    def samples(self):
+        """Yield the kept samples, oldest first: the cycle, and tuples of the
+           processes and of the owned cells of each warrior.
+        """
+        warriors = len(self.warriors)
+        for count in range(self.count - len(self), self.count):
+            i = count % self.capacity
+            yield (self.cycles[i],
+                   tuple(self.processes[i * warriors:(i + 1) * warriors]),
+                   tuple(self.owned[i * warriors:(i + 1) * warriors]))
+
+    def export(self, file):
+        """Write the kept samples to a file as CSV: the cycle, then the
+           processes and the owned cells of each warrior, by name.
+        """
+        writer = csv.writer(file)
+        writer.writerow(['cycle'] +
+                        ['%s processes' % warrior.name for warrior in self.warriors] +
+                        ['%s cells' % warrior.name for warrior in self.warriors])
+        for cycle, processes, cells in self.samples():
+            writer.writerow((cycle,) + processes + cells)
+
+    def to_numpy(self):
+        """Return the kept samples as NumPy arrays: the cycles, and the
+           processes and the owned cells, with a column per warrior.
+        """
+        import numpy
+
+        samples = list(self.samples())
+        shape = (len(samples), len(self.warriors))
+        return (numpy.array([cycle for cycle, processes, cells in samples], dtype=int),
+                numpy.array([processes for cycle, processes, cells in samples],
+                            dtype=int).reshape(shape),
+                numpy.array([cells for cycle, processes, cells in samples],
+                            dtype=int).reshape(shape))
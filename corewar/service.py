@@ -0,0 +1,226 @@
+#! /usr/bin/env python3
+# coding: utf-8
+
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from multiprocessing import Manager, Pool
+from queue import Empty
+from socketserver import ThreadingMixIn
+import asyncio
+import json
+import socket
+
+from .core import Core
+from .mars import MARS, Budget, WIN, TIE, LOSS, UNFINISHED
+from . import redcode
+
+__all__ = ['DEFAULT_SETTINGS', 'play', 'play_async', 'BattleService']
+
+# Settings of a battle, which each submission may override
+DEFAULT_SETTINGS = {'rounds': 1,
+                    'cycles': 80000,
+                    'size': 8000,
+                    'processes': 8000,
+                    'length': 100,
+                    'distance': 100,
+                    'seed': None,
+                    'budget': None}
+
+# Cycles run between reports of progress
+SLICE_CYCLES = 1000
+
+# Index of each outcome in the results
+RESULT_INDEXES = {WIN: 0, TIE: 1, LOSS: 2}
+
+def environment(settings):
+    "Return the assembling environment for the settings of a battle."
+    return {'CORESIZE': settings['size'],
+            'CYCLES': settings['cycles'],
+            'ROUNDS': settings['rounds'],
+            'MAXPROCESSES': settings['processes'],
+            'MAXLENGTH': settings['length'],
+            'MINDISTANCE': settings['distance']}
+
+def play(warriors, settings, progress=None):
+    """Play the rounds of a battle between warriors, with the given settings.
+       If a progress queue is given, put a record into it after every slice of
+       cycles. Return the wins, ties and losses of each warrior.
+
+       With a budget (in seconds), the battle stops once it's spent, and only
+       the rounds finished are counted. The last progress record then has
+       the cycle reached and the names of the warriors still alive.
+    """
+    results = [[0, 0, 0] for warrior in warriors]
+    for record in _play_slices(warriors, settings, results):
+        if progress is not None:
+            progress.put(record)
+    return results
+
+async def play_async(warriors, settings, progress=None):
+    """Play a battle just as play, as a coroutine which gives way to the
+       other tasks of the event loop after every slice of cycles. If given,
+       progress is an asyncio.Queue.
+    """
+    results = [[0, 0, 0] for warrior in warriors]
+    for record in _play_slices(warriors, settings, results):
+        if progress is not None:
+            await progress.put(record)
+        await asyncio.sleep(0)
+    return results
+
+def _play_slices(warriors, settings, results):
+    """Play a battle, adding up the outcomes of its rounds into results, and
+       yield a progress record after every slice of cycles.
+    """
+    budget = Budget(settings['budget']) if settings['budget'] is not None else None
+    simulation = MARS(core=Core(size=settings['size']),
+                      minimum_separation=settings['distance'],
+                      max_processes=settings['processes'],
+                      seed=settings['seed'])
+    simulation.warriors = warriors
+
+    for round in range(1, settings['rounds'] + 1):
+        if budget is not None and budget.spent():
+            break
+        simulation.reset()
+        for cycle, outcomes in simulation.run_slices(settings['cycles'], SLICE_CYCLES, budget):
+            yield {'round': round, 'cycle': cycle}
+
+        if UNFINISHED in outcomes:
+            yield {'round': round, 'cycle': cycle, 'stopped': True,
+                   'alive': [warrior.name for warrior, outcome
+                             in zip(warriors, outcomes) if outcome == UNFINISHED]}
+            break
+
+        for result, outcome in zip(results, outcomes):
+            result[RESULT_INDEXES[outcome]] += 1
+
+class BattleRequestHandler(BaseHTTPRequestHandler):
+    """Handles the submission of battles: a POST to /battles of a JSON object
+       with the Redcode sources of the warriors and, optionally, the settings
+       of the battle. The response is a stream of JSON lines with the
+       progress of the battle, and finally its results (or an error).
+    """
+
+    def do_POST(self):
+        if self.path != '/battles':
+            self.send_error(404)
+            return
+
+        try:
+            submission = json.loads(self.rfile.read(int(self.headers.get('content-length', 0))))
+            settings = dict(DEFAULT_SETTINGS)
+            for name, value in submission.get('settings', {}).items():
+                if name not in DEFAULT_SETTINGS:
+                    raise ValueError("Unknown setting: %s" % name)
+                settings[name] = value
+            sources = submission['warriors']
+            if not 1 <= len(sources) <= 8:
+                raise ValueError("Submit between 1 and 8 warriors")
+            if self.server.budget is not None:
+                settings['budget'] = (self.server.budget if settings['budget'] is None else
+                                      min(settings['budget'], self.server.budget))
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            self.send_error(400, "Invalid submission: %s" % e)
+            return
+
+        try:
+            warriors = [redcode.parse(source.split('\n'),
+                                      environment(settings))
+                        for source in sources]
+        except Exception as e:
+            # the assembler evaluates expressions, which may raise anything
+            self.send_error(400, "Invalid warrior: %s" % e)
+            return
+
+        progress = self.server.manager.Queue()
+        result = self.server.pool.apply_async(play, (warriors, settings, progress))
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.end_headers()
+
+        try:
+            self.send_record({'queued': True})
+            while True:
+                try:
+                    self.send_record(progress.get(timeout=0.1))
+                except Empty:
+                    if result.ready():
+                        break
+
+            # the worker is done: send what is left of its progress
+            while not progress.empty():
+                self.send_record(progress.get())
+
+            try:
+                self.send_record({'results': [dict(zip(('wins', 'ties', 'losses'), counts),
+                                                   name=warrior.name,
+                                                   author=warrior.author)
+                                              for warrior, counts in zip(warriors, result.get())]})
+            except Exception as e:
+                self.send_record({'error': str(e)})
+        except socket.error:
+            # client went away, the battle is discarded when it finishes
+            pass
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            BaseHTTPRequestHandler.log_message(self, format, *args)
+
+    def send_record(self, record):
+        "Write a JSON line to the response, immediately."
+        self.wfile.write((json.dumps(record) + '\n').encode('utf-8'))
+        self.wfile.flush()
+
+class BattleService(ThreadingMixIn, HTTPServer):
+    """A local HTTP server of battles. Each request is handled by its own
+       thread, which streams back the progress of its battle, played by a
+       pool of worker processes (all the CPUs, if workers is None). Battles
+       wait in the queue of the pool when all workers are busy.
+
+       If a budget is given, no battle plays for longer than that many
+       seconds, whatever its submission asks for.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address=('localhost', 8080), workers=None, verbose=False,
+                 budget=None):
+        HTTPServer.__init__(self, address, BattleRequestHandler)
+        self.verbose = verbose
+        self.budget = budget
+        self.pool = Pool(workers)
+        self.manager = Manager()
+
+    def server_close(self):
+        HTTPServer.server_close(self)
+        self.pool.terminate()
+        self.pool.join()
+        self.manager.shutdown()
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='MARS battle service')
+    parser.add_argument('--host', metavar='HOST', nargs='?',
+                        default='localhost', help='Address to listen')
+    parser.add_argument('--port', metavar='PORT', type=int, nargs='?',
+                        default=8080, help='Port to listen')
+    parser.add_argument('--workers', '-w', metavar='WORKERS', type=int, nargs='?',
+                        default=None, help='Worker processes')
+    parser.add_argument('--verbose', '-v', action='store_true',
+                        default=False, help='Log every request')
+    parser.add_argument('--budget', metavar='SECONDS', type=float, nargs='?',
+                        default=None, help='Maximum wall-clock time of each battle')
+
+    args = parser.parse_args()
+
+    service = BattleService((args.host, args.port), args.workers, args.verbose,
+                            args.budget)
+    print("Serving battles on http://%s:%d/battles" % service.server_address)
+    try:
+        service.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.server_close()
@@ -0,0 +1,266 @@
+#! /usr/bin/env python3
+# coding: utf-8
+
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+import struct
+
+from .mars import *
+from .mars import WRITE_EVENTS, CHANGE_EVENTS
+from .redcode import DAT
+
+__all__ = ['BroadcastMARS', 'Spectator', 'shared_name']
+
+# Layout of the shared memory block: a header, then a record for each of up
+# to MAX_WARRIORS warriors, then a record for each core cell. Warriors
+# without a process have -1 as their next address, cells without an owner
+# have -1 as their owner. Numbers are trimmed to the core size.
+MAGIC = b'CWAR'
+VERSION = 2
+MAX_WARRIORS = 8
+HEADER = struct.Struct('<4sIIIII')   # magic, version, size, warriors, round, cycle
+WARRIOR = struct.Struct('<32sii')    # name, processes, next address
+CELL = struct.Struct('<4Bb3xii')     # opcode, modifier, modes, owner, numbers
+
+WARRIORS_OFFSET = HEADER.size
+CELLS_OFFSET = WARRIORS_OFFSET + MAX_WARRIORS * WARRIOR.size
+
+# Steps between publications of the progress and the task queues
+STRIDE = 64
+
+# Names of the shared memory broadcast by this process
+_broadcasts = set()
+
+def shared_name(name):
+    "Return the name of the shared memory of the broadcast of a name."
+    return 'corewar-%s' % name
+
+def _attach(name):
+    "Attach to the shared memory of a broadcast, without owning it."
+    try:
+        return SharedMemory(shared_name(name), track=False)
+    except TypeError:
+        # before Python 3.13, attaching registers the memory to be removed
+        # when the process exits, as if it had created it
+        memory = SharedMemory(shared_name(name))
+        if shared_name(name) not in _broadcasts:
+            resource_tracker.unregister(memory._name, 'shared_memory')
+        return memory
+
+class BroadcastMARS(MARS):
+    """A headless MARS which publishes its core, and the next task of each
+       warrior, into a block of memory shared with spectators (see
+       Spectator). The simulation only packs the cells it changes, and the
+       progress every stride steps, never waiting for spectators, which may
+       come and go at any time. A new round only packs again the cells
+       changed in the last one.
+    """
+
+    def __init__(self, name, stride=STRIDE, **kargs):
+        self.name = shared_name(name)
+        self.stride = stride
+        # owners of the cells written, and cells changed since the core was
+        # published whole with fill as its clear instruction
+        self.owners = {}
+        self.changed = set()
+        self.fill = None
+        self.round = self.cycle = 0
+        self.memory = self.shared = None
+        MARS.__init__(self, **kargs)
+
+        self.memory = SharedMemory(self.name, create=True,
+                                   size=CELLS_OFFSET + len(self.core) * CELL.size)
+        _broadcasts.add(self.name)
+        self.shared = self.memory.buf
+        self.publish()
+
+    def close(self):
+        "Stop broadcasting, removing the shared memory."
+        if self.memory is not None:
+            self.shared = None
+            self.memory.close()
+            self.memory.unlink()
+            _broadcasts.discard(self.name)
+            self.memory = None
+
+    def load_warriors(self, *args, **kargs):
+        stale = self.changed
+        self.owners = {}
+        self.changed = set()
+        self.round += 1
+        self.cycle = 0
+        if self.shared is not None:
+            if self.core.clear_instruction is self.fill:
+                for address in stale:
+                    self.publish_cell(address)
+            else:
+                self.publish_cells()
+        MARS.load_warriors(self, *args, **kargs)
+        if self.shared is not None:
+            self.publish_warriors()
+
+    def publish(self):
+        "Publish the whole core and the warriors."
+        self.publish_cells()
+        self.publish_warriors()
+
+    def publish_cells(self):
+        self.fill = self.core.clear_instruction
+        for address in range(len(self.core)):
+            self.publish_cell(address)
+
+    def publish_warriors(self):
+        HEADER.pack_into(self.shared, 0, MAGIC, VERSION, len(self.core),
+                         len(self.warriors), self.round, self.cycle)
+        for n, warrior in enumerate(self.warriors[:MAX_WARRIORS]):
+            WARRIOR.pack_into(self.shared, WARRIORS_OFFSET + n * WARRIOR.size,
+                              warrior.name.encode('utf-8')[:32], 0, -1)
+        self.publish_queues()
+
+    def publish_cell(self, address):
+        instruction = self.core[address]
+        size = len(self.core)
+        CELL.pack_into(self.shared, CELLS_OFFSET + address * CELL.size,
+                       instruction.opcode, instruction.modifier,
+                       instruction.a_mode, instruction.b_mode,
+                       self.owners.get(address, -1),
+                       instruction.a_number % size, instruction.b_number % size)
+
+    def publish_queues(self):
+        for n, task_queue in enumerate(self.task_queues[:MAX_WARRIORS]):
+            struct.pack_into('<ii', self.shared, WARRIORS_OFFSET + n * WARRIOR.size + 32,
+                             len(task_queue), task_queue[0] if task_queue else -1)
+
+    def core_event(self, warrior, address, event_type):
+        if event_type in CHANGE_EVENTS:
+            address %= len(self.core)
+            if event_type in WRITE_EVENTS:
+                self.owners[address] = warrior
+            self.changed.add(address)
+            # warriors may be loaded before there's a shared memory
+            if self.shared is not None:
+                self.publish_cell(address)
+
+    def step(self):
+        MARS.step(self)
+        self.cycle += 1
+        if self.cycle % self.stride == 0 and self.shared is not None:
+            struct.pack_into('<I', self.shared, HEADER.size - 4, self.cycle)
+            self.publish_queues()
+
+class Spectator(object):
+    """Attaches to the shared memory of a BroadcastMARS, to read its state
+       at any moment. Reads are not synchronized with the simulation, so a
+       cell may be read while it's being written: fine to draw it, as the
+       next frame shows it right.
+    """
+
+    def __init__(self, name):
+        self.memory = _attach(name)
+        self.shared = self.memory.buf
+        magic, version, self.size = HEADER.unpack_from(self.shared, 0)[:3]
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError("Not a broadcast of this version: %s" % name)
+
+    def close(self):
+        self.shared = None
+        self.memory.close()
+
+    def progress(self):
+        "Return the round and the cycle being simulated."
+        return HEADER.unpack_from(self.shared, 0)[4:]
+
+    def warriors(self):
+        """Return the name, number of processes and next address (-1 if
+           none) of each warrior.
+        """
+        count = min(HEADER.unpack_from(self.shared, 0)[3], MAX_WARRIORS)
+        return [(name.rstrip(b'\0').decode('utf-8', 'replace'), processes, address)
+                for name, processes, address in
+                (WARRIOR.unpack_from(self.shared, WARRIORS_OFFSET + n * WARRIOR.size)
+                 for n in range(count))]
+
+    def cell(self, address):
+        """Return the opcode, modifier, A-mode, B-mode, owner (-1 if none),
+           A-number and B-number of a core cell.
+        """
+        return CELL.unpack_from(self.shared, CELLS_OFFSET + (address % self.size) * CELL.size)
+
+    def cells(self):
+        "Return a snapshot of the packed cells, as bytes."
+        return bytes(self.shared[CELLS_OFFSET:CELLS_OFFSET + self.size * CELL.size])
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+    import pygame
+    from pygame.locals import *
+    from .graphics import (INSTRUCTIONS_PER_LINE, WARRIOR_COLORS, BLACK, WHITE,
+                          DEFAULT_FG_COLOR)
+
+    parser = argparse.ArgumentParser(description='Spectator of a broadcast MARS')
+    parser.add_argument('--fps', metavar='FPS', type=int, nargs='?',
+                        default=10, help='Frames per second')
+    parser.add_argument('--zoom', '-z', metavar='PIXELS', type=int, nargs='?',
+                        default=6, help='Size of each cell')
+    parser.add_argument('name', metavar='NAME', help='Name of the broadcast')
+
+    args = parser.parse_args()
+
+    try:
+        spectator = Spectator(args.name)
+    except (IOError, ValueError) as e:
+        print("Can't attach to %s: %s" % (args.name, e), file=sys.stderr)
+        sys.exit(1)
+
+    lines = -(-spectator.size // INSTRUCTIONS_PER_LINE)
+    pygame.init()
+    display_surface = pygame.display.set_mode((INSTRUCTIONS_PER_LINE * args.zoom,
+                                               lines * args.zoom))
+    clock = pygame.time.Clock()
+
+    def draw_cell(cell, address):
+        "Draw a packed cell, in the color of its owner (dark if a DAT)."
+        opcode, modifier, a_mode, b_mode, owner, a_number, b_number = CELL.unpack(cell)
+        if owner >= 0:
+            color = WARRIOR_COLORS[owner % len(WARRIOR_COLORS)][0 if opcode == DAT else 1]
+        else:
+            color = BLACK if opcode == DAT else DEFAULT_FG_COLOR
+        display_surface.fill(color, ((address % INSTRUCTIONS_PER_LINE) * args.zoom,
+                                     (address // INSTRUCTIONS_PER_LINE) * args.zoom,
+                                     args.zoom, args.zoom))
+
+    previous = None
+    heads = set()
+    running = True
+    while running:
+        for event in pygame.event.get():
+            if event.type == QUIT:
+                running = False
+
+        # redraw only the cells changed since the last frame
+        cells = spectator.cells()
+        for address in range(spectator.size):
+            offset = address * CELL.size
+            cell = cells[offset:offset + CELL.size]
+            if (previous is None or address in heads or
+                cell != previous[offset:offset + CELL.size]):
+                draw_cell(cell, address)
+        previous = cells
+
+        # the next task of each warrior is drawn in white
+        heads = set(address for name, processes, address in spectator.warriors()
+                    if address >= 0)
+        for address in heads:
+            display_surface.fill(WHITE, ((address % INSTRUCTIONS_PER_LINE) * args.zoom,
+                                         (address // INSTRUCTIONS_PER_LINE) * args.zoom,
+                                         args.zoom, args.zoom))
+
+        round, cycle = spectator.progress()
+        pygame.display.set_caption("%s: round %d, cycle %d" % (args.name, round, cycle))
+        pygame.display.update()
+        clock.tick(args.fps)
+
+    spectator.close()
+    pygame.quit()
@@ -1,10 +1,21 @@
-#! /usr/bin/env python
+#! /usr/bin/env python3
 # coding: utf-8
 
 import unittest
 
 from tests.redcode_test import TestRedcodeAssembler
 from tests.mars_test import TestMars
+from tests.hill_test import TestHill
+from tests.service_test import TestBattleService
+from tests.results_test import TestResults
+from tests.sampler_test import TestSampler
+from tests.heatmap_test import TestHeatmap
+from tests.differential_test import TestDifferential
+from tests.generator_test import TestGenerator
+from tests.spectator_test import TestSpectator
+from tests.cache_test import TestResultCache
+from tests.cluster_test import TestCluster
+from tests.debugger_test import TestBreakpoints
 
 if __name__ == '__main__':
     unittest.main()
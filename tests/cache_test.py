@@ -0,0 +1,62 @@
+#! /usr/bin/env python3
+#! coding: utf-8
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from corewar import redcode
+from corewar.cache import ResultCache, warrior_hash
+from corewar.hill import battle
+from tests.sources import DWARF_SOURCE
+
+DEFAULT_ENV = {'CORESIZE': 800, 'MAXLENGTH': 100}
+
+class TestResultCache(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = ResultCache(os.path.join(self.directory, 'results.db'))
+        self.dwarf = redcode.parse([';name dwarf', 'loop add.ab #4, bomb',
+                                    'mov bomb, @bomb', 'jmp loop', 'bomb dat 0, 0'],
+                                   DEFAULT_ENV)
+        self.imp = redcode.parse([';name imp', 'mov 0, 1'], DEFAULT_ENV)
+
+    def tearDown(self):
+        self.cache.close()
+        shutil.rmtree(self.directory)
+
+    def test_warrior_hash(self):
+        renamed = redcode.parse([';name another dwarf'] + DWARF_SOURCE[1:], DEFAULT_ENV)
+        self.assertEqual(warrior_hash(self.dwarf), warrior_hash(renamed))
+
+        # numbers are the same modulo the core size
+        renamed = redcode.parse([';name another dwarf'] + DWARF_SOURCE[1:3] +
+                                ['jmp 798'] + DWARF_SOURCE[4:], DEFAULT_ENV)
+        self.assertEqual(warrior_hash(self.dwarf, 800), warrior_hash(renamed, 800))
+        self.assertNotEqual(warrior_hash(self.dwarf, 8000), warrior_hash(renamed, 8000))
+
+        self.assertNotEqual(warrior_hash(self.dwarf), warrior_hash(self.imp))
+
+    def test_battle(self):
+        settings = dict(rounds=4, cycles=500, size=800, minimum_separation=20, seed=1)
+        played = battle(self.dwarf, self.imp, cache=self.cache, **settings)
+        self.assertEqual(played, battle(self.dwarf, self.imp, **settings))
+
+        # a later battle doesn't play, even for the same code under other names
+        self.cache.put([self.dwarf, self.imp], [(1, 2, 3), (3, 2, 1)],
+                       exhaustive=False, precision=None, max_processes=8000, **settings)
+        renamed = redcode.parse([';name another imp', 'mov.i $0, $1'], DEFAULT_ENV)
+        self.assertEqual(((1, 2, 3), (3, 2, 1)),
+                         battle(self.dwarf, renamed, cache=self.cache, **settings))
+
+        # other settings, or no seed, are played
+        settings['cycles'] = 400
+        self.assertEqual(4, sum(battle(self.dwarf, self.imp, cache=self.cache, **settings)[0]))
+        del settings['seed']
+        self.assertEqual(4, sum(battle(self.dwarf, self.imp, cache=self.cache, **settings)[0]))
+        self.assertEqual(2, self.cache.connection.execute('SELECT COUNT(*) FROM results').fetchone()[0])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+#! /usr/bin/env python3
+#! coding: utf-8
+
+import json
+import socket
+import threading
+import unittest
+
+from corewar import redcode
+from corewar.cluster import Coordinator, work, encode_warrior, decode_warrior
+from corewar.hill import battle
+from tests.sources import DWARF_SOURCE, IMP_SOURCE
+
+DEFAULT_ENV = {'CORESIZE': 800, 'MAXLENGTH': 100}
+
+SETTINGS = dict(cycles=2000, size=800, max_processes=800, minimum_separation=10)
+
+class TestCluster(unittest.TestCase):
+
+    def setUp(self):
+        self.dwarf = redcode.parse(DWARF_SOURCE, DEFAULT_ENV)
+        self.imp = redcode.parse(IMP_SOURCE, DEFAULT_ENV)
+        self.coordinator = Coordinator(('localhost', 0), batch_rounds=4)
+
+    def tearDown(self):
+        self.coordinator.close()
+
+    def test_encode_warrior(self):
+        decoded = decode_warrior(json.loads(json.dumps(encode_warrior(self.dwarf))))
+        self.assertEqual((self.dwarf.name, self.dwarf.start), (decoded.name, decoded.start))
+        self.assertEqual(self.dwarf.instructions, decoded.instructions)
+
+    def test_tournament(self):
+        self.coordinator.submit(self.dwarf, self.imp, rounds=10, seed=1, **SETTINGS)
+        self.coordinator.submit(self.imp, self.dwarf, rounds=3, seed=5, **SETTINGS)
+
+        results = []
+        coordinator = threading.Thread(target=lambda: results.extend(self.coordinator.run()))
+        coordinator.start()
+
+        # a worker which takes a job and dies: the job is queued again
+        connection = socket.create_connection(self.coordinator.address)
+        self.assertTrue(json.loads(connection.makefile('rb').readline())['job'])
+        connection.close()
+
+        # and so is the job of a worker replying with anything but an object
+        for reply in (b'[]\n', b'1\n'):
+            connection = socket.create_connection(self.coordinator.address)
+            self.assertTrue(json.loads(connection.makefile('rb').readline())['job'])
+            connection.sendall(reply)
+            self.assertEqual(b'', connection.recv(1))
+            connection.close()
+
+        played = []
+        workers = [threading.Thread(target=lambda: played.append(work(self.coordinator.address)))
+                   for i in range(2)]
+        for worker in workers:
+            worker.start()
+        for worker in workers + [coordinator]:
+            worker.join()
+
+        # the same results as played here, batch by batch
+        batches = [battle(self.dwarf, self.imp, rounds, seed=seed, **SETTINGS)
+                   for rounds, seed in ((4, 1), (4, 2), (2, 3))]
+        expected = [tuple(tuple(map(sum, zip(*scores))) for scores in zip(*batches)),
+                    battle(self.imp, self.dwarf, 3, seed=5, **SETTINGS)]
+        self.assertEqual(expected, results)
+        self.assertEqual(4, sum(played))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+#! /usr/bin/env python3
+#! coding: utf-8
+
+import unittest
+
+from corewar import redcode
+from corewar.core import Core
+from corewar.debugger import Breakpoints
+from corewar.mars import MARS
+from corewar.sampler import Sampler
+from tests.sources import DWARF_SOURCE
+
+DEFAULT_ENV = {'CORESIZE': 800, 'MAXLENGTH': 100}
+
+class TestBreakpoints(unittest.TestCase):
+
+    def setUp(self):
+        # the dwarf bombs every 4th cell, the victim runs into its DAT
+        self.dwarf = redcode.parse(DWARF_SOURCE, DEFAULT_ENV)
+        self.victim = redcode.parse([';name victim', 'nop', 'nop', 'dat 0, 0'], DEFAULT_ENV)
+        self.simulation = MARS(core=Core(size=800), minimum_separation=10)
+        self.simulation.warriors = [self.dwarf, self.victim]
+        self.breakpoints = Breakpoints(self.simulation)
+
+    def run_until_hit(self, cycles=2000):
+        "Play a round, returning the cycle and the first breakpoints hit."
+        self.simulation.reset(positions=[0, 400])
+        self.breakpoints.reset()
+        for cycle in range(1, cycles + 1):
+            self.simulation.step()
+            hits = self.breakpoints.check()
+            if hits:
+                return cycle, hits
+
+    def test_no_breakpoints(self):
+        # nothing intercepted
+        self.assertEqual(MARS.core_event, type(self.simulation).core_event)
+        self.assertNotIn('core_event', vars(self.simulation))
+        watch = self.breakpoints.watch(404)
+        self.assertIn('core_event', vars(self.simulation))
+        self.breakpoints.remove(watch)
+        self.assertNotIn('core_event', vars(self.simulation))
+        self.assertEqual(None, self.run_until_hit(500))
+
+    def test_with_sampler(self):
+        # the sampler keeps listening, whatever the order they come and go
+        watch = self.breakpoints.watch(7)
+        sampler = Sampler(stride=1)
+        self.simulation.attach_sampler(sampler)
+        self.breakpoints.remove(watch)
+        self.assertEqual(None, self.run_until_hit(10))
+        self.assertEqual(0, sampler.owners[7])
+
+        watch = self.breakpoints.watch(7)
+        self.simulation.detach_sampler()
+        self.assertEqual((2, [(watch, 0, 7)]), self.run_until_hit())
+        self.breakpoints.remove(watch)
+        self.assertNotIn('core_event', vars(self.simulation))
+
+    def test_breakpoints(self):
+        self.breakpoints.at(2)
+        self.assertEqual((3, [(self.breakpoints.table[(2, 0)][0], 0, 2)]),
+                          self.run_until_hit())
+
+        # the dwarf bombs the 4th cell after itself
+        self.breakpoints.clear()
+        watch = self.breakpoints.watch(7)
+        self.assertEqual((2, [(watch, 0, 7)]), self.run_until_hit())
+        self.assertEqual('change at 00007', str(watch))
+
+        # the victim dies in the third cycle
+        self.breakpoints.clear()
+        dat = self.breakpoints.on_opcode(redcode.DAT, warrior=1)
+        death = self.breakpoints.on_death()
+        self.assertEqual((3, [(dat, 1, 402), (death, 1, None)]), self.run_until_hit())
+        self.assertEqual(0, len(self.simulation.task_queues[1]))
+        self.assertEqual('execution of DAT of warrior 1', str(dat))
+
+    def test_watch_changes(self):
+        # increments and decrements of a field change the cell too
+        self.simulation.warriors = [redcode.parse(['jmp 0, >5'], DEFAULT_ENV),
+                                    redcode.parse(['djn 0, 3'], DEFAULT_ENV)]
+        increment = self.breakpoints.watch(5)
+        decrement = self.breakpoints.watch(403)
+        self.assertEqual((1, [(increment, 0, 5), (decrement, 1, 403)]),
+                         self.run_until_hit())
+
+    def test_reset(self):
+        # the victim dies, so no warrior gets to one process...
+        self.breakpoints.on_processes(1)
+        self.assertEqual(None, self.run_until_hit(10))
+        # ...not even when the next round brings it back
+        self.assertEqual(None, self.run_until_hit(10))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+#! /usr/bin/env python3
+#! coding: utf-8
+
+import os
+import unittest
+
+from corewar import redcode
+from corewar.core import Core
+from corewar.differential import compare
+from corewar.mars import MARS
+
+DEFAULT_ENV = {'CORESIZE': 8000, 'MAXLENGTH': 100}
+
+WARRIORS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'warriors')
+
+class TestDifferential(unittest.TestCase):
+
+    def setUp(self):
+        self.warriors = []
+        for name in ('validate.red', 'dwarf.red'):
+            with open(os.path.join(WARRIORS_PATH, name),
+                      encoding=redcode.WARRIOR_ENCODING) as f:
+                self.warriors.append(redcode.parse(f, DEFAULT_ENV))
+
+    def simulation(self, engine=MARS, **kargs):
+        # the engines share the warriors
+        return engine(core=Core(size=8000), warriors=self.warriors, seed=3, **kargs)
+
+    def test_compiled_agrees(self):
+        self.assertEqual(None, compare(self.simulation(), self.simulation(compiled=True),
+                                        rounds=2, cycles=5000, every=100))
+
+    def test_first_divergence(self):
+        class DriftingMARS(MARS):
+            "Bombs the cell after the first execution of the 250th cycle."
+            cycle = 0
+            def load_warriors(self, *args, **kargs):
+                MARS.load_warriors(self, *args, **kargs)
+                self.cycle = 0
+            def step(self):
+                MARS.step(self)
+                self.cycle += 1
+                if self.cycle == 250:
+                    self.core[self.task_queues[1][0] + 4] = redcode.Instruction('NOP')
+
+        divergence = compare(self.simulation(), self.simulation(DriftingMARS),
+                             cycles=5000, every=100)
+
+        self.assertEqual((1, 250), (divergence.round, divergence.cycle))
+        self.assertEqual(redcode.Instruction('NOP'), divergence.found)
+        self.assertNotEqual(divergence.expected, divergence.found)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+#! /usr/bin/env python3
+#! coding: utf-8
+
+import unittest
+
+from corewar import redcode
+from corewar.core import Core
+from corewar.differential import compare
+from corewar.generator import Generator, source
+from corewar.mars import MARS
+
+DEFAULT_ENV = {'CORESIZE': 800, 'MAXLENGTH': 20}
+
+class TestGenerator(unittest.TestCase):
+
+    def test_reproducible(self):
+        first, second = (list(Generator(DEFAULT_ENV, seed=7).warriors(10)) for i in range(2))
+        self.assertEqual([warrior.instructions for warrior in first],
+                          [warrior.instructions for warrior in second])
+        self.assertTrue(all(1 <= len(warrior) <= 20 for warrior in first))
+
+    def test_distributions(self):
+        generator = Generator(DEFAULT_ENV, opcodes={'MOV': 3, 'SPL': 1, 'DAT': 0},
+                              modifiers={redcode.M_I: 1}, modes={'$': 1, '@': 1})
+        instructions = [instruction for warrior in generator.warriors(20)
+                        for instruction in warrior]
+        self.assertEqual(set([redcode.MOV, redcode.SPL]),
+                          set(instruction.opcode for instruction in instructions))
+        self.assertEqual(set([redcode.M_I]),
+                          set(instruction.modifier for instruction in instructions))
+
+        # names and values may be mixed
+        generator = Generator(DEFAULT_ENV, opcodes={'MOV': 1, redcode.SPL: 1},
+                              modes={'$': 1, redcode.DIRECT: 1, '#': 0})
+        self.assertEqual([redcode.MOV, redcode.SPL], generator.opcodes[0])
+        self.assertEqual(([redcode.DIRECT], [2]), generator.modes)
+
+    def test_source(self):
+        for warrior in Generator(DEFAULT_ENV, seed=1).warriors(20):
+            parsed = redcode.parse(source(warrior), DEFAULT_ENV)
+            self.assertEqual(warrior.instructions, parsed.instructions)
+            self.assertEqual(warrior.start, parsed.start)
+
+        # warriors without a strategy, as from other sources
+        warrior = redcode.parse(['mov 0, 1'], DEFAULT_ENV)
+        warrior.strategy = None
+        self.assertEqual(warrior.instructions,
+                         redcode.parse(source(warrior), DEFAULT_ENV).instructions)
+
+    def test_engines_agree(self):
+        warriors = list(Generator(DEFAULT_ENV, seed=3).warriors(6))
+        for a, b in zip(warriors[::2], warriors[1::2]):
+            simulations = [MARS(core=Core(size=800), minimum_separation=20, seed=1,
+                                warriors=[redcode.parse(source(warrior), DEFAULT_ENV)
+                                          for warrior in (a, b)],
+                                compiled=compiled)
+                           for compiled in (False, True)]
+            self.assertEqual(None, compare(simulations[0], simulations[1], cycles=2000, every=50))
+
+if __name__ == '__main__':
+    unittest.main()
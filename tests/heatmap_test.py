@@ -0,0 +1,64 @@
+#! /usr/bin/env python3
+#! coding: utf-8
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from corewar import redcode
+from corewar.core import Core
+from corewar.heatmap import Heatmap, HeatmapMARS, accumulate
+from corewar.mars import Budget, EVENT_EXECUTED, EVENT_I_WRITE
+from tests.sources import DWARF_SOURCE, IMP_SOURCE
+
+DEFAULT_ENV = {'CORESIZE': 800, 'MAXLENGTH': 100}
+
+class TestHeatmap(unittest.TestCase):
+
+    def setUp(self):
+        self.warriors = [redcode.parse(DWARF_SOURCE, DEFAULT_ENV),
+                         redcode.parse(IMP_SOURCE, DEFAULT_ENV)]
+
+    def test_relative_to_load_position(self):
+        simulation = HeatmapMARS(core=Core(size=800), minimum_separation=10, seed=1)
+        simulation.warriors = self.warriors
+        for round in range(3):
+            simulation.reset()
+            # the budget goes through to MARS.run_slices
+            simulation.run(90, Budget(60))
+
+        heatmap = simulation.heatmap
+        self.assertEqual(3, heatmap.rounds)
+        # the dwarf executes its loop 30 times a round, wherever it is loaded
+        self.assertEqual([90, 90, 90, 0], list(heatmap.counts[0, EVENT_EXECUTED, :4]))
+        # and bombs every fourth address after its code
+        self.assertEqual(3, heatmap.counts[0, EVENT_I_WRITE, 7])
+        self.assertEqual(0, heatmap.counts[0, EVENT_I_WRITE, 8])
+        # the imp executes where it has written
+        self.assertEqual(3, heatmap.counts[1, EVENT_EXECUTED, 89])
+        self.assertEqual(90 * 3, heatmap.total(1, [EVENT_EXECUTED]).sum())
+
+        # merging heatmaps of separate processes
+        merged = accumulate(self.warriors, rounds=3, cycles=90, size=800,
+                            minimum_separation=10, seed=1, processes=2)
+        self.assertEqual(3, merged.rounds)
+        self.assertEqual(heatmap.total(0).sum(), merged.total(0).sum())
+
+    def test_save(self):
+        heatmap = accumulate(self.warriors, rounds=2, cycles=50, size=800,
+                             minimum_separation=10)
+        directory = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(directory, 'heatmap.npz')
+            heatmap.save(filename)
+            loaded = Heatmap.load(filename)
+        finally:
+            shutil.rmtree(directory)
+
+        self.assertEqual(['dwarf', 'imp'], loaded.names)
+        self.assertEqual(2, loaded.rounds)
+        self.assertTrue((heatmap.counts == (loaded + loaded).counts / 2).all())
+
+if __name__ == '__main__':
+    unittest.main()
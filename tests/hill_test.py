@@ -0,0 +1,122 @@
+#! /usr/bin/env python3
+#! coding: utf-8
+
+import unittest
+
+from corewar import redcode
+from corewar.hill import Hill, battle, confidence_interval
+from corewar.mars import Budget
+from tests.sources import DWARF_SOURCE, IMP_SOURCE
+
+DEFAULT_ENV = {'CORESIZE': 8000, 'MAXLENGTH': 100}
+
+SUICIDE_CODE = """
+    ;name suicide
+    dat     #0,     #0
+"""
+
+class TestHill(unittest.TestCase):
+
+    def setUp(self):
+        self.dwarf = redcode.parse(DWARF_SOURCE, DEFAULT_ENV)
+        self.imp = redcode.parse(IMP_SOURCE, DEFAULT_ENV)
+        self.suicide = redcode.parse(SUICIDE_CODE.split('\n'), DEFAULT_ENV)
+        self.hill = Hill(size=2, rounds=2, cycles=500)
+
+    def test_challenger_evicted(self):
+        self.hill.add(self.dwarf)
+        self.hill.add(self.imp)
+
+        evicted = self.hill.challenge(self.suicide)
+
+        self.assertIs(self.suicide, evicted)
+        self.assertEqual(2, len(self.hill))
+        self.assertEqual(2, len(self.hill.results))
+        self.assertEqual(0, self.hill.score(self.imp) + self.hill.score(self.dwarf) -
+                             sum(3 * w + t for w, t, l in self.hill.results.values()))
+
+    def test_replace_keeps_other_results(self):
+        self.hill.size = 3
+        self.hill.add(self.dwarf)
+        self.hill.add(self.suicide)
+        self.hill.add(self.imp)
+        imp_vs_dwarf = self.hill.results[self.imp, self.dwarf]
+
+        self.hill.replace(self.suicide,
+                          redcode.parse(SUICIDE_CODE.split('\n'), DEFAULT_ENV))
+
+        self.assertIs(imp_vs_dwarf, self.hill.results[self.imp, self.dwarf])
+        self.assertFalse(any(self.suicide in pair for pair in self.hill.results))
+        self.assertEqual((2, 0, 0), self.hill.results[self.dwarf, self.hill.warriors[-1]])
+        self.assertIs(self.hill.warriors[-1], self.hill.ranking()[-1])
+
+    def test_exhaustive_battle(self):
+        settings = dict(cycles=100, size=200, minimum_separation=20,
+                        exhaustive=True)
+
+        serial = battle(self.dwarf, self.imp, processes=1, **settings)
+        pooled = battle(self.dwarf, self.imp, processes=2, **settings)
+
+        self.assertEqual(200 - 4 - 1 - 2 * 20 + 1, sum(serial[0]))
+        self.assertEqual(serial, pooled)
+
+    def test_budget(self):
+        budget = Budget()
+        budget.cancel()
+        self.assertEqual(((0, 0, 0), (0, 0, 0)),
+                         battle(self.dwarf, self.imp, rounds=5, budget=budget))
+        self.assertEqual(5, sum(battle(self.dwarf, self.imp, rounds=5, cycles=500,
+                                       budget=60)[0]))
+
+        # the unfinished round is left out, and the pairing marked
+        self.hill.settings['budget'] = 0
+        self.hill.add(self.dwarf)
+        self.hill.add(self.imp)
+        self.assertEqual((0, 0, 0), self.hill.results[self.imp, self.dwarf])
+        self.assertEqual({(self.imp, self.dwarf), (self.dwarf, self.imp)}, self.hill.incomplete)
+
+        self.hill.settings['budget'] = 60
+        self.hill.retry()
+        self.assertEqual(2, sum(self.hill.results[self.imp, self.dwarf]))
+        self.assertEqual(set(), self.hill.incomplete)
+
+    def test_confidence_interval(self):
+        self.assertEqual((0.0, 1.0), confidence_interval(0, 0, 0))
+
+        low, high = confidence_interval(50, 0, 50)
+        self.assertAlmostEqual(0.5, (low + high) / 2)
+        self.assertAlmostEqual(0.096, (high - low) / 2, places=3)
+
+        # a sweep is still uncertain, but less than an even result
+        low, high = confidence_interval(100, 0, 0)
+        self.assertAlmostEqual(1.0, high)
+        self.assertTrue(0.96 < low < 0.97)
+
+        self.assertEqual(confidence_interval(50, 0, 50), confidence_interval(0, 100, 0))
+
+    def test_adaptive_battle(self):
+        settings = dict(rounds=200, cycles=500, size=800, minimum_separation=20,
+                        seed=1)
+
+        (wins, ties, losses), _ = battle(self.dwarf, self.suicide, precision=0.05,
+                                         **settings)
+
+        # stops as soon as the interval of a sweep is precise enough
+        self.assertEqual((35, 0, 0), (wins, ties, losses))
+        self.assertEqual(((200, 0, 0), (0, 0, 200)),
+                         battle(self.dwarf, self.suicide, **settings))
+
+    def test_both_lose(self):
+        other = redcode.parse(SUICIDE_CODE.split('\n'), DEFAULT_ENV)
+
+        # both warriors die in the first cycle: neither wins
+        self.assertEqual(((0, 0, 5), (0, 0, 5)), battle(self.suicide, other, rounds=5))
+
+        self.hill.add(self.suicide)
+        self.hill.add(other)
+        self.assertEqual((0, 0, 2), self.hill.results[self.suicide, other])
+        self.assertEqual((0, 0, 2), self.hill.results[other, self.suicide])
+        self.assertEqual(0, self.hill.score(self.suicide) + self.hill.score(other))
+
+if __name__ == '__main__':
+    unittest.main()
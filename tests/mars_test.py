@@ -1,11 +1,11 @@
-#! /usr/bin/env python
+#! /usr/bin/env python3
 #! coding: utf-8
 
 import os
 import re
 import unittest
 
-from corewar import redcode, mars
+from corewar import core, redcode, mars, differential
 
 DEFAULT_ENV = {'CORESIZE': 8000, 'MAXLENGTH': 100}
 
@@ -37,15 +37,193 @@ class TestMars(unittest.TestCase):
         simulation = mars.MARS(warriors=[dwarf, sitting_duck])
 
         # run simulation for at most
-        for x in xrange(8000):
+        for x in range(8000):
             simulation.step()
-            if not dwarf.task_queue or not sitting_duck.task_queue:
+            if not simulation.task_queues[0] or not simulation.task_queues[1]:
                 break
         else:
             self.fail("Running for too long and both warriors still alive")
 
-        self.assertEquals(1, len(dwarf.task_queue))
-        self.assertEquals(0, len(sitting_duck.task_queue))
+        self.assertEqual(1, len(simulation.task_queues[0]))
+        self.assertEqual(0, len(simulation.task_queues[1]))
+
+    def test_seeded_placement(self):
+        imp = redcode.parse(['mov.i #1, }0'], DEFAULT_ENV)
+        dwarf = redcode.parse(['add.ab #4, 1', 'mov 2, 2', 'jmp -2'], DEFAULT_ENV)
+
+        def positions(seed):
+            simulation = mars.MARS(warriors=[imp, dwarf], seed=seed)
+            result = []
+            for r in range(5):
+                simulation.reset()
+                result.append([task_queue[0] for task_queue in simulation.task_queues])
+            return result
+
+        self.assertEqual(positions(42), positions(42))
+        self.assertNotEqual(positions(42), positions(43))
+
+    def test_shared_warriors(self):
+        imp = redcode.parse(['mov.i #1, }0'], DEFAULT_ENV)
+        dwarf = redcode.parse(['add.ab #4, 1', 'mov 2, 2', 'jmp -2'], DEFAULT_ENV)
+
+        # assembled warriors can't be changed by the simulations
+        self.assertRaises(AttributeError, setattr, dwarf.instructions[0], 'a_number', 5)
+
+        # simulations of the same warriors, stepped in turns, play as if alone
+        simulations = [mars.MARS(warriors=[imp, dwarf], seed=seed) for seed in (1, 2)]
+        for i in range(300):
+            for simulation in simulations:
+                simulation.step()
+
+        for seed, simulation in zip((1, 2), simulations):
+            alone = mars.MARS(warriors=[redcode.parse(['mov.i #1, }0'], DEFAULT_ENV),
+                                        redcode.parse(['add.ab #4, 1', 'mov 2, 2', 'jmp -2'],
+                                                      DEFAULT_ENV)],
+                              seed=seed)
+            for i in range(300):
+                alone.step()
+            self.assertEqual(list(alone), list(simulation))
+            self.assertEqual(alone.task_queues, simulation.task_queues)
+
+        # a warrior may fill many slots, and plays in each as a copy of its own
+        self_play = mars.MARS(warriors=[dwarf, dwarf], seed=1)
+        copies = mars.MARS(warriors=[dwarf, redcode.parse(['add.ab #4, 1', 'mov 2, 2', 'jmp -2'],
+                                                          DEFAULT_ENV)], seed=1)
+        self.assertEqual(2, len(self_play.task_queues))
+        for i in range(300):
+            self_play.step()
+            copies.step()
+        self.assertEqual(list(copies), list(self_play))
+        self.assertEqual(copies.task_queues, self_play.task_queues)
+
+    def test_reset_restores_dirty_cells(self):
+        dwarf = redcode.parse(['add.ab #4, 1', 'mov 2, 2', 'jmp -2'], DEFAULT_ENV)
+        simulation = mars.MARS(warriors=[dwarf], randomize=False)
+
+        for i in range(300):
+            simulation.step()
+        self.assertEqual(3 + 100, len(simulation.core.dirty))
+
+        simulation.core.clear()
+        self.assertEqual(set(), simulation.core.dirty)
+        for instruction in simulation.core:
+            self.assertIs(simulation.core.clear_instruction, instruction)
+        self.assertEqual(core.DEFAULT_INITIAL_INSTRUCTION,
+                          simulation.core.clear_instruction)
+        with self.assertRaises(AttributeError):
+            simulation.core[0].a_number = 1
+
+    def test_sparse_core(self):
+        current_path = os.path.dirname(os.path.realpath(__file__))
+        warriors = []
+        for filename in ("validate.red", "dwarf.red"):
+            with open(os.path.join(current_path, "..", "warriors", filename)) as f:
+                warriors.append(redcode.parse(f, DEFAULT_ENV))
+
+        # plays just as a plain core
+        for compiled in (False, True):
+            reference = mars.MARS(core=core.Core(), warriors=warriors, seed=3)
+            sparse = mars.MARS(core=core.SparseCore(), warriors=warriors, seed=3,
+                               compiled=compiled)
+            self.assertEqual(None, differential.compare(reference, sparse, rounds=2,
+                                                         cycles=3000, every=100))
+            self.assertEqual(list(reference.core[-22:22]), sparse.core[-22:22])
+
+        # only the cells written are stored
+        large = core.SparseCore(size=10**8)
+        simulation = mars.MARS(core=large, warriors=warriors, seed=3)
+        for i in range(500):
+            simulation.step()
+        self.assertEqual(large.dirty, set(large.instructions))
+        simulation.reset()
+        self.assertEqual(len(warriors[0]) + len(warriors[1]), len(large.instructions))
+        self.assertIs(large.clear_instruction, large[12345678])
+
+    def test_detect_repetition(self):
+        imp = redcode.parse(['mov 0, 1'], DEFAULT_ENV)
+        other_imp = redcode.parse(['mov 0, 1'], DEFAULT_ENV)
+        hashed_core = core.HashedCore(size=200)
+        simulation = mars.MARS(core=hashed_core, warriors=[imp, other_imp],
+                               minimum_separation=10, detect_repetition=True)
+
+        # would run (almost) forever without detection
+        self.assertEqual([mars.TIE, mars.TIE], simulation.run(10**9))
+
+        simulation.reset()
+        hashes = []
+        for i in range(1000):
+            simulation.step()
+            hashes.append(simulation.state_hash())
+            expected = core.HashedCore(size=200)
+            for address, instruction in enumerate(hashed_core):
+                expected[address] = instruction
+            self.assertEqual(expected.hash, hashed_core.hash)
+
+        # once the core is full of imps, states repeat every 200 cycles
+        self.assertEqual(hashes[-1], hashes[-201])
+        self.assertNotIn(hashes[-1], hashes[-200:-1])
+
+    def test_run_slices(self):
+        imp = redcode.parse(['mov 0, 1'], DEFAULT_ENV)
+        simulation = mars.MARS(warriors=[imp], minimum_separation=10)
+
+        self.assertEqual([(1000, None), (2000, None), (2500, [mars.TIE])],
+                          list(simulation.run_slices(2500, 1000)))
+
+    def test_budget(self):
+        imp = redcode.parse(['mov 0, 1'], DEFAULT_ENV)
+        other_imp = redcode.parse(['mov 0, 1'], DEFAULT_ENV)
+        simulation = mars.MARS(warriors=[imp, other_imp], minimum_separation=10)
+
+        # cancelled between slices, it stops at the next check
+        budget = mars.Budget(check_cycles=100)
+        slices = simulation.run_slices(10**9, 250, budget)
+        self.assertEqual((250, None), next(slices))
+        budget.cancel()
+        self.assertEqual([(300, [mars.UNFINISHED, mars.UNFINISHED])], list(slices))
+
+        # an expired budget stops at the first check
+        simulation.reset()
+        self.assertEqual([(100, [mars.UNFINISHED, mars.UNFINISHED])],
+                          list(simulation.run_slices(10**9, 10**9, mars.Budget(0, 100))))
+        simulation.reset()
+        self.assertEqual([mars.TIE, mars.TIE], simulation.run(500, mars.Budget(60)))
+
+    def test_batched_events(self):
+        class EventsMARS(mars.MARS):
+            def core_event(self, warrior, address, event_type):
+                self.events.append((warrior, address % len(self), event_type))
+
+        class BatchedEventsMARS(mars.MARS):
+            def core_events(self, warriors, addresses, event_types, count):
+                self.batches.append(list(zip(warriors[:count], addresses[:count],
+                                        event_types[:count])))
+
+        current_path = os.path.dirname(os.path.realpath(__file__))
+
+        def warriors():
+            with open(os.path.join(current_path, "..", "warriors", "validate.red")) as f:
+                validate = redcode.parse(f, DEFAULT_ENV)
+            dwarf = redcode.parse(['add.ab #4, 1', 'mov 2, 2', 'jmp -2'], DEFAULT_ENV)
+            return [validate, dwarf]
+
+        single = EventsMARS(seed=5)
+        single.events = []
+        single.warriors = warriors()
+        single.reset()
+
+        batched = BatchedEventsMARS(seed=5, event_batch=10)
+        batched.batches = []
+        batched.warriors = warriors()
+        batched.reset()
+        self.assertEqual([single.events], batched.batches)
+
+        for i in range(100):
+            single.step()
+            batched.step()
+
+        self.assertEqual(11, len(batched.batches))
+        self.assertEqual(single.events, sum(batched.batches, []))
 
     def test_validate(self):
 
@@ -56,24 +234,66 @@ class TestMars(unittest.TestCase):
 
         simulation = mars.MARS(warriors=[validate], randomize=False)
 
-        for i in xrange(8000):
+        for i in range(8000):
             simulation.step()
-            if not validate.task_queue:
+            if not simulation.task_queues[0]:
                 self.fail("Interpreter is not ICWS88-compliant. died in %d steps" % i)
 
+    def test_dump(self):
+        current_path = os.path.dirname(os.path.realpath(__file__))
+
+        with open(os.path.join(current_path, "..", "warriors", "validate.red")) as f:
+            validate = redcode.parse(f, DEFAULT_ENV)
+        with open(os.path.join(current_path, "validate-steps.red")) as f:
+            expected = [line.rstrip() for line in f][2:104]
+
+        simulation = mars.MARS(warriors=[validate], randomize=False)
+
+        self.assertEqual(expected[:-1], list(simulation.dump(0, 101))[:-1])
+        self.assertEqual(expected[-1], list(simulation.dump(0, 101))[-1][:len(expected[-1])])
+        self.assertEqual((87, 'DAT', 'F', '#', 0, '#', 0),
+                          next(simulation.core.disassemble(87)))
+
     def test_crazy_warrrior(self):
         self.warrior_step_by_step("crazy.red", "crazy-steps.red", -22, 22)
 
     def test_validate_warrior(self):
         self.warrior_step_by_step("validate.red", "validate-steps.red", 0, 90)
 
-    def warrior_step_by_step(self, warrior_filename, log_filename, core_start, core_end):
+    def test_crazy_warrrior_compiled(self):
+        self.warrior_step_by_step("crazy.red", "crazy-steps.red", -22, 22, compiled=True)
+
+    def test_validate_warrior_compiled(self):
+        self.warrior_step_by_step("validate.red", "validate-steps.red", 0, 90, compiled=True)
+
+    def test_compiled_step(self):
+        current_path = os.path.dirname(os.path.realpath(__file__))
+        warriors = []
+        for filename in ("dwarf.red", "mice.red", "validate.red", "twill.red"):
+            with open(os.path.join(current_path, "..", "warriors", filename)) as f:
+                warriors.append(redcode.parse(f, DEFAULT_ENV))
+
+        for warrior_a, warrior_b in zip(warriors, warriors[1:]):
+            reference = mars.MARS(warriors=[warrior_a, warrior_b], seed=1)
+            for i in range(500):
+                reference.step()
+            reference_queues = [list(task_queue) for task_queue in reference.task_queues]
+
+            compiled = mars.MARS(warriors=[warrior_a, warrior_b], seed=1, compiled=True)
+            for i in range(500):
+                compiled.step()
+
+            self.assertEqual(reference_queues, compiled.task_queues)
+            self.assertEqual(list(reference), list(compiled))
+
+    def warrior_step_by_step(self, warrior_filename, log_filename, core_start, core_end,
+                             compiled=False):
 
         current_path = os.path.dirname(os.path.realpath(__file__))
         with open(os.path.join(current_path, "..", "warriors", warrior_filename)) as f:
             test_w = redcode.parse(f, DEFAULT_ENV)
 
-        simulation = mars.MARS(warriors=[test_w], randomize=False)
+        simulation = mars.MARS(warriors=[test_w], randomize=False, compiled=compiled)
 
         nth = 0
 
@@ -90,22 +310,22 @@ class TestMars(unittest.TestCase):
                     expected = redcode.parse(accum_lines)
 
                     # compare with next in queue
-                    if not test_w.task_queue:
+                    if not simulation.task_queues[0]:
                         self.fail("No tasks in queue. step %d, line %d" % (nth, n))
-                    if test_w.task_queue[0] != next_queued:
+                    if simulation.task_queues[0][0] != next_queued:
                         self.fail("Task address does not match (%d != %d). step %d, line %d" %
-                                  (next_queued, test_w.task_queue[0], nth, n))
+                                  (next_queued, simulation.task_queues[0][0], nth, n))
 
                     # compare it with the current state
                     for e, i in zip(expected, simulation.core[core_start:core_end]):
                         if e != i:
-                            print
+                            print()
                             x = core_start
                             for e, i in zip(expected, simulation.core[core_start:core_end]):
                                 if e != i:
-                                    print "%05d %s != %s" % (x, str(e), str(i))
+                                    print("%05d %s != %s" % (x, str(e), str(i)))
                                 else:
-                                    print "%05d %s == %s" % (x, str(e), str(i))
+                                    print("%05d %s == %s" % (x, str(e), str(i)))
                                 x += 1
                             self.fail("Core don't match, step %d, line %d" % (nth, n))
 
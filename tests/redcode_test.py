@@ -1,12 +1,16 @@
-#! /usr/bin/env python
+#! /usr/bin/env python3
 #! coding: utf-8
 
+import os
 import unittest
 
 from corewar.redcode import *
+from corewar.redcode import WARRIOR_ENCODING
 
 DEFAULT_ENV = {'CORESIZE': 8000}
 
+WARRIORS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'warriors')
+
 class TestRedcodeAssembler(unittest.TestCase):
 
     def test_1(self):
@@ -25,18 +29,85 @@ class TestRedcodeAssembler(unittest.TestCase):
                 """
         warrior = parse(input.split('\n'), DEFAULT_ENV)
 
-        self.assertEquals(1, warrior.start)
-        self.assertEquals('dwarf', warrior.name)
-        self.assertEquals('A. K. Dewdney', warrior.author)
-        self.assertEquals(3, len(warrior))
+        self.assertEqual(1, warrior.start)
+        self.assertEqual('dwarf', warrior.name)
+        self.assertEqual('A. K. Dewdney', warrior.author)
+        self.assertEqual(3, len(warrior))
 
-        self.assertEquals(Instruction(ADD, M_AB, IMMEDIATE, 2004, DIRECT, 1),
+        self.assertEqual(Instruction(ADD, M_AB, IMMEDIATE, 2004, DIRECT, 1),
                           warrior.instructions[0])
-        self.assertEquals(Instruction(MOV, M_I, DIRECT, 2, DIRECT, 2),
+        self.assertEqual(Instruction(MOV, M_I, DIRECT, 2, DIRECT, 2),
                           warrior.instructions[1])
-        self.assertEquals(Instruction(JMP, M_F, DIRECT, -2, DIRECT, 0),
+        self.assertEqual(Instruction(JMP, M_F, DIRECT, -2, DIRECT, 0),
                           warrior.instructions[2])
 
+    def test_read_warriors(self):
+        archive = """
+                  archive of warriors, ignored
+                  ;redcode-94
+                  ;name imp
+                  mov 0, 1
+                  ;redcode-94
+                  ;name broken
+                  mov 0, undefined
+                  ;redcode-94
+                  ;name dwarf
+                  add #4, 3
+                  mov 2, @2
+                  jmp -2
+                  end
+                  dat 0, 0
+                  """
+        errors = []
+        warriors = read_warriors(iter(archive.split('\n')), DEFAULT_ENV, errors)
+
+        # warriors are parsed as they are consumed
+        self.assertEqual('imp', next(warriors).name)
+        self.assertEqual([], errors)
+
+        dwarf = next(warriors)
+        self.assertEqual(('dwarf', 3), (dwarf.name, len(dwarf)))
+        self.assertEqual([6], [error.line for error in errors])
+        self.assertTrue(isinstance(errors[0].error, NameError))
+        self.assertEqual([], list(warriors))
+
+        # without ;redcode lines, the whole input is a warrior
+        self.assertEqual([1], [len(warrior) for warrior in read_warriors(['mov 0, 1'])])
+
+        # a warrior without instructions is still read
+        empty = list(read_warriors([';redcode', ';name empty', ';redcode', 'mov 0, 1']))
+        self.assertEqual([('empty', 0), ('Unnamed', 1)],
+                         [(warrior.name, len(warrior)) for warrior in empty])
+
+    def test_expressions(self):
+        environment = dict(DEFAULT_ENV, step=3)
+        self.assertEqual(2666 + 3, evaluate('CORESIZE / 3 + step', environment))
+        self.assertEqual(-6, evaluate('-(CORESIZE % 7)', environment))
+        # Redcode's logical operators, and decimal numbers with leading zeros
+        self.assertTrue(evaluate('CORESIZE == 8000 && !(step > 4) || 0', environment))
+        self.assertEqual(1 + 4, evaluate('!0 + 04'))
+        # labels come before the environment
+        self.assertEqual(1, evaluate('step', {'step': 1}, environment))
+
+        self.assertRaises(NameError, evaluate, 'MAXLENGTH', environment)
+        for expression in ('__import__("os").getpid()', 'step.real', '2 ** 4096',
+                           '"step"', '[step]', 'lambda: 0'):
+            self.assertRaises(ValueError, evaluate, expression, environment)
+
+        input = """
+                x equ __import__("os").getpid()
+                dat x, 0
+                """
+        self.assertRaises(ValueError, parse, input.split('\n'))
+
+    def test_bundled_warriors(self):
+        # as the tools read them, whatever the encoding of their comments
+        environment = dict(DEFAULT_ENV, MAXLENGTH=100, MAXPROCESSES=8000,
+                           CYCLES=80000, ROUNDS=1, MINDISTANCE=100)
+        for name in sorted(os.listdir(WARRIORS_PATH)):
+            with open(os.path.join(WARRIORS_PATH, name), encoding=WARRIOR_ENCODING) as f:
+                self.assertTrue(len(parse(f, environment)), name)
+
 if __name__ == '__main__':
     unittest.main()
 
@@ -0,0 +1,68 @@
+#! /usr/bin/env python3
+#! coding: utf-8
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from corewar import redcode
+from corewar.mars import MARS, WIN, TIE, LOSS
+from corewar.results import ResultsSink, read_results, rounds
+
+DEFAULT_ENV = {'CORESIZE': 8000, 'MAXLENGTH': 100}
+
+class TestResults(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.warriors = [redcode.parse([';name dwarf', 'mov 0, 1'], DEFAULT_ENV),
+                         redcode.parse([';name imp', 'mov 0, 1'], DEFAULT_ENV)]
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def check_resume(self, filename):
+        filename = os.path.join(self.directory, filename)
+        self.assertEqual({}, read_results(filename, self.warriors))
+
+        with ResultsSink(filename) as sink:
+            sink.write(1, self.warriors, [0, 4000], [WIN, LOSS])
+            sink.write(2, self.warriors, [10, 4010], [TIE, TIE])
+
+        # an interrupted write leaves an incomplete line
+        with open(filename, 'a') as results:
+            results.write('3,0,dw' if filename.endswith('.csv') else '{"round": 3, "war')
+
+        expected = {1: [WIN, LOSS], 2: [TIE, TIE]}
+        self.assertEqual(expected, read_results(filename, self.warriors))
+
+        # resuming appends after the last complete round
+        with ResultsSink(filename) as sink:
+            sink.write(3, self.warriors, [20, 4020], [LOSS, WIN])
+        expected[3] = [LOSS, WIN]
+        self.assertEqual(expected, read_results(filename, self.warriors))
+
+        self.assertRaises(ValueError, read_results, filename, self.warriors[::-1])
+
+    def test_json_lines(self):
+        self.check_resume('results.jsonl')
+
+    def test_csv(self):
+        self.check_resume('results.csv')
+
+    def test_rounds(self):
+        def tournament(played):
+            simulation = MARS(warriors=self.warriors, seed=7)
+            return list(rounds(simulation, 3, played))
+
+        # resumed rounds are placed as if played from the start
+        fresh = tournament({})
+        resumed = tournament({2: [WIN, LOSS]})
+        self.assertEqual([positions for round, positions, outcomes in fresh],
+                         [positions for round, positions, outcomes in resumed])
+        self.assertEqual([None, [WIN, LOSS], None],
+                         [outcomes for round, positions, outcomes in resumed])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+#! /usr/bin/env python3
+#! coding: utf-8
+
+from io import StringIO
+import unittest
+
+from corewar import redcode
+from corewar.core import Core
+from corewar.mars import MARS
+from corewar.sampler import Sampler
+from tests.sources import DWARF_SOURCE
+
+DEFAULT_ENV = {'CORESIZE': 8000, 'MAXLENGTH': 100}
+
+SPLITTER_SOURCE = [';name splitter', 'spl 0', 'jmp -1']
+
+class TestSampler(unittest.TestCase):
+
+    def simulation(self, **kargs):
+        warriors = [redcode.parse(DWARF_SOURCE, DEFAULT_ENV),
+                    redcode.parse(SPLITTER_SOURCE, DEFAULT_ENV)]
+        return MARS(core=Core(size=800), warriors=warriors, minimum_separation=10,
+                    seed=1, **kargs)
+
+    def test_samples(self):
+        sampler = Sampler(stride=10, capacity=5)
+        simulation = self.simulation(sampler=sampler)
+        self.assertEqual(0, len(sampler))
+
+        for cycle in range(70):
+            simulation.step()
+
+        # only the last samples are kept
+        samples = list(sampler.samples())
+        self.assertEqual([30, 40, 50, 60, 70], [cycle for cycle, processes, cells in samples])
+
+        cycle, processes, cells = samples[-1]
+        self.assertEqual((1, 44), processes)
+        # the dwarf owns its code and a bomb every 3 cycles, the splitter its code
+        self.assertEqual((4 + 70 // 3, 2), cells)
+
+        output = StringIO()
+        sampler.export(output)
+        self.assertEqual(['cycle,dwarf processes,splitter processes,dwarf cells,splitter cells',
+                           '70,1,44,27,2'], output.getvalue().splitlines()[::5])
+
+    def test_detach(self):
+        sampler = Sampler(stride=1)
+        simulation = self.simulation(compiled=True)
+        simulation.attach_sampler(sampler)
+        simulation.reset()
+        simulation.step()
+        simulation.detach_sampler()
+        simulation.step()
+
+        self.assertEqual(1, len(sampler))
+        self.assertEqual(MARS.core_event, simulation.core_event.__func__)
+
+if __name__ == '__main__':
+    unittest.main()
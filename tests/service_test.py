@@ -0,0 +1,94 @@
+#! /usr/bin/env python3
+#! coding: utf-8
+
+import asyncio
+import http.client
+import json
+import threading
+import unittest
+
+from corewar import redcode
+from corewar.service import DEFAULT_SETTINGS, BattleService, play, play_async
+
+class TestBattleService(unittest.TestCase):
+
+    def setUp(self):
+        self.service = BattleService(('localhost', 0), workers=1)
+        self.thread = threading.Thread(target=self.service.serve_forever)
+        self.thread.start()
+
+    def tearDown(self):
+        self.service.shutdown()
+        self.service.server_close()
+        self.thread.join()
+
+    def submit(self, submission):
+        connection = http.client.HTTPConnection(*self.service.server_address)
+        connection.request('POST', '/battles', json.dumps(submission))
+        return connection.getresponse()
+
+    def test_battle(self):
+        response = self.submit({'warriors': [';name dwarf\nadd.ab #4, 1\nmov 2, 2\njmp -2',
+                                             ';name imp\nmov 0, 1'],
+                                'settings': {'rounds': 2, 'cycles': 2500, 'seed': 1}})
+
+        self.assertEqual(200, response.status)
+        records = [json.loads(line) for line in response.read().splitlines()]
+
+        self.assertEqual({'queued': True}, records[0])
+        self.assertEqual({'round': 1, 'cycle': 1000}, records[1])
+        self.assertEqual(['dwarf', 'imp'],
+                          [result['name'] for result in records[-1]['results']])
+        self.assertEqual([2, 2], [sum(result[key] for key in ('wins', 'ties', 'losses'))
+                                   for result in records[-1]['results']])
+
+    def test_invalid_warrior(self):
+        # expressions are arithmetic only: no code of a submission is run
+        response = self.submit({'warriors': [';name evil\nx equ __import__("os").getpid()\n'
+                                             'dat x, 0']})
+        self.assertEqual(400, response.status)
+        response.read()
+
+    def test_budget(self):
+        # the budget of the service caps the one submitted
+        self.service.budget = 0
+        response = self.submit({'warriors': [';name imp\nmov 0, 1', ';name imp\nmov 0, 1'],
+                                'settings': {'rounds': 2, 'budget': 60}})
+
+        records = [json.loads(line) for line in response.read().splitlines()]
+        self.assertEqual([0, 0], [sum(result[key] for key in ('wins', 'ties', 'losses'))
+                                   for result in records[-1]['results']])
+
+        # a budget of 0 is spent, not unset
+        self.service.budget = 60
+        response = self.submit({'warriors': [';name imp\nmov 0, 1', ';name imp\nmov 0, 1'],
+                                'settings': {'rounds': 2, 'budget': 0}})
+        records = [json.loads(line) for line in response.read().splitlines()]
+        self.assertEqual([0, 0], [sum(result[key] for key in ('wins', 'ties', 'losses'))
+                                   for result in records[-1]['results']])
+
+    def test_play_async(self):
+        warriors = [redcode.parse(['add.ab #4, 1', 'mov 2, 2', 'jmp -2']),
+                    redcode.parse(['mov 0, 1'])]
+        settings = dict(DEFAULT_SETTINGS, rounds=2, cycles=2500, seed=1)
+
+        async def battles():
+            # both battles make progress, taking turns on the event loop
+            progress = asyncio.Queue()
+            results = await asyncio.gather(play_async(warriors, settings, progress),
+                                           play_async(warriors, settings))
+            records = []
+            while not progress.empty():
+                records.append(progress.get_nowait())
+            return results, records
+
+        results, records = asyncio.run(battles())
+        self.assertEqual([play(warriors, settings)] * 2, results)
+        self.assertEqual({'round': 1, 'cycle': 1000}, records[0])
+
+    def test_invalid_warrior(self):
+        response = self.submit({'warriors': ['xyz 1, 2']})
+        self.assertEqual(400, response.status)
+
+if __name__ == '__main__':
+    unittest.main()
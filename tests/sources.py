@@ -0,0 +1,8 @@
+# coding: utf-8
+
+# Redcode sources of the small warriors shared by the tests
+
+# bombs every fourth cell with the DAT at its end
+DWARF_SOURCE = [';name dwarf', 'add.ab #4, 3', 'mov 2, @2', 'jmp -2', 'dat 0, 0']
+
+IMP_SOURCE = [';name imp', 'mov 0, 1']
@@ -0,0 +1,82 @@
+#! /usr/bin/env python3
+#! coding: utf-8
+
+import os
+import unittest
+
+from corewar import redcode
+from corewar.core import Core
+from corewar.spectator import BroadcastMARS, Spectator
+from tests.sources import DWARF_SOURCE, IMP_SOURCE
+
+DEFAULT_ENV = {'CORESIZE': 800, 'MAXLENGTH': 100}
+
+class TestSpectator(unittest.TestCase):
+
+    def test_broadcast(self):
+        name = 'test-%d' % os.getpid()
+        warriors = [redcode.parse(DWARF_SOURCE, DEFAULT_ENV),
+                    redcode.parse(IMP_SOURCE, DEFAULT_ENV)]
+        simulation = BroadcastMARS(name, core=Core(size=800), warriors=warriors,
+                                   minimum_separation=10, seed=1)
+        try:
+            spectator = Spectator(name)
+            for cycle in range(64):
+                simulation.step()
+
+            self.assertEqual((1, 64), spectator.progress())
+            self.assertEqual([('dwarf', 1, simulation.task_queues[0][0]),
+                               ('imp', 1, simulation.task_queues[1][0])],
+                              spectator.warriors())
+
+            imp = simulation.task_queues[1][0]
+            for address in range(800):
+                opcode, modifier, a_mode, b_mode, owner, a_number, b_number = spectator.cell(address)
+                instruction = simulation.core[address]
+                self.assertEqual((instruction.opcode, instruction.modifier,
+                                   instruction.a_mode, instruction.b_mode,
+                                   instruction.a_number % 800, instruction.b_number % 800),
+                                  (opcode, modifier, a_mode, b_mode, a_number, b_number))
+            # the imp owns the cells it copied itself to
+            self.assertEqual(1, spectator.cell(imp)[4])
+            self.assertEqual(-1, spectator.cell(imp + 1)[4])
+
+            # a spectator attached later sees the same
+            other = Spectator(name)
+            self.assertEqual(spectator.cells(), other.cells())
+            other.close()
+
+            # a new round packs again only the cells changed, and the
+            # warriors loaded, but is published just as a new broadcast
+            for cycle in range(500):
+                simulation.step()
+            simulation.reset()
+            fresh = BroadcastMARS(name + '-fresh', core=Core(size=800), warriors=warriors,
+                                  minimum_separation=10, seed=1)
+            try:
+                fresh.reset()
+                fresh_spectator = Spectator(name + '-fresh')
+                self.assertEqual(fresh_spectator.cells(), spectator.cells())
+                fresh_spectator.close()
+            finally:
+                fresh.close()
+            spectator.close()
+        finally:
+            simulation.close()
+
+        self.assertRaises(FileNotFoundError, Spectator, name)
+
+    def test_untrimmed_numbers(self):
+        name = 'test-untrimmed-%d' % os.getpid()
+        warrior = redcode.parse(['dat #%d, #%d' % (2**40, -2**40 - 1)], DEFAULT_ENV)
+        simulation = BroadcastMARS(name, core=Core(size=800), warriors=[warrior],
+                                   randomize=False)
+        try:
+            spectator = Spectator(name)
+            self.assertEqual((2**40 % 800, (-2**40 - 1) % 800), spectator.cell(0)[5:])
+            spectator.close()
+        finally:
+            simulation.close()
+
+if __name__ == '__main__':
+    unittest.main()